@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+File name: __main__.py
+
+Description: Command-line batch runner for sample approaches, so batch jobs can be run without scripts/notebooks.
+
+Runs the scenarios of a SampleApproach of a model (optionally over several worker processes), showing progress as
+they run, and saves the endclasses and (optionally) histories (see resultio.save_results) along with FMEA tables
+(pickled pandas DataFrames) to an output directory.
+
+Example:
+    python -m fmdtools ex_pump:Pump --path "pump example" --params '{"cost":["ee"], "delay":10}'
+        --approach '{"defaultsamp":{"samp":"evenspacing", "numpts":3}}' --workers 4 --cache cache --output results
+
+If a cache directory is given, the results of each chunk of scenarios are saved there as they finish, so a job which
+is stopped (or re-run with the same options) only runs the chunks which have not been run yet. Cached chunks are keyed
+by the options (including the --approach and --model-version), the scenarios (with their rates, times, and faults), the
+sample times, and a hash of the model's source file, so they are re-run when the approach or model is changed.
+"""
+import argparse
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import time
+import fmdtools.faultprop as fp
+import fmdtools.resultio as rio
+from fmdtools.modeldef import SampleApproach
+
+def main(argv=None):
+    """ Runs the command-line interface with the given arguments (default: sys.argv)"""
+    args = make_parser().parse_args(argv)
+    job = {'model':args.model, 'params':json.loads(args.params), 'paths':[os.path.abspath(p) for p in args.path],
+           'staged':args.staged, 'track':not args.notrack, 'dedup':args.dedup, 'hists':args.hists,
+           'version':args.model_version, 'approach':json.loads(args.approach)}
+    mdl = load_model(job['model'], job['params'], job['paths'])
+    app = SampleApproach(mdl, **parse_approach(job['approach']))
+    endclasses, mdlhists = run_batch(job, app, mdl, workers=args.workers, cache=args.cache, chunksize=args.chunksize, progress=not args.quiet)
+    if args.output: save_output(args.output, endclasses, mdlhists, app)
+    if args.db:     save_db(args.db, endclasses, mdlhists, app, job, job['version'])
+    return endclasses, mdlhists
+
+def make_parser():
+    """ Returns the argument parser of the command-line interface"""
+    parser = argparse.ArgumentParser(prog='python -m fmdtools', description='Runs the scenarios of a sample approach for a model and saves the results.')
+    parser.add_argument('model', help="model class to run, as module:Class (module may also be a path to a .py file)")
+    parser.add_argument('--path', action='append', default=[], help="directory to import the model module from (may be repeated)")
+    parser.add_argument('--params', default='{}', help="model params as JSON (default: {})")
+    parser.add_argument('--approach', default='{}', help="SampleApproach arguments as JSON, e.g. '{\"defaultsamp\":{\"samp\":\"fullint\"}}' (default: {})")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument('--chunksize', type=int, default=0, help="scenarios per chunk of work (default: chosen from the number of scenarios/workers)")
+    parser.add_argument('--cache', default='', help="directory to cache the results of each chunk in (to resume stopped jobs)")
+    parser.add_argument('--output', default='', help="directory to save the results and FMEA tables to")
+    parser.add_argument('--db', default='', help="results database (see resultdb.ResultsDB) to add the results of the run to")
+    parser.add_argument('--model-version', default='', help="version of the model to record in the results database (also part of the cache key)")
+    parser.add_argument('--hists', action='store_true', help="save the histories of every scenario (not just the nominal)")
+    parser.add_argument('--staged', action='store_true', help="run faults from copies of the nominal model (see run_approach)")
+    parser.add_argument('--dedup', action='store_true', help="deduplicate scenarios (see run_approach)")
+    parser.add_argument('--notrack', action='store_true', help="do not track model states over time")
+    parser.add_argument('--quiet', action='store_true', help="do not show progress")
+    return parser
+
+def load_model(modelref, params={}, paths=[]):
+    """
+    Instantiates a model given a reference to its class
+
+    Parameters
+    ----------
+    modelref : str
+        Reference to the model class, as module:Class, where the module is an importable module or a path to a .py file
+    params : dict, optional
+        Parameters to instantiate the model with. The default is {} (instantiates the model without params).
+    paths : list, optional
+        Directories to import the module from (added to sys.path). The default is [].
+
+    Returns
+    -------
+    mdl : Model
+        The model
+    """
+    modulename, _, classname = modelref.rpartition(':')
+    if not modulename: raise Exception("Model must be given as module:Class, not "+modelref)
+    for path in paths:
+        if path not in sys.path: sys.path.insert(0, path)
+    if modulename.endswith('.py'):
+        name = os.path.splitext(os.path.basename(modulename))[0]
+        if name in sys.modules: module = sys.modules[name]
+        else:
+            sys.path.insert(0, os.path.dirname(os.path.abspath(modulename)))
+            spec = importlib.util.spec_from_file_location(name, modulename)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[name] = module
+            spec.loader.exec_module(module)
+    else: module = importlib.import_module(modulename)
+    mdlclass = getattr(module, classname)
+    if params: return mdlclass(params=params)
+    else:      return mdlclass()
+
+def parse_approach(spec):
+    """ Converts SampleApproach arguments given in JSON (lists of [fxn, mode]) into the arguments SampleApproach takes (tuples (fxn, mode))"""
+    spec = dict(spec)
+    if type(spec.get('faults'))==list: spec['faults'] = [tuple(fault) if type(fault)==list else fault for fault in spec['faults']]
+    return spec
+
+def run_batch(job, app, mdl=None, workers=1, cache='', chunksize=0, progress=True):
+    """
+    Runs the scenarios of an approach in chunks (in worker processes if workers>1), showing progress and throughput.
+
+    Parameters
+    ----------
+    job : dict
+        Model and run options, with structure {'model':modelref, 'params':params, 'paths':paths, 'staged':bool,
+        'track':bool, 'dedup':bool, 'hists':bool, 'version':str, 'approach':dict} (see main)
+    app : SampleApproach
+        Approach with the scenarios to run
+    mdl : Model, optional
+        The model (used for the nominal scenario). The default is None (loads the model from the job).
+    workers : int, optional
+        Number of worker processes. The default is 1 (runs in this process).
+    cache : str, optional
+        Directory to cache the results of each chunk in. The default is '' (no cache).
+    chunksize : int, optional
+        Number of scenarios in each chunk. The default is 0 (about 8 chunks per worker, at most 100 scenarios).
+    progress : bool, optional
+        Whether to show progress. The default is True.
+
+    Returns
+    -------
+    endclasses : dict
+        endclasses of each scenario
+    mdlhists : dict
+        nominal history and (if job['hists']) the histories of each scenario
+    """
+    if mdl is None: mdl = load_model(job['model'], job['params'], job['paths'])
+    scenlist = app.scenlist
+    if not chunksize: chunksize = max(1, min(100, -(-len(scenlist)//(8*workers))))
+    chunks = [scenlist[i:i+chunksize] for i in range(0, len(scenlist), chunksize)]
+    work = {'nomscen':app.create_nomscen(mdl), 'times':app.times, **job}
+    endclasses, mdlhists = {}, {}
+    start, done, numcached, simtime = time.time(), 0, 0, 0.0
+    todo = []
+    source = source_hash(mdl) if cache else ''
+    for k, chunk in enumerate(chunks):
+        filename = os.path.join(cache, chunk_key(job, chunk, app.times, source)+'.npz') if cache else ''
+        if filename and os.path.exists(filename):
+            endclasses_k, mdlhists_k = read_chunk(filename, job['hists'])
+            merge_results(endclasses, mdlhists, endclasses_k, mdlhists_k)
+            done, numcached = done+len(chunk), numcached+len(chunk)
+        else: todo.append((chunk, filename))
+    if cache: os.makedirs(cache, exist_ok=True)
+    if progress: show_progress(done, len(scenlist), start)
+    if workers>1 and len(todo)>1:
+        import multiprocessing
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(work,)) as pool:
+            for endclasses_k, mdlhists_k, simtime_k, numscens in pool.imap_unordered(run_chunk, todo):
+                merge_results(endclasses, mdlhists, endclasses_k, mdlhists_k)
+                done, simtime = done+numscens, simtime+simtime_k
+                if progress: show_progress(done, len(scenlist), start)
+    else:
+        init_worker(work, mdl)
+        for chunk in todo:
+            endclasses_k, mdlhists_k, simtime_k, numscens = run_chunk(chunk)
+            merge_results(endclasses, mdlhists, endclasses_k, mdlhists_k)
+            done, simtime = done+numscens, simtime+simtime_k
+            if progress: show_progress(done, len(scenlist), start)
+    if 'nominal' not in mdlhists: mdlhists['nominal'] = fp.prop_nominal(mdl, work['nomscen'], track=job['track'])[0]
+    endclasses = {scen['properties']['name']:endclasses[scen['properties']['name']] for scen in scenlist}
+    if job['hists']: mdlhists = {'nominal':mdlhists['nominal'], **{name:mdlhists[name] for name in endclasses}}
+    if progress:
+        elapsed = time.time()-start
+        sys.stderr.write('\n{} scenarios ({} cached) in {:.1f} s: {:.1f} scenarios/s ({:.1f} s simulating over {} worker(s))\n'.format(
+            len(scenlist), numcached, elapsed, (len(scenlist)-numcached)/max(elapsed, 1e-9), simtime, workers))
+    return endclasses, mdlhists
+
+_worker = {} # model, session, and options of the (worker) process
+def init_worker(work, mdl=None):
+    """ Sets up a (worker) process to run chunks of scenarios (loading the model once per process)"""
+    _worker['work'] = work
+    _worker['mdl'] = mdl if mdl is not None else load_model(work['model'], work['params'], work['paths'])
+    _worker['session'] = fp.Session()
+def run_chunk(chunk):
+    """ Runs a chunk of scenarios (chunk, cachefile) in the (worker) process, caching the results if a cache file is given"""
+    scens, filename = chunk
+    work, mdl = _worker['work'], _worker['mdl']
+    start = time.time()
+    endclasses, mdlhists = fp.run_scenlist(mdl, scens, work['nomscen'], work['times'], staged=work['staged'], track=work['track'],
+                                           dedup=work['dedup'], session=_worker['session'], keephists=work['hists'])
+    if not work['hists']: mdlhists = {'nominal':mdlhists['nominal']}
+    if filename:
+        tempname = filename[:-4]+'.tmp.npz'
+        rio.save_results(tempname, mdlhists, endclasses)
+        os.replace(tempname, filename)
+    return endclasses, mdlhists, time.time()-start, len(scens)
+def chunk_key(job, chunk, times=(), source=''):
+    """ Returns a key identifying the results of a chunk of scenarios (with their faults and properties) for a given job,
+    sample times, and model source hash (for caching)"""
+    spec = json.dumps([job, [[scen['faults'], scen['properties']] for scen in chunk], list(times), source], sort_keys=True, default=str)
+    return hashlib.sha1(spec.encode()).hexdigest()
+def source_hash(mdl):
+    """ Returns a hash of the source file of the model's module (so cached results are not reused after the model is edited)"""
+    filename = getattr(sys.modules.get(mdl.__class__.__module__), '__file__', None)
+    if not filename or not os.path.exists(filename): return ''
+    with open(filename, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+def read_chunk(filename, hists=False):
+    """ Reads the endclasses and histories of a cached chunk"""
+    with rio.Results(filename) as res:
+        if hists:   mdlhists = {scen:res.get_hist(scen) for scen in res}
+        else:       mdlhists = {'nominal':res.get_hist('nominal')}
+        return res.endclasses, mdlhists
+def merge_results(endclasses, mdlhists, endclasses_k, mdlhists_k):
+    """ Adds the results of a chunk to the overall results"""
+    endclasses.update(endclasses_k)
+    if 'nominal' in mdlhists: mdlhists_k = {scen:hist for scen, hist in mdlhists_k.items() if scen!='nominal'}
+    mdlhists.update(mdlhists_k)
+def show_progress(done, total, start):
+    """ Shows the number of scenarios run, throughput, and estimated time remaining"""
+    elapsed = time.time()-start
+    rate = done/elapsed if elapsed>0 else 0.0
+    remaining = '{:.0f} s'.format((total-done)/rate) if rate>0 else '--'
+    sys.stderr.write('\r{}/{} scenarios ({:.0%}), {:.1f} scenarios/s, {} remaining   '.format(done, total, done/max(total,1), rate, remaining))
+    sys.stderr.flush()
+
+def save_output(output, endclasses, mdlhists, app):
+    """
+    Saves the results to the output directory: results.npz (endclasses, approach, and histories--see
+    resultio.save_results) and simplefmea.pkl, phasefmea.pkl, and summfmea.pkl (pickled DataFrames)
+    """
+    import fmdtools.resultproc as rp
+    os.makedirs(output, exist_ok=True)
+    rio.save_results(os.path.join(output, 'results.npz'), mdlhists, endclasses, app)
+    rp.make_simplefmea(endclasses).to_pickle(os.path.join(output, 'simplefmea.pkl'))
+    rp.make_phasefmea(endclasses, app).to_pickle(os.path.join(output, 'phasefmea.pkl'))
+    rp.make_summfmea(endclasses, app).to_pickle(os.path.join(output, 'summfmea.pkl'))
+
+def save_db(filename, endclasses, mdlhists, app, job, version=''):
+    """ Adds the results of the run (with the degraded functions/flows of each scenario if histories were kept) to a results database"""
+    from fmdtools.resultdb import ResultsDB
+    summaries = {}
+    if job['hists']:
+        import fmdtools.resultproc as rp
+        summaries = rp.summarize_hists(mdlhists)
+    with ResultsDB(filename) as db:
+        db.add_run(endclasses, app, summaries, model=job['model'], version=version, params=job['params'])
+
+if __name__=='__main__':
+    main()
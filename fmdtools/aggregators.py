@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+File name: aggregators.py
+
+Description: Online aggregation of results over the scenarios run in faultprop.run_approach/run_list.
+
+Aggregators are updated with the results of each scenario as it finishes, so summary metrics (e.g. total expected
+cost, expected degraded time) may be computed without keeping the histories of every scenario. The results are the
+same as the corresponding functions in resultproc (see the result() method of each aggregator).
+
+Example:
+    aggs = [TotalCost(), DegTime(), Faults(), CostOverTime(app.times)]
+    endclasses, mdlhists = fp.run_approach(mdl, app, aggregators=aggs, keephists=False)
+    aggs[1].result()['expected']      # same as rp.make_expdegtimeheatmap(reshists, endclasses)
+"""
+import fmdtools.resultproc as rp
+
+class ScenResult():
+    """
+    Results of a single scenario given to aggregators. The results history (from resultproc.compare_hist) is computed
+    when first accessed, so it is only computed once for all aggregators (and not at all if none use it).
+
+    Attributes
+    ----------
+    name : str
+        name of the scenario
+    scen : dict
+        the scenario (with faults and properties)
+    endclass : dict
+        the endclass of the scenario (rate, cost, expected cost)
+    mdlhist : dict
+        model history of the scenario
+    nomhist : dict
+        model history of the nominal scenario
+    """
+    def __init__(self, name, scen, endclass, mdlhist, nomhist):
+        self.name = name
+        self.scen = scen
+        self.endclass = endclass
+        self.mdlhist = mdlhist
+        self.nomhist = nomhist
+        self._reshist = None
+    @property
+    def reshist(self):
+        """ results history of the scenario (see resultproc.compare_hist)"""
+        if self._reshist is None: self._reshist = rp.compare_hist(self.mdlhist, nomhist=self.nomhist, returndiff=False)[0]
+        return self._reshist
+
+class Aggregator():
+    """ Superclass for aggregators. Subclasses define update() (called with the ScenResult of each scenario) and result()."""
+    def update(self, res):
+        """ Placeholder for aggregator update methods """
+        return 0
+    def result(self):
+        """ Placeholder for aggregator result methods """
+        return {}
+
+class TotalCost(Aggregator):
+    """ Aggregates the total rate, cost, and expected cost over all scenarios (i.e., the sums of the columns of resultproc.make_simplefmea)"""
+    def __init__(self):
+        self.totals = {'rate':0.0, 'cost':0.0, 'expected cost':0.0}
+        self.numscens = 0
+    def update(self, res):
+        for key in self.totals: self.totals[key] += res.endclass[key]
+        self.numscens += 1
+    def result(self):
+        return self.totals.copy()
+
+class HeatmapAggregator(Aggregator):
+    """ Superclass for aggregators of a heatmap over scenarios. Gives the average (as in make_avg*) and rate-weighted sum (as in make_exp*) over all scenarios."""
+    def __init__(self):
+        self.sums = {}
+        self.expsums = {}
+        self.numscens = 0
+    def heatmap(self, res):
+        """ Placeholder for the heatmap dictionary of a scenario """
+        return {}
+    def update(self, res):
+        for obj, val in self.heatmap(res).items():
+            self.sums[obj] = self.sums.get(obj, 0.0) + val
+            self.expsums[obj] = self.expsums.get(obj, 0.0) + val*res.endclass['rate']
+        self.numscens += 1
+    def result(self):
+        """ Returns a dict with the 'average' and 'expected' heatmap dictionaries"""
+        return {'average': {obj: val/self.numscens for obj, val in self.sums.items()}, 'expected': self.expsums.copy()}
+
+class DegTime(HeatmapAggregator):
+    """ Aggregates the degraded time of each function and flow (average as in make_avgdegtimeheatmap and expected as in make_expdegtimeheatmap)"""
+    def heatmap(self, res):
+        return rp.make_degtimemap(res.reshist)
+
+class Faults(HeatmapAggregator):
+    """ Aggregates the maximum number of faults in each function (average as in make_faultsheatmap and expected as in make_expfaultsheatmap)"""
+    def heatmap(self, res):
+        return rp.make_faultmap(res.reshist)
+    def result(self):
+        result = super().result()
+        result['expected'] = {obj: val/self.numscens for obj, val in result['expected'].items()}
+        return result
+
+class CostOverTime(Aggregator):
+    """ Aggregates the cost, rate, and expected cost of the scenarios injected at each time (as in resultproc.find_costovertime)"""
+    def __init__(self, times=[]):
+        self.times = list(dict.fromkeys(times))
+        self.totals = {'cost':{}, 'rate':{}, 'expected cost':{}}
+    def update(self, res):
+        time = res.scen['properties']['time']
+        for key in self.totals: self.totals[key][time] = self.totals[key].get(time, 0.0) + res.endclass[key]
+    def result(self):
+        import pandas as pd
+        times = self.times if self.times else sorted(self.totals['cost'])
+        return pd.DataFrame({key: {time: tot.get(time, 0.0) for time in times} for key, tot in self.totals.items()})
+
+class Summaries(Aggregator):
+    """ Aggregates the summaries (degraded functions and flows) of each scenario (as in resultproc.summarize_hists, e.g. for make_fullfmea)"""
+    def __init__(self):
+        self.summaries = {}
+    def update(self, res):
+        self.summaries.update(rp.summarize_hists({'nominal':res.nomhist, res.name:res.mdlhist}))
+    def result(self):
+        return self.summaries
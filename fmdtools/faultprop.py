@@ -9,7 +9,8 @@ Description: functions to propagate faults through a user-defined fault model
 
 import numpy as np
 import copy
-import fmdtools.resultproc as rp
+import time
+import fmdtools.resultio as rio
 ## FAULT PROPAGATION
 
 def construct_nomscen(mdl):
@@ -64,7 +65,7 @@ def run_nominal(mdl, track=True, gtype='normal'):
     mdl.reset()
     return endresults, resgraph, mdlhist
 
-def run_one_fault(mdl, fxnname, faultmode, time=0, track=True, staged=False, gtype = 'normal'):
+def run_one_fault(mdl, fxnname, faultmode, time=0, track=True, staged=False, gtype = 'normal', localize=False, session=None):
     """
     Runs one fault in the model at a specified time.
 
@@ -84,6 +85,10 @@ def run_one_fault(mdl, fxnname, faultmode, time=0, track=True, staged=False, gty
         Whether to inject the fault in a copy of the nominal model at the fault time (True) or instantiate a new model for the fault (False). The default is False.
     gtype : str, optional
         The graph type to return ('bipartite' or 'normal'). The default is 'normal'.
+    localize : bool, optional
+        Whether to only simulate the functions and flows reachable from the fault (see prop_one_scen). The default is False.
+    session : Session, optional
+        Session to reuse the nominal run from (if it has been run before). The default is None.
 
     Returns
     -------
@@ -95,17 +100,15 @@ def run_one_fault(mdl, fxnname, faultmode, time=0, track=True, staged=False, gty
         A dictionary of the states of the model of each fault scenario over time.
 
     """
+    import fmdtools.resultproc as rp #(imported here so the simulation core does not import it)
     #run model nominally, get relevant results
     nomscen=construct_nomscen(mdl)
     if staged:
-        nommdlhist, mdls = prop_one_scen(mdl, nomscen, track=track, staged=staged, ctimes=[time])
-        nomresgraph = mdl.return_stategraph(gtype)
-        mdl.reset()
-        mdl = mdls[time]
+        nommdlhist, nomresgraph, mdls = prop_nominal(mdl, nomscen, track=track, ctimes=[time], gtype=gtype, session=session)
+        mdl = mdls[time].copy()
     else:
-        nommdlhist, _ = prop_one_scen(mdl, nomscen, track=track, staged=staged)
-        nomresgraph = mdl.return_stategraph(gtype)
-        mdl.reset()
+        nommdlhist, nomresgraph, _ = prop_nominal(mdl, nomscen, track=track, gtype=gtype, session=session)
+    nomresgraph = nomresgraph.build()
     #run with fault present, get relevant results
     scen=nomscen.copy() #note: this is a shallow copy, so don't define it earlier
     scen['faults'][fxnname]=faultmode
@@ -115,7 +118,7 @@ def run_one_fault(mdl, fxnname, faultmode, time=0, track=True, staged=False, gty
     scen['properties']['rate']=mdl.fxns[fxnname].failrate 
     scen['properties']['time']=time
     
-    faultmdlhist, _ = prop_one_scen(mdl, scen, track=track, staged=staged, prevhist=nommdlhist)
+    faultmdlhist, _ = prop_one_scen(mdl, scen, track=track, staged=staged, prevhist=nommdlhist, localize=localize)
     faultresgraph = mdl.return_stategraph(gtype)
     
     #process model run
@@ -161,7 +164,7 @@ def list_init_faults(mdl):
                 faultlist.append(newscen)
     return faultlist
 
-def run_list(mdl, reuse=False, staged=False, track=True):
+def run_list(mdl, reuse=False, staged=False, track=True, localize=False, session=None, dedup=False, store=None, sparse=False, aggregators=[], keephists=True):
     """
     Creates and propagates a list of failure scenarios in a model
 
@@ -175,6 +178,31 @@ def run_list(mdl, reuse=False, staged=False, track=True):
         Whether to inject the fault in a copy of the nominal model at the fault time (True) or instantiate a new model for the fault (False). Setting to True roughly halves execution time. The default is False.
     track : bool, optional
         Whether to track states over time. The default is True.
+    localize : bool, optional
+        Whether to only simulate and track the functions and flows reachable from the faults in each scenario, referencing
+        the nominal history for the rest of the model (see prop_one_scen). The default is False.
+    session : Session, optional
+        Session to reuse the nominal run from (if it has been run before). The default is None.
+    dedup : bool, optional
+        Whether to reuse the results of scenarios with the same faults and starting state (given by scen_fingerprint)
+        rather than simulating them again (e.g. for faults injected at different times in a steady phase). Results are
+        reused by shifting the history in time, which is only done when the nominal run is the same over the shifted period,
+        and re-classifying the result. This assumes the behaviors only depend on time through the tracked states, and 
+        requires track=True. The default is False.
+    store : str, optional
+        Directory to store the model histories in (as memory-mapped arrays, see resultio.HistStore) rather than in 
+        memory, so histories larger than memory may be run and processed. The returned histories are then views of 
+        the stored arrays. Requires track=True. The default is None.
+    sparse : bool, optional
+        Whether to encode the history of each fault scenario as its differences from the nominal history 
+        (see resultio.DeltaArray), which uses much less memory when most states are nominal. Not used with store.
+        The default is False.
+    aggregators : list, optional
+        Aggregators (see the aggregators module) to update with the results of each scenario as it finishes, e.g. to 
+        compute summary metrics without keeping every history. The default is [].
+    keephists : bool, optional
+        Whether to keep the histories of the fault scenarios in mdlhists (if False, only the nominal history is returned). 
+        The default is True.
 
     Returns
     -------
@@ -183,42 +211,10 @@ def run_list(mdl, reuse=False, staged=False, track=True):
     mdlhists : dict
         A dictionary with the history of all model states for each scenario (including the nominal)
     """
-    if reuse and staged:
-        print("invalid to use reuse and staged options at the same time. Using staged")
-        reuse=False
-
     scenlist=list_init_faults(mdl)
-    mdl.reset() #make sure the model is actually starting from the beginning
-    #run model nominally, get relevant results
-    nomscen=construct_nomscen(mdl)
-    if staged:
-        nomhist, c_mdl = prop_one_scen(mdl, nomscen, track=track, ctimes=mdl.times)
-    else:
-        nomhist, c_mdl = prop_one_scen(mdl, nomscen, track=track)
-    nomresgraph = mdl.return_stategraph()
-    mdl.reset()
-    
-    endclasses = {}
-    mdlhists = {}
-    mdlhists['nominal'] = nomhist
-    for i, scen in enumerate(scenlist):
-        #run model with fault scenario
-        if staged:
-            mdl=c_mdl[scen['properties']['time']].copy()
-            mdlhists[scen['properties']['name']], _ =prop_one_scen(mdl, scen, track=track, staged=True, prevhist=nomhist)
-        else:
-            mdlhists[scen['properties']['name']], _ =prop_one_scen(mdl, scen, track=track)
-        endfaults, endfaultprops = mdl.return_faultmodes()
-        resgraph = mdl.return_stategraph()
-        endflows = rp.compare_graphflows(resgraph, nomresgraph)
-        endclasses[scen['properties']['name']] = mdl.find_classification(resgraph, endfaultprops, endflows, scen, {'nominal':nomhist, 'faulty':mdlhists[scen['properties']['name']]})
-        
-        if reuse: mdl.reset()
-        elif staged: _
-        else: mdl = mdl.__class__(params=mdl.params)
-    return endclasses, mdlhists
+    return run_scenlist(mdl, scenlist, construct_nomscen(mdl), mdl.times, reuse=reuse, staged=staged, track=track, localize=localize, session=session, dedup=dedup, store=store, sparse=sparse, aggregators=aggregators, keephists=keephists)
 
-def run_approach(mdl, app, reuse=False, staged=False, track=True):
+def run_approach(mdl, app, reuse=False, staged=False, track=True, localize=False, session=None, dedup=False, store=None, sparse=False, aggregators=[], keephists=True, prevresults=()):
     """
     Injects and propagates faults in the model defined by a given sample approach
 
@@ -234,6 +230,235 @@ def run_approach(mdl, app, reuse=False, staged=False, track=True):
         Whether to inject the fault in a copy of the nominal model at the fault time (True) or instantiate a new model for the fault (False). Setting to True roughly halves execution time. The default is False.
     track : bool, optional
         Whether to track states over time. The default is True.
+    localize : bool, optional
+        Whether to only simulate and track the functions and flows reachable from the faults in each scenario, referencing
+        the nominal history for the rest of the model (see prop_one_scen). The default is False.
+    session : Session, optional
+        Session to reuse the nominal run from (if it has been run before). The default is None.
+    dedup : bool, optional
+        Whether to reuse the results of scenarios with the same faults and starting state (given by scen_fingerprint)
+        rather than simulating them again (e.g. for faults injected at different times in a steady phase). Results are
+        reused by shifting the history in time, which is only done when the nominal run is the same over the shifted period,
+        and re-classifying the result. This assumes the behaviors only depend on time through the tracked states, and 
+        requires track=True. The default is False.
+    store : str, optional
+        Directory to store the model histories in (as memory-mapped arrays, see resultio.HistStore) rather than in 
+        memory, so histories larger than memory may be run and processed. The returned histories are then views of 
+        the stored arrays. Requires track=True. The default is None.
+    sparse : bool, optional
+        Whether to encode the history of each fault scenario as its differences from the nominal history 
+        (see resultio.DeltaArray), which uses much less memory when most states are nominal. Not used with store.
+        The default is False.
+    aggregators : list, optional
+        Aggregators (see the aggregators module) to update with the results of each scenario as it finishes, e.g. to 
+        compute summary metrics without keeping every history. The default is [].
+    keephists : bool, optional
+        Whether to keep the histories of the fault scenarios in mdlhists (if False, only the nominal history is returned). 
+        The default is True.
+    prevresults : tuple, optional
+        Results (endclasses, mdlhists) of a previous run of the approach (e.g., before modes or sample times were added
+        with add_modes/add_sampletimes), so that only the scenarios not in the previous results are run. The previous 
+        and new results are then merged (see merge_appresults). Aggregators are only updated with the new scenarios. 
+        The default is (), which runs all scenarios.
+
+    Returns
+    -------
+    endclasses : dict
+        A dictionary with the rate, cost, and expected cost of each scenario run with structure {scenname:{expected cost, cost, rate}}
+    mdlhists : dict
+        A dictionary with the history of all model states for each scenario (including the nominal)
+    """
+    scenlist = [scen for scen in app.scenlist if not prevresults or scen['properties']['name'] not in prevresults[0]]
+    endclasses, mdlhists = run_scenlist(mdl, scenlist, app.create_nomscen(mdl), app.times, reuse=reuse, staged=staged, track=track, localize=localize, session=session, dedup=dedup, store=store, sparse=sparse, aggregators=aggregators, keephists=keephists)
+    if prevresults: endclasses, mdlhists = merge_appresults(app, prevresults, (endclasses, mdlhists))
+    return endclasses, mdlhists
+
+def run_approach_budgeted(mdl, app, maxtime=None, maxscens=None, costbounds={}, reuse=False, staged=False, track=True, localize=False, session=None, dedup=False, store=None, sparse=False, aggregators=[], keephists=True, prevresults=()):
+    """
+    Injects and propagates faults in the model defined by a given sample approach within a time or scenario budget.
+    The scenarios are run in order of their prior importance (see prioritize_scenarios) until the budget is used, 
+    so the results may be used at any point along with bounds on the expected cost of the scenarios not run.
+
+    Parameters
+    ----------
+    mdl : model
+        The model to inject faults in.
+    app : sampleapproach
+        SampleApproach used to define the list of faults and sample time for the model.
+    maxtime : float, optional
+        Time budget (in seconds) for running the approach. The default is None (no time budget).
+    maxscens : int, optional
+        Maximum number of scenarios to run. The default is None (no scenario budget).
+    costbounds : dict or float, optional
+        Bounds on the expected cost per unit rate (expected cost/rate) of each mode, used to prioritize the scenarios 
+        and bound the expected cost of the scenarios not run (see find_costbounds). Modes without bounds are 
+        prioritized by their repair cost, and the expected cost of their scenarios is not bounded above. The default is {}.
+    reuse, staged, track, localize, session, dedup, store, sparse, aggregators, keephists, prevresults : optional
+        Options for running the scenarios (see run_approach)
+
+    Returns
+    -------
+    endclasses : dict
+        A dictionary with the rate, cost, and expected cost of each scenario run with structure {scenname:{expected cost, cost, rate}}
+    mdlhists : dict
+        A dictionary with the history of all model states for each scenario (including the nominal)
+    bounds : dict
+        Bounds on the expected cost of the approach (see calc_costbounds)
+    """
+    scenlist = [scen for scen in app.scenlist if not prevresults or scen['properties']['name'] not in prevresults[0]]
+    scenlist, scenbounds = prioritize_scenarios(app, costbounds, scenlist)
+    if np.isinf(scenbounds[:,1]).any(): 
+        print("Warning: costbounds not given for all modes--scenarios without bounds are prioritized by repair cost and the expected cost of those not run is unbounded")
+    endclasses, mdlhists = run_scenlist(mdl, scenlist, app.create_nomscen(mdl), app.times, reuse=reuse, staged=staged, track=track, localize=localize, session=session, dedup=dedup, store=store, sparse=sparse, aggregators=aggregators, keephists=keephists, maxtime=maxtime, maxscens=maxscens)
+    if prevresults: endclasses, mdlhists = merge_appresults(app, prevresults, (endclasses, mdlhists))
+    return endclasses, mdlhists, calc_costbounds(endclasses, scenlist, scenbounds)
+
+def merge_appresults(app, prevresults, results):
+    """
+    Merges the results of two runs of (different versions of) an approach into the results of the current approach.
+    Scenarios not in the approach are dropped, and the rates and expected costs of previous scenarios are re-weighted
+    to the current rates of the scenarios (which change, e.g., when sample times are added in the same phase), 
+    scaling expected cost by the ratio of the new and old rates.
+
+    Parameters
+    ----------
+    app : sampleapproach
+        The current SampleApproach
+    prevresults : tuple
+        Results (endclasses, mdlhists) of the previous run
+    results : tuple
+        Results (endclasses, mdlhists) of the new run, which take precedence over the previous results
+
+    Returns
+    -------
+    endclasses : dict
+        A dictionary with the rate, cost, and expected cost of each scenario run, in the order of app.scenlist
+    mdlhists : dict
+        A dictionary with the history of all model states for each scenario (including the nominal)
+    """
+    prevendclasses, prevhists = prevresults
+    newendclasses, newhists = results
+    endclasses = {}
+    mdlhists = {'nominal': newhists.get('nominal', prevhists.get('nominal'))}
+    for scen in app.scenlist:
+        name, rate = scen['properties']['name'], scen['properties']['rate']
+        if name in newendclasses:       endclasses[name] = newendclasses[name]
+        elif name in prevendclasses:
+            endclass = prevendclasses[name]
+            scale = rate/endclass['rate'] if endclass['rate'] else np.nan
+            endclasses[name] = {**endclass, 'rate':rate, 'expected cost':endclass['expected cost']*scale}
+        if name in newhists:            mdlhists[name] = newhists[name]
+        elif name in prevhists:         mdlhists[name] = prevhists[name]
+    return endclasses, mdlhists
+
+def find_costbounds(app, costbounds={}):
+    """
+    Finds lower and upper bounds on the expected cost per unit rate (i.e., expected cost/rate) of each mode in the approach
+
+    Parameters
+    ----------
+    app : sampleapproach
+        SampleApproach with the modes to bound
+    costbounds : dict or float, optional
+        Bounds given for the modes, with structure {fxnmode: upper} or {fxnmode: (lower, upper)} (or a float upper bound 
+        for all modes). Modes without bounds given are bounded by (0, inf), since the cost per unit rate depends on 
+        find_classification (e.g., the example models scale cost by a lifetime). The default is {}.
+
+    Returns
+    -------
+    bounds : dict
+        Bounds for each mode and joint mode, with structure {fxnmode: (lower, upper)}
+    """
+    if not isinstance(costbounds, dict): costbounds = dict.fromkeys(app.rates, costbounds)
+    bounds = {}
+    for fxnmode in app.rates:
+        bound = costbounds.get(fxnmode, np.inf)
+        bounds[fxnmode] = tuple(bound) if np.ndim(bound) else (0.0, bound)
+    return bounds
+
+def find_repaircosts(app):
+    """ Returns the repair cost (rcost) of each mode in the approach (summed over the modes of joint modes), with structure {fxnmode: rcost}"""
+    rcosts = {fxnmode: params.get('rcost', 0.0) for fxnmode, params in app._fxnmodes.items()}
+    return {fxnmode: rcosts[fxnmode] if type(fxnmode[0])==str else sum([rcosts[fm] for fm in fxnmode]) for fxnmode in app.rates}
+
+def prioritize_scenarios(app, costbounds={}, scenlist=None):
+    """
+    Orders the scenarios of an approach by their prior importance, given by the rate of the scenario times the upper 
+    bound on the expected cost per unit rate of its mode (see find_costbounds), so that the most important scenarios 
+    are run first. Scenarios of modes without an upper bound are instead prioritized by rate times the repair cost (rcost) 
+    of the mode, after the scenarios with bounds that have the same priority.
+
+    Parameters
+    ----------
+    app : sampleapproach
+        SampleApproach with the scenarios to order
+    costbounds : dict or float, optional
+        Bounds on the expected cost per unit rate of the modes (see find_costbounds). The default is {}.
+    scenlist : list, optional
+        Scenarios (of the approach) to order. The default is None, which orders app.scenlist.
+
+    Returns
+    -------
+    scenlist : list
+        scenarios of the approach in order of prior importance
+    scenbounds : array
+        lower and upper bounds on the expected cost of each scenario in scenlist (with shape (scenarios, 2))
+    """
+    bounds = find_costbounds(app, costbounds)
+    rcosts = find_repaircosts(app)
+    scenmodes = {scenid: fxnmode for (fxnmode, phase), ids in app.scenids.items() for scenid in ids}
+    if scenlist is None: scenlist = app.scenlist
+    modes = [scenmodes[scen['properties']['name']] for scen in scenlist]
+    rates = np.array([scen['properties']['rate'] for scen in scenlist], dtype=float)
+    scenbounds = rates[:,None]*np.array([bounds[fxnmode] for fxnmode in modes], dtype=float).reshape(-1,2)
+    priorities = np.where(np.isinf(scenbounds[:,1]), rates*np.array([rcosts[fxnmode] for fxnmode in modes], dtype=float), scenbounds[:,1])
+    order = np.lexsort((np.isinf(scenbounds[:,1]), -priorities))
+    return [scenlist[i] for i in order], scenbounds[order]
+
+def calc_costbounds(endclasses, scenlist, scenbounds):
+    """
+    Calculates bounds on the total expected cost of a set of scenarios which were only partially run
+
+    Parameters
+    ----------
+    endclasses : dict
+        endclasses of the scenarios that were run
+    scenlist : list
+        all scenarios in the set
+    scenbounds : array
+        lower and upper bounds on the expected cost of each scenario in scenlist (with shape (scenarios, 2))
+
+    Returns
+    -------
+    bounds : dict
+        dict with structure {'run': number of scenarios with results, 'notrun': names of the scenarios not run, 
+        'explored': total expected cost of the scenarios run, 'unexplored': (lower, upper) bounds on the 
+        expected cost of the scenarios not run, 'total': (lower, upper) bounds on the total expected cost}.
+        The upper bounds are infinite if scenarios of modes without (finite) cost bounds were not run.
+    """
+    notrun = np.array([scen['properties']['name'] not in endclasses for scen in scenlist], dtype=bool)
+    explored = float(sum([endclass['expected cost'] for endclass in endclasses.values()]))
+    unexplored = tuple(scenbounds[notrun].sum(axis=0).tolist()) if notrun.any() else (0.0, 0.0)
+    return {'run':len(endclasses), 'notrun':[scen['properties']['name'] for scen, nr in zip(scenlist, notrun) if nr],
+            'explored':explored, 'unexplored':unexplored, 'total':(explored+unexplored[0], explored+unexplored[1])}
+
+def run_scenlist(mdl, scenlist, nomscen, ctimes, reuse=False, staged=False, track=True, localize=False, session=None, dedup=False, store=None, sparse=False, aggregators=[], keephists=True, maxtime=None, maxscens=None):
+    """
+    Propagates a list of fault scenarios in a model (used in run_list and run_approach)
+
+    Parameters
+    ----------
+    mdl : model
+        The model to inject faults in.
+    scenlist : list
+        List of fault scenarios (dicts of faults and properties) to run
+    nomscen : dict
+        The nominal scenario to compare the fault scenarios with
+    ctimes : list
+        Times the faults are injected at (used to copy the nominal model in staged execution)
+    reuse, staged, track, localize, session, dedup, store, sparse, aggregators, keephists, maxtime, maxscens : optional
+        Options for running the scenarios (see run_approach). If maxtime or maxscens are given, the scenarios are run in 
+        the order given until the budget is used.
 
     Returns
     -------
@@ -242,40 +467,229 @@ def run_approach(mdl, app, reuse=False, staged=False, track=True):
     mdlhists : dict
         A dictionary with the history of all model states for each scenario (including the nominal)
     """
+    starttime = time.time()
     if reuse and staged:
         print("invalid to use reuse and staged options at the same time. Using staged")
         reuse=False
-    mdl.reset()
-    if staged:
-        nomhist, c_mdl = prop_one_scen(mdl, app.create_nomscen(mdl), track=track, ctimes=app.times)
-    else:
-        nomhist, c_mdl = prop_one_scen(mdl, app.create_nomscen(mdl), track=track)
-    nomresgraph = mdl.return_stategraph()
-    mdl.reset()
+    if dedup and not track:
+        print("deduplicating scenarios requires tracking model states. Running all scenarios")
+        dedup=False
+    if store and not track:
+        print("storing histories requires tracking model states. Not storing histories")
+        store=None
+    mdl.reset() #make sure the model is actually starting from the beginning
+    if staged:  nomhist, nomresgraph, c_mdl = prop_nominal(mdl, nomscen, track=track, ctimes=ctimes, session=session)
+    else:       nomhist, nomresgraph, c_mdl = prop_nominal(mdl, nomscen, track=track, session=session)
     
     endclasses = {}
     mdlhists = {}
     mdlhists['nominal'] = nomhist
-    for i, scen in enumerate(app.scenlist):
-        #run model with fault scenario
-        if staged:
+    if store: 
+        store = rio.HistStore(store, nomhist, [scen['properties']['name'] for scen in scenlist])
+        mdlhists['nominal'] = store['nominal']
+    runs, basehists = {}, {} # simulated scenarios by fingerprint {fingerprint:[(t_ind, scenname)]} and their histories (for dedup)
+    for i, scen in enumerate(scenlist):
+        if (maxscens is not None and i>=maxscens) or (maxtime is not None and time.time()-starttime>=maxtime): break
+        name = scen['properties']['name']
+        if dedup:
+            t_ind = int(np.where(nomhist['time']==scen['properties']['time'])[0][0])
+            fingerprint = scen_fingerprint(nomhist, t_ind, scen['faults'])
+            match = next((r for r in runs.get(fingerprint, []) if nominal_shiftable(nomhist, r[0], t_ind)), False)
+        else: match = False
+        #run model with fault scenario (or shift the history of the matching scenario)
+        if match:
+            hist = shift_hist(nomhist, basehists[match[1]], match[0], t_ind)
+            mdl.restore_states(hist, -1, mdl.fxns, mdl.flows)
+        elif staged:
             mdl=c_mdl[scen['properties']['time']].copy()
-            mdlhists[scen['properties']['name']], _ =prop_one_scen(mdl, scen, track=track, staged=True, prevhist=nomhist)
+            hist, _ =prop_one_scen(mdl, scen, track=track, staged=True, prevhist=nomhist, localize=localize)
         else:
-            mdlhists[scen['properties']['name']], _ =prop_one_scen(mdl, scen, track=track)
+            hist, _ =prop_one_scen(mdl, scen, track=track, prevhist=nomhist, localize=localize)
         endfaults, endfaultprops = mdl.return_faultmodes()
-        resgraph = mdl.return_stategraph()
-        
-        endflows = rp.compare_graphflows(resgraph, nomresgraph) #TODO: supercede this with something in faultprop?
-        endclasses[scen['properties']['name']] = mdl.find_classification(resgraph, endfaultprops, endflows, scen, {'nominal':nomhist, 'faulty':mdlhists[scen['properties']['name']]})
+        resgraph = mdl.return_lazygraph() # graph is only built if used in find_classification
+        endflows = mdl.find_endflows(resgraph.flowstates, nomresgraph.flowstates)
+        endclasses[name] = mdl.find_classification(resgraph, endfaultprops, endflows, scen, {'nominal':nomhist, 'faulty':hist})
+        if aggregators:
+            import fmdtools.aggregators as ag
+            res = ag.ScenResult(name, scen, endclasses[name], hist, nomhist)
+            for aggregator in aggregators: aggregator.update(res)
+        if store:       hist = store.add(name, hist)
+        elif sparse:    hist = rio.encode_delta(hist, nomhist)
+        if dedup and not match: 
+            runs.setdefault(fingerprint, []).append((t_ind, name))
+            basehists[name] = hist
+        if keephists:   mdlhists[name] = hist
         
         if reuse: mdl.reset()
         elif staged: _
         else: mdl = mdl.__class__(params=mdl.params)
+    if store: store.flush()
     return endclasses, mdlhists
 
+def scen_fingerprint(nomhist, t_ind, faults):
+    """
+    Returns a hashable fingerprint of a fault scenario, made of the faults injected and the nominal model state 
+    at the injection time (at t_ind in the nominal history). Scenarios with the same fingerprint start from the same state
+    and thus (if the nominal run is time-invariant between them, see nominal_shiftable) have the same results up to a time shift.
+    """
+    return (freeze(faults), tuple(freeze(vals[t_ind]) for vals in hist_values(nomhist)))
+
+def nominal_shiftable(nomhist, t0_ind, t1_ind):
+    """
+    Checks whether the nominal history from t1_ind to the end is the same as the nominal history from t0_ind shifted 
+    forward by t1_ind-t0_ind, meaning the results of a scenario at t0_ind may be shifted to give the results of the
+    same scenario at t1_ind (provided both start from the same state).
+    """
+    if t0_ind > t1_ind: return False
+    end = len(nomhist['time'])-(t1_ind-t0_ind)
+    for vals in hist_values(nomhist):
+        if type(vals)==list:
+            if vals[t0_ind:end]!=vals[t1_ind:]:                     return False
+        elif not np.array_equal(vals[t0_ind:end], vals[t1_ind:]):   return False
+    return True
+
+def shift_hist(nomhist, hist, t0_ind, t1_ind):
+    """
+    Creates the history of a scenario starting at t1_ind from the history of the same scenario starting at t0_ind, 
+    using the nominal history before t1_ind and the (shifted) history of the scenario after.
+
+    Parameters
+    ----------
+    nomhist : dict
+        The nominal history of the model
+    hist : dict
+        The history of the scenario injected at t0_ind
+    t0_ind : int
+        Index of the injection time of the scenario in hist
+    t1_ind : int
+        Index of the injection time of the new scenario
+
+    Returns
+    -------
+    newhist : dict
+        History of the new scenario
+    """
+    newhist={}
+    for key, nomval in nomhist.items():
+        if key=='time':                 newhist[key] = np.copy(nomval)
+        elif type(nomval)==dict:        newhist[key] = shift_hist(nomval, hist[key], t0_ind, t1_ind)
+        else:
+            end = len(nomval)-(t1_ind-t0_ind)
+            if type(nomval)==list:      newhist[key] = nomval[:t1_ind] + hist[key][t0_ind:end]
+            else:                       newhist[key] = np.concatenate((nomval[:t1_ind], hist[key][t0_ind:end]))
+    return newhist
 
+def hist_values(mdlhist):
+    """Returns a list of the histories (arrays/lists) of each state in a model history (not including time)"""
+    return [vals for key, val in mdlhist.items() if key!='time' for vals in (hist_values(val) if type(val)==dict else [val])]
 
+def prop_nominal(mdl, nomscen, track=True, ctimes=[], gtype='normal', session=None):
+    """
+    Runs the nominal scenario in the model (or retrieves it from the session, if given) and resets the model
+
+    Parameters
+    ----------
+    mdl : model
+        The model to run
+    nomscen : dict
+        The nominal scenario
+    track : bool, optional
+        Whether to track states over time. The default is True.
+    ctimes : list, optional
+        List of times to copy the model at (for use in staged execution). The default is [].
+    gtype : str, optional
+        The type of graph to return ('normal', 'bipartite', or 'component'). The default is 'normal'.
+    session : Session, optional
+        Session to retrieve/store the nominal run in. The default is None.
+
+    Returns
+    -------
+    nomhist : dict
+        A dictionary with a history of modelstates in the nominal scenario
+    nomresgraph : StateGraph
+        States of the model at the end of the nominal run (see modeldef.StateGraph, which builds the graph when used)
+    c_mdl : dict
+        A dictionary of models at each time given in ctimes with structure {time:model}
+    """
+    if session is not None: return session.get_nominal(mdl, nomscen, track=track, ctimes=ctimes, gtype=gtype)
+    nomhist, c_mdl = prop_one_scen(mdl, nomscen, track=track, ctimes=ctimes)
+    nomresgraph = mdl.return_lazygraph(gtype)
+    mdl.reset()
+    return nomhist, nomresgraph, c_mdl
+
+class Session():
+    """
+    Cache of nominal runs for reuse over repeated calls of run_one_fault, run_list, and run_approach, 
+    (e.g. in interactive sessions or design loops) so the nominal scenario is only run once for each model configuration.
+    
+    Nominal runs are identified by the model class, params, times, and tstep (along with the nominal scenario, tracking,
+    and graph type), so models with the same configuration share the same nominal run. Changes to the model not reflected
+    in these (e.g. changing attributes of the model directly) require clearing the session.
+    
+    Attributes
+    ----------
+    nominals : dict
+        nominal runs, structured {key: {'hist':nomhist, 'resgraph': nomresgraph, 'c_mdl':{time:model}}}
+    hits : int
+        number of times a nominal run has been reused
+    """
+    def __init__(self):
+        self.nominals = {}
+        self.hits = 0
+    def find_key(self, mdl, nomscen, track=True, gtype='normal'):
+        """Returns the key of the nominal run of a given model configuration in nominals"""
+        return (mdl.__class__, freeze(getattr(mdl, 'params', {})), tuple(mdl.times), mdl.tstep, freeze(nomscen['faults']), track, gtype)
+    def get_nominal(self, mdl, nomscen, track=True, ctimes=[], gtype='normal'):
+        """
+        Retrieves the nominal run of the model (running it if it has not been run or if models at ctimes are not available)
+
+        Parameters
+        ----------
+        mdl : model
+            The model to run
+        nomscen : dict
+            The nominal scenario
+        track : bool, optional
+            Whether to track states over time. The default is True.
+        ctimes : list, optional
+            List of times to copy the model at (for use in staged execution). The default is [].
+        gtype : str, optional
+            The type of graph to return ('normal', 'bipartite', or 'component'). The default is 'normal'.
+
+        Returns
+        -------
+        nomhist : dict
+            A dictionary with a history of modelstates in the nominal scenario (shared by every call, so should not be modified)
+        nomresgraph : StateGraph
+            States of the model at the end of the nominal run (see modeldef.StateGraph)
+        c_mdl : dict
+            A dictionary of models at each time given in ctimes with structure {time:model} (should be copied before being run)
+        """
+        key = self.find_key(mdl, nomscen, track, gtype)
+        nom = self.nominals.get(key)
+        if nom and set(ctimes).issubset(nom['c_mdl']): self.hits+=1
+        else:
+            if nom:     ctimes = sorted(set(ctimes).union(nom['c_mdl']))
+            mdl.reset()
+            nomhist, c_mdl = prop_one_scen(mdl, nomscen, track=track, ctimes=ctimes)
+            nom = {'hist':nomhist, 'resgraph':mdl.return_lazygraph(gtype), 'c_mdl':c_mdl}
+            self.nominals[key] = nom
+        mdl.reset()
+        return nom['hist'], nom['resgraph'], {t:nom['c_mdl'][t] for t in ctimes}
+    def clear(self):
+        """Clears all nominal runs from the session"""
+        self.nominals.clear()
+
+def freeze(obj):
+    """Returns a hashable version of obj (a nested structure of dicts, sets, lists, arrays, etc) which is the same for equal structures"""
+    if type(obj)==dict:                 return tuple(sorted(((freeze(k), freeze(v)) for k,v in obj.items()), key=repr))
+    elif type(obj) in (set, frozenset): return ('set',)+tuple(sorted((freeze(v) for v in obj), key=repr))
+    elif type(obj) in (list, tuple):    return tuple(freeze(v) for v in obj)
+    elif isinstance(obj, np.ndarray):   return (obj.dtype.str, obj.shape, obj.tobytes())
+    try:
+        hash(obj)
+        return obj
+    except TypeError: return repr(obj)
 
 # =============================================================================
 # from pathos.pp import ParallelPool
@@ -314,7 +728,7 @@ def run_approach(mdl, app, reuse=False, staged=False, track=True):
 #     return endclasses, mdlhists
 # =============================================================================
        
-def prop_one_scen(mdl, scen, track=True, staged=False, ctimes=[], prevhist={}):
+def prop_one_scen(mdl, scen, track=True, staged=False, ctimes=[], prevhist={}, localize=False):
     """
     Runs a fault scenario in the model over time
 
@@ -331,7 +745,11 @@ def prop_one_scen(mdl, scen, track=True, staged=False, ctimes=[], prevhist={}):
     ctimes : list, optional
         List of times to copy the model (for use in staged execution). The default is [].
     prevhist : dict, optional
-        The previous results hist (for used in staged execution). The default is {}.
+        The previous results hist (for used in staged or localized execution). The default is {}.
+    localize : bool, optional
+        Whether to only simulate and track the functions and flows reachable from the faults in the scenario (given by mdl.reachable).
+        The rest of the model is unaffected by the faults, so its history references prevhist (the nominal history) and its
+        state is restored from prevhist at the end of the run. The default is False.
 
     Returns
     -------
@@ -340,31 +758,42 @@ def prop_one_scen(mdl, scen, track=True, staged=False, ctimes=[], prevhist={}):
     c_mdl : dict
         A dictionary of models at each time given in ctimes with structure {time:model}
     """
+    #if localized, only the part of the model reachable from the faults is simulated
+    localize = localize and bool(scen['faults'])
+    fxns, flows = None, None
+    if localize:
+        if not prevhist: raise Exception("Localized execution requires the nominal history (prevhist)")
+        fxns, flows = mdl.find_reachable(scen['faults'])
     #if staged, we want it to start a new run from the starting time of the scenario,
     # using a copy of the input model (which is the nominal run) at this time
     if staged:
         timerange=np.arange(scen['properties']['time'], mdl.times[-1]+1, mdl.tstep)
         shift = len(np.arange(mdl.times[0], scen['properties']['time'], mdl.tstep))
         if track: 
-            if prevhist:    mdlhist = copy.deepcopy(prevhist)
+            if localize:    mdlhist = ref_mdlhist(prevhist, fxns, flows)
+            elif prevhist:  mdlhist = copy.deepcopy(prevhist)
             else:           mdlhist = init_mdlhist(mdl, timerange)
     else: 
         timerange = np.arange(mdl.times[0], mdl.times[-1]+1, mdl.tstep)
         shift = 0
-        if track:  mdlhist = init_mdlhist(mdl, timerange)
+        if track:
+            if localize:    mdlhist = ref_mdlhist(prevhist, fxns, flows)
+            else:           mdlhist = init_mdlhist(mdl, timerange)
     if not track: mdlhist={}
     # run model through the time range defined in the object
     c_mdl=dict.fromkeys(ctimes)
-    flowstates={}
+    if localize:    flowstates={flowname:flow.status() for flowname, flow in mdl.flows.items() if flowname in flows}
+    else:           flowstates={}
     for t_ind, t in enumerate(timerange):
        # inject fault when it occurs, track defined flow states and graph 
-        if t==scen['properties']['time']: flowstates = propagate(mdl, scen['faults'], t, flowstates)
-        else: flowstates = propagate(mdl,[],t, flowstates)
-        if track: update_mdlhist(mdl, mdlhist, t_ind+shift)
+        if t==scen['properties']['time']: flowstates = propagate(mdl, scen['faults'], t, flowstates, fxns)
+        else: flowstates = propagate(mdl,[],t, flowstates, fxns)
+        if track: update_mdlhist(mdl, mdlhist, t_ind+shift, fxns, flows)
         if t in ctimes: c_mdl[t]=mdl.copy()
+    if localize: mdl.restore_states(prevhist, -1, set(mdl.fxns).difference(fxns), set(mdl.flows).difference(flows))
     return mdlhist, c_mdl
 
-def propagate(mdl, initfaults, time, flowstates={}):
+def propagate(mdl, initfaults, time, flowstates={}, fxns=None):
     """
     Injects and propagates faults through the graph at one time-step
 
@@ -378,6 +807,9 @@ def propagate(mdl, initfaults, time, flowstates={}):
         The current timestep.
     flowstates : dict, optional
         States of the model at the previous time-step (if used). The default is {}.
+    fxns : iterable, optional
+        Functions to propagate faults in (if only part of the model is simulated, e.g. in localized execution).
+        The default is None, which propagates faults in all functions.
 
     Returns
     -------
@@ -386,6 +818,7 @@ def propagate(mdl, initfaults, time, flowstates={}):
     """
     #set up history of flows to see if any has changed
     activefxns=mdl.timelyfxns.copy()
+    if fxns is not None:    activefxns.difference_update(activefxns.difference(fxns)) # (in place, so functions are updated in the same order)
     nextfxns=set()
     #Step 1: Find out what the current value of the flows are (if not generated in the last iteration)
     if not flowstates:
@@ -415,7 +848,7 @@ def prop_time(mdl, activefxns, nextfxns, flowstates, time, initfaults):
     nextfxns : set
         Set of active functions for the next iteration.
     flowstates : dict
-        States of each flow in the model.
+        States of each flow in the model (or in the part of the model being simulated).
     time : float
         Current time-step.
     initfaults : dict
@@ -435,7 +868,8 @@ def prop_time(mdl, activefxns, nextfxns, flowstates, time, initfaults):
             newstates, newfaults = mdl.fxns[fxnname].return_states() 
             if oldstates != newstates or oldfaults != newfaults: nextfxns.update([fxnname])
         #Check to see what flows have new values and add connected functions
-        for flowname, flow in mdl.flows.items():
+        for flowname in flowstates:
+            flow = mdl.flows[flowname]
             if flowstates[flowname]!=flow.status():
                 nextfxns.update(set([n for n in mdl.bipartite.neighbors(flowname)]))
             flowstates[flowname]=flow.status()
@@ -451,7 +885,7 @@ def prop_time(mdl, activefxns, nextfxns, flowstates, time, initfaults):
 
 #update_mdlhist
 # find a way to make faster (e.g. by automatically getting values by reference)
-def update_mdlhist(mdl, mdlhist, t_ind):
+def update_mdlhist(mdl, mdlhist, t_ind, fxns=None, flows=None):
     """
     Updates the model history at a given time.
 
@@ -463,19 +897,25 @@ def update_mdlhist(mdl, mdlhist, t_ind):
         History of model states (a dict with a vector of each state)
     t_ind : float
         The time to update the model history at.
+    fxns : iterable, optional
+        Functions to update. The default is None, which updates all functions.
+    flows : iterable, optional
+        Flows to update. The default is None, which updates all flows.
     """
-    update_flowhist(mdl, mdlhist, t_ind)
-    update_fxnhist(mdl, mdlhist, t_ind)
-def update_flowhist(mdl, mdlhist, t_ind):
-    """ Updates the flows in the model history at t_ind """
-    for flowname, flow in mdl.flows.items():
-        atts=flow.status()
+    update_flowhist(mdl, mdlhist, t_ind, flows)
+    update_fxnhist(mdl, mdlhist, t_ind, fxns)
+def update_flowhist(mdl, mdlhist, t_ind, flows=None):
+    """ Updates the flows (all, or those in flows) in the model history at t_ind """
+    if flows is None: flows = mdl.flows
+    for flowname in flows:
+        atts=mdl.flows[flowname].status()
         for att, val in atts.items():
             mdlhist["flows"][flowname][att][t_ind] = val
-def update_fxnhist(mdl, mdlhist, t_ind):
-    """ Updates the functions (faults and states) in the model history at t_ind """
-    for fxnname, fxn in mdl.fxns.items():
-        states, faults = fxn.return_states()
+def update_fxnhist(mdl, mdlhist, t_ind, fxns=None):
+    """ Updates the functions (all, or those in fxns) (faults and states) in the model history at t_ind """
+    if fxns is None: fxns = mdl.fxns
+    for fxnname in fxns:
+        states, faults = mdl.fxns[fxnname].return_states()
         mdlhist["functions"][fxnname]["faults"][t_ind]=faults
         for state, value in states.items():
             mdlhist["functions"][fxnname][state][t_ind] = value 
@@ -501,24 +941,55 @@ def init_mdlhist(mdl, timerange):
     mdlhist["functions"]=init_fxnhist(mdl, timerange)
     mdlhist["time"]=np.array([i for i in timerange])
     return mdlhist
+def ref_mdlhist(nomhist, fxns, flows):
+    """
+    Initializes a model history for localized execution which copies the history of the given functions and flows
+    from the nominal history and references the nominal history for the rest.
+
+    Parameters
+    ----------
+    nomhist : dict
+        History of the nominal run
+    fxns : iterable
+        Names of functions to copy (i.e. which will be updated)
+    flows : iterable
+        Names of flows to copy (i.e. which will be updated)
+
+    Returns
+    -------
+    mdlhist : dict
+        A dictionary history of each model state (copied or referenced from nomhist)
+    """
+    mdlhist={}
+    mdlhist["flows"]={flowname: copy.deepcopy(flowhist) if flowname in flows else flowhist for flowname, flowhist in nomhist["flows"].items()}
+    mdlhist["functions"]={fxnname: copy.deepcopy(fxnhist) if fxnname in fxns else fxnhist for fxnname, fxnhist in nomhist["functions"].items()}
+    mdlhist["time"]=nomhist["time"].copy()
+    return mdlhist
+def init_dtype(val):
+    """ Returns the dtype of the history of a variable with initial value val. Integers are kept as floats and strings
+    as objects, so later values which are not integers (or are longer strings) than the initial value are not truncated."""
+    dtype = np.asarray(val).dtype
+    if dtype.kind in 'iu':      return np.dtype(np.float64)
+    elif dtype.kind in 'SU':    return np.dtype(object)
+    else:                       return dtype
 def init_flowhist(mdl, timerange):
-    """ Initializes the flow history flowhist of the model mdl over the time range timerange"""
+    """ Initializes the flow history flowhist of the model mdl over the time range timerange (with the types given by init_dtype)"""
     flowhist={}
     for flowname, flow in mdl.flows.items():
         atts=flow.status()
         flowhist[flowname] = {}
         for att, val in atts.items():
-            flowhist[flowname][att] = np.full([len(timerange)], val)
+            flowhist[flowname][att] = np.full([len(timerange)], val, dtype=init_dtype(val))
     return flowhist
 def init_fxnhist(mdl, timerange):
-    """Initializes the function state history fxnhist of the model mdl over the time range timerange"""
+    """Initializes the function state history fxnhist of the model mdl over the time range timerange (with the types given by init_dtype)"""
     fxnhist = {}
     for fxnname, fxn in mdl.fxns.items():
         states, faults = fxn.return_states()
         fxnhist[fxnname]={}
         fxnhist[fxnname]["faults"]=[faults for i in timerange]
         for state, value in states.items():
-            fxnhist[fxnname][state] = np.full([len(timerange)], value)
+            fxnhist[fxnname][state] = np.full([len(timerange)], value, dtype=init_dtype(value))
     return fxnhist
 
     
@@ -10,7 +10,8 @@ import numpy as np
 import operator
 import itertools
 import networkx as nx
-from scipy.stats import binom
+from copy import deepcopy
+from collections import OrderedDict
 
 # MAJOR CLASSES
 class Block(object):
@@ -128,8 +129,10 @@ class FxnBlock(Block):
         names of timers to be used in the function (if any)
     tstep : float
         timestep of the model in the function (added in model definition)
+    memo : int
+        maximum number of results to store in the memo cache of the function (0 if not used)
     """
-    def __init__(self,flownames,flows, states={}, components={},timers={}, timely=True):
+    def __init__(self,flownames,flows, states={}, components={},timers={}, timely=True, memo=0):
         """
         Intances the function superclass with the relevant parameters.
 
@@ -147,6 +150,12 @@ class FxnBlock(Block):
             Set of names of timers to use in the function. The default is {}.
         timely : bool, optional
             Whether or not the function depends on time (or just input/output). The default is True.
+        memo : int, optional
+            Maximum number of results to cache for the function (if not timely). When used, the outputs (flows, states, 
+            and faults) of the function are stored by the inputs (flows, states, and faults) in a cache shared by all
+            instances of the function with the same arguments (see Memo), so condfaults and behavior are only run
+            for new inputs. Should only be used if these methods do not depend on time or other attributes. 
+            The default is 0 (not used).
         """
         self.type = 'function'
         self.flows=self.make_flowdict(flownames,flows)
@@ -159,6 +168,11 @@ class FxnBlock(Block):
         self.timers = timers
         for timername in timers:
             setattr(self, timername, Timer(timername))
+        if memo and timely:
+            print("Memo cache can only be used in functions which are not timely. Not using cache")
+            memo=0
+        self.memo = memo
+        self._memo = None
         super().__init__(states, timely)
     def make_flowdict(self,flownames,flows):
         """
@@ -220,10 +234,38 @@ class FxnBlock(Block):
         copy = self.__class__(newflows, *attr)
         copy.faults = self.faults.copy()
         for state in self._initstates.keys():
-            setattr(copy, state, self._initstates[state])
+            setattr(copy, state, deepcopy(getattr(self, state)))
+        for timername in self.timers:
+            getattr(copy, timername).time = getattr(self, timername).time
+        for cname, component in self.components.items():
+            copy.components[cname].faults = component.faults.copy()
+            for state in component._initstates.keys():
+                setattr(copy.components[cname], state, deepcopy(getattr(component, state)))
+            if hasattr(component, 'time'): copy.components[cname].time = component.time
         if hasattr(self, 'time'): copy.time=self.time
         if hasattr(self, 'tstep'): copy.tstep=self.tstep
+        copy._memo = self._memo
         return copy
+    def memo_key(self):
+        """ Returns the current inputs of the function (flows, states, faults) as a hashable key for the memo cache """
+        key = (tuple([getattr(flow, att) for flow in self.flows.values() for att in flow._attributes]),
+               tuple([getattr(self, state) for state in self._initstates]), frozenset(self.faults),
+               tuple([(frozenset(c.faults), tuple([getattr(c, s) for s in c._initstates])) for c in self.components.values()]))
+        hash(key)
+        return key
+    def memo_outputs(self):
+        """ Returns the current outputs of the function (flows, states, faults) to store in the memo cache """
+        return self.memo_key()
+    def set_outputs(self, outputs):
+        """ Sets the flows, states, and faults of the function to those stored in the memo cache """
+        flowvals, statevals, faults, compvals = outputs
+        atts = [(flow, att) for flow in self.flows.values() for att in flow._attributes]
+        for (flow, att), val in zip(atts, flowvals):        setattr(flow, att, val)
+        for state, val in zip(self._initstates, statevals): setattr(self, state, val)
+        self.faults = set(faults)
+        for component, (cfaults, cvals) in zip(self.components.values(), compvals):
+            component.faults = set(cfaults)
+            for state, val in zip(component._initstates, cvals): setattr(component, state, val)
     def updatefxn(self,faults=['nom'], time=0):
         """
         Updates the state of the function at a given time and injects faults.
@@ -236,8 +278,17 @@ class FxnBlock(Block):
             Model time. The default is 0.
         """
         self.faults.update(faults)  #if there is a fault, it is instantiated in the function
+        if self._memo is not None:      #if the function has a memo cache, the outputs for the inputs may be reused
+            try:                key = self.memo_key()
+            except TypeError:   key = None  # (unhashable states can't be cached)
+            outputs = self._memo.get(key)
+            if outputs is not None:
+                self.set_outputs(outputs)
+                self.time=time
+                return
         self.condfaults(time)           #conditional faults and behavior are then run
         self.behavior(time)
+        if self._memo is not None and key is not None: self._memo.put(key, self.memo_outputs())
         self.time=time
         return
         
@@ -334,6 +385,8 @@ class Model(object):
         bipartite graph view of the functions and flows
     graph : networkx graph
         multigraph view of functions and flows
+    reachable : dict
+        functions and flows reachable from each function and flow (i.e., its connected component in the bipartite graph)
     """
     def __init__(self):
         """
@@ -389,6 +442,7 @@ class Model(object):
         for flowname in flownames:
             self._fxnflows.append((name, flowname))
         if self.fxns[name].timely: self.timelyfxns.update([name])
+        if self.fxns[name].memo: self.fxns[name]._memo = get_memo(classobj, args, self.tstep, self.fxns[name].memo)
         self.fxns[name].tstep=self.tstep
     def get_flows(self,flownames):
         """ Returns a list of the model flow objects """
@@ -408,22 +462,42 @@ class Model(object):
         self.bipartite.add_edges_from(self._fxnflows)
         self.multgraph = nx.projected_graph(self.bipartite, self.fxns,multigraph=True)
         self.graph = nx.projected_graph(self.bipartite, self.fxns)
+        #topology of the graph is cached so state graphs/end flows can be found without re-projecting
+        self._edgeflows = {edge: list(self.multgraph.get_edge_data(*edge)) for edge in self.graph.edges}
+        self._graphflows = list(dict.fromkeys(flow for flows in self._edgeflows.values() for flow in flows))
+        self._skeleton = nx.Graph()
+        self._skeleton.add_nodes_from(self.graph.nodes)
+        self._skeleton.add_edges_from(self.graph.edges)
         attrs={}
         #do we still need to do this for the objects? maybe not--I don't think we use the info anymore
-        for edge in self.graph.edges:
-            midedges=list(self.multgraph.subgraph(edge).edges)
-            flows= [midedge[2] for midedge in midedges]
-            flowdict={}
-            for flow in flows:
-                flowdict[flow]=self.flows[flow]
-            attrs[edge]=flowdict
+        for edge, flows in self._edgeflows.items():
+            attrs[edge]={flow:self.flows[flow] for flow in flows}
         nx.set_edge_attributes(self.graph, attrs)
         
         nx.set_node_attributes(self.graph, self.fxns, 'obj')
+        self.reachable = {node:comp for comp in nx.connected_components(self.bipartite) for node in comp}
         #self.graph=nx.DiGraph()
         #self.graph.add_nodes_from(self.fxn)
         #self.graph=
         return self.graph
+    def find_reachable(self, fxnnames):
+        """
+        Finds the functions and flows that faults in the given functions could affect
+
+        Parameters
+        ----------
+        fxnnames : iterable
+            Names of the functions with faults (e.g. scen['faults'])
+
+        Returns
+        -------
+        fxns : set
+            Names of the functions reachable from the given functions
+        flows : set
+            Names of the flows reachable from the given functions
+        """
+        nodes = set().union(*[self.reachable[fxnname] for fxnname in fxnnames])
+        return nodes.intersection(self.fxns), nodes.intersection(self.flows)
     def return_componentgraph(self, fxnname):
         """
         Returns a graph representation of the components associated with a given funciton
@@ -452,13 +526,58 @@ class Model(object):
         gtype : str, optional
             Type of graph to return (normal, bipartite, or component). The default is 'normal'.
 
+        Returns
+        -------
+        graph : networkx graph
+            Graph representation of the system with the modes and states added as attributes.
+        """
+        return self.build_stategraph(*self.return_graphstates(), gtype=gtype)
+    def return_lazygraph(self, gtype='normal'):
+        """
+        Returns a StateGraph of the current state of the model, which only builds the networkx graph (see
+        return_stategraph) if it is used. Used in faultprop so graphs are not built for every scenario.
+        """
+        return StateGraph(self, *self.return_graphstates(), gtype=gtype)
+    def return_graphstates(self):
+        """
+        Returns the current states of the flows and functions used to build state graphs
+
+        Returns
+        -------
+        flowstates : dict
+            states of each flow with structure {flow:{attribute:value}}
+        fxnstates : dict
+            states of each function with structure {fxn:{state:value}}
+        fxnmodes : dict
+            modes of each function with structure {fxn:{modes}}
+        """
+        flowstates = {flowname:flow.status() for flowname, flow in self.flows.items()}
+        fxnstates, fxnmodes = {}, {}
+        for fxnname, fxn in self.fxns.items():
+            fxnstates[fxnname], fxnmodes[fxnname] = fxn.return_states()
+        return flowstates, fxnstates, fxnmodes
+    def build_stategraph(self, flowstates, fxnstates, fxnmodes, gtype='normal'):
+        """
+        Builds a graph representation of the given states (from return_graphstates) using the cached model topology.
+
+        Parameters
+        ----------
+        flowstates : dict
+            states of each flow with structure {flow:{attribute:value}}
+        fxnstates : dict
+            states of each function with structure {fxn:{state:value}}
+        fxnmodes : dict
+            modes of each function with structure {fxn:{modes}}
+        gtype : str, optional
+            Type of graph to return (normal, bipartite, or component). The default is 'normal'.
+
         Returns
         -------
         graph : networkx graph
             Graph representation of the system with the modes and states added as attributes.
         """
         if gtype=='normal':
-            graph=nx.projected_graph(self.bipartite, self.fxns)
+            graph=self._skeleton.copy()
         elif gtype=='bipartite':
             graph=self.bipartite.copy()
         elif gtype=='component':
@@ -466,25 +585,16 @@ class Model(object):
             for fxnname, fxn in self.fxns.items():
                 graph.add_nodes_from(fxn.components, bipartite=1)
                 graph.add_edges_from([(fxnname, component) for component in fxn.components])     
-        edgevals, fxnmodes, fxnstates, flowstates, compmodes, compstates, comptypes ={}, {}, {}, {}, {}, {}, {}
+        fxnmodes = {fxnname:modes.copy() for fxnname, modes in fxnmodes.items()}
+        compmodes, compstates, comptypes = {}, {}, {}
         if gtype=='normal': #set edge values for normal graph
-            for edge in graph.edges:
-                midedges=list(self.multgraph.subgraph(edge).edges)
-                flows= [midedge[2] for midedge in midedges]
-                flowdict={}
-                for flow in flows: 
-                    flowdict[flow]=self.flows[flow].status()
-                edgevals[edge]=flowdict
+            edgevals = {edge:{flow:flowstates[flow].copy() for flow in flows} for edge, flows in self._edgeflows.items()}
             nx.set_edge_attributes(graph, edgevals) 
         elif gtype=='bipartite' or gtype=='component': #set flow node values for bipartite graph
-            for flowname, flow in self.flows.items():
-                flowstates[flowname]=flow.status()
-            nx.set_node_attributes(graph, flowstates, 'states')
+            nx.set_node_attributes(graph, {flowname:states.copy() for flowname, states in flowstates.items()}, 'states')
         #set node values for functions
-        for fxnname, fxn in self.fxns.items():
-            fxnstates[fxnname], fxnmodes[fxnname] = fxn.return_states()
-            if gtype=='normal': del graph.nodes[fxnname]['bipartite']
-            if gtype=='component':
+        if gtype=='component':
+            for fxnname, fxn in self.fxns.items():
                 for mode in fxnmodes[fxnname].copy():
                     for compname, comp in fxn.components.items():
                         compstates[compname]={}
@@ -501,6 +611,28 @@ class Model(object):
             nx.set_node_attributes(graph, compmodes, 'modes') 
             nx.set_node_attributes(graph, comptypes, 'iscomponent')
         return graph
+    def find_endflows(self, flowstates, nomflowstates):
+        """
+        Finds the degraded flows at the end of a scenario by comparing flow states with the nominal flow states
+        (giving the same result as resultproc.compare_graphflows for the normal graph).
+
+        Parameters
+        ----------
+        flowstates : dict
+            states of each flow in the scenario (from return_graphstates)
+        nomflowstates : dict
+            states of each flow in the nominal scenario (from return_graphstates)
+
+        Returns
+        -------
+        endflows : dict
+            A dictionary of degraded flows with structure {flow:{attribute:value}}
+        """
+        endflows = {}
+        for flow in self._graphflows:
+            vals, nomvals = flowstates[flow], nomflowstates[flow]
+            if vals!=nomvals: endflows[flow] = {att:val for att, val in vals.items() if val!=nomvals[att]}
+        return endflows
     def return_faultmodes(self):
         """
         Returns faultmodes present in the model
@@ -542,6 +674,30 @@ class Model(object):
             else:       copy.fxns[fxnname]=fxn.copy(flows)
         _ = copy.construct_graph()
         return copy
+    def restore_states(self, mdlhist, t_ind, fxns, flows):
+        """
+        Sets the states and faults of the given functions and the values of the given flows to those in a model history
+
+        Parameters
+        ----------
+        mdlhist : dict
+            History of model states (e.g. from a nominal run)
+        t_ind : int
+            Index of the time in the history to restore
+        fxns : iterable
+            Names of the functions to restore
+        flows : iterable
+            Names of the flows to restore
+        """
+        for flowname in flows:
+            for att, vals in mdlhist['flows'][flowname].items():
+                setattr(self.flows[flowname], att, vals[t_ind])
+        for fxnname in fxns:
+            fxn = self.fxns[fxnname]
+            for state, vals in mdlhist['functions'][fxnname].items():
+                if state=='faults': fxn.faults = set(vals[t_ind])
+                else:               setattr(fxn, state, vals[t_ind])
+            if hasattr(fxn, 'time'): fxn.time = mdlhist['time'][t_ind]
     def reset(self):
         """Resets the model to the initial state (with no faults, etc)"""
         for flowname, flow in self.flows.items():
@@ -552,6 +708,48 @@ class Model(object):
         """Placeholder for model find_classification methods (for running nominal models)"""
         return {'rate':1, 'cost': 1, 'expected cost': 1}
 
+class StateGraph():
+    """
+    Record of the states of a model at a given time which builds the corresponding networkx graph (from the cached
+    topology of the model, see Model.build_stategraph) only when the graph is used. Attributes/methods not defined
+    here (e.g. nodes, edges) are those of the graph.
+
+    Attributes
+    ----------
+    flowstates : dict
+        states of each flow with structure {flow:{attribute:value}}
+    fxnstates : dict
+        states of each function with structure {fxn:{state:value}}
+    fxnmodes : dict
+        modes of each function with structure {fxn:{modes}}
+    gtype : str
+        Type of graph to build (normal, bipartite, or component)
+    """
+    def __init__(self, mdl, flowstates, fxnstates, fxnmodes, gtype='normal'):
+        self.mdl = mdl
+        self.flowstates = flowstates
+        self.fxnstates = fxnstates
+        self.fxnmodes = fxnmodes
+        self.gtype = gtype
+        self._graph = None
+    def build(self):
+        """ Returns the networkx graph of the states (building it if it has not been built already)"""
+        if self._graph is None:
+            self._graph = self.mdl.build_stategraph(self.flowstates, self.fxnstates, self.fxnmodes, gtype=self.gtype)
+        return self._graph
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ['mdl', 'flowstates', 'fxnstates', 'fxnmodes', 'gtype', '_graph']:
+            raise AttributeError(name)
+        return getattr(self.build(), name)
+    def __getitem__(self, key):
+        return self.build()[key]
+    def __iter__(self):
+        return iter(self.build())
+    def __len__(self):
+        return len(self.build())
+    def __contains__(self, node):
+        return node in self.build()
+
 class Timer():
     """class for model timers used in functions (e.g. for conditional faults) """
     def __init__(self, name, tstep=1.0):
@@ -567,6 +765,59 @@ class Timer():
         """ Resets the time to zero"""
         self.time=0
 
+class Memo():
+    """
+    Least-recently-used cache of function outputs by inputs, used in functions with the memo option (see FxnBlock).
+    Memos are shared by all instances of the same function (class and arguments) created with add_fxn (e.g. over 
+    the scenarios run in faultprop), and may be cleared with clear_memos().
+    
+    Attributes
+    ----------
+    size : int
+        maximum number of entries in the cache (the least recently used entries are removed first)
+    entries : OrderedDict
+        cached outputs with structure {inputs:outputs}
+    hits : int
+        number of times a cached output was used
+    misses : int
+        number of times an output was not in the cache
+    """
+    def __init__(self, size=1000):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    def get(self, key):
+        """ Returns the outputs stored for key (or None if they are not stored) """
+        outputs = self.entries.get(key) if key is not None else None
+        if outputs is None: self.misses+=1
+        else:
+            self.hits+=1
+            self.entries.move_to_end(key)
+        return outputs
+    def put(self, key, outputs):
+        """ Stores the outputs for key, removing the least recently used entry if the cache is full """
+        self.entries[key] = outputs
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size: self.entries.popitem(last=False)
+    def clear(self):
+        """ Removes all entries from the cache """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+memos = {} # memos of each function (by class, arguments, and tstep)
+def get_memo(classobj, args, tstep, size):
+    """ Returns the (shared) memo of the function with the given class, arguments, and tstep, creating it if needed """
+    key = (classobj, repr(args), tstep)
+    if key not in memos:    memos[key] = Memo(size)
+    else:                   memos[key].size = max(memos[key].size, size)
+    return memos[key]
+def clear_memos():
+    """ Clears all function memos (e.g. after changing function behaviors) """
+    for memo in memos.values(): memo.clear()
+    memos.clear()
+
 class SampleApproach():
     """
     Class for defining the sample approach to be used for a set of faults.
@@ -583,6 +834,8 @@ class SampleApproach():
         overall failure rates for each component
     jointmodes : list
         (if any) joint fault modes to be injected in the approach
+    jointfaults : dict
+        joint fault parameters used to define the joint modes and their rates
     rates : dict
         rates of each mode (fxn, mode) in each phase, structured {fxnmode: {phase:rate}}
     sampletimes : dict
@@ -591,6 +844,8 @@ class SampleApproach():
         weight to put on each time each fault was injected, structured {fxnmode:phase:time:weight}
     sampparams : dict
         parameters used to sample each mode
+    defaultsamp : dict
+        default parameters used to sample modes (including modes added with add_modes)
     scenlist : list
         list of fault scenarios (dicts of faults and properties) that fault propagation iterates through
     scenids : dict
@@ -655,55 +910,164 @@ class SampleApproach():
                 self._fxnmodes[fxnname, mode]=mdl.fxns[fxnname].faultmodes[mode]
                 self.fxnrates[fxnname]=mdl.fxns[fxnname].failrate
                 self.comprates[fxnname] = {compname:comp.failrate for compname, comp in mdl.fxns[fxnname].components}
-        if type(jointfaults['faults'])==int:
-            self.jointmodes=[]
-            for numjoint in range(2, jointfaults['faults']+1):
-                jointmodes = list(itertools.combinations(self._fxnmodes, numjoint))
-                if not jointfaults.get('jointfuncs', False): 
-                    jointmodes = [jm for jm in jointmodes if not any([jm[i-1][0] ==j[0] for i in range(1, len(jm)) for j in jm[i:]])]
-                self.jointmodes = self.jointmodes + jointmodes
+        if type(jointfaults['faults'])==int: self.jointmodes = self.find_jointmodes(jointfaults['faults'], jointfaults.get('jointfuncs', False))
         elif type(jointfaults['faults'])==list: self.jointmodes = jointfaults['faults']
+    def find_jointmodes(self, numfaults, jointfuncs=False):
+        """ Finds the joint modes of up to numfaults modes in the approach (with more than one mode in a function if jointfuncs)"""
+        jointmodes=[]
+        for numjoint in range(2, numfaults+1):
+            jms = list(itertools.combinations(self._fxnmodes, numjoint))
+            if not jointfuncs: 
+                jms = [jm for jm in jms if not any([jm[i-1][0] ==j[0] for i in range(1, len(jm)) for j in jm[i:]])]
+            jointmodes = jointmodes + jms
+        return jointmodes
     def init_rates(self,mdl, jointfaults={'faults':'None'}):
         """ Initializes rates, rates_timeless"""
-        self.rates=dict.fromkeys(self._fxnmodes)
-        self.rates_timeless=dict.fromkeys(self._fxnmodes)
+        self.jointfaults = jointfaults
+        self._modecomps = {}
         for (fxnname, mode) in self._fxnmodes:
-            self.rates[fxnname, mode]=dict.fromkeys(self.phases)
-            self.rates_timeless[fxnname, mode]=dict.fromkeys(self.phases)
-            overallrate = self.fxnrates[fxnname]
-            if self.comprates[fxnname]:
-                for compname, component in mdl.fxns[fxnname].components.items():
-                    if mode in component.faultmodes:
-                        overallrate=self.comprates[fxnname][compname]
-            
-            for ind, (phase, times) in enumerate(self.phases.items()):
-                opp = self._fxnmodes[fxnname, mode]['oppvect'][ind]/sum(self._fxnmodes[fxnname, mode]['oppvect']) #forces to be a conditional probability
-                dist = self._fxnmodes[fxnname, mode]['dist']
-                dt = float(times[1]-times[0])              
-                self.rates[fxnname, mode][phase] = overallrate*opp*dist*dt
-                self.rates_timeless[fxnname, mode][phase] = overallrate*opp*dist
+            for compname, component in mdl.fxns[fxnname].components.items():
+                if mode in component.faultmodes: self._modecomps[fxnname, mode] = compname
+        self.set_rates()
+    def set_rates(self):
+        """ Sets rates, rates_timeless from the rate model of the approach (see calc_rates). Returns the rates array."""
+        fxnmodes, rates, rates_timeless = self.calc_rates()
+        self.rates = {fxnmode: dict(zip(self.phases, rate)) for fxnmode, rate in zip(fxnmodes, rates.tolist())}
+        self.rates_timeless = {fxnmode: dict(zip(self.phases, rate)) for fxnmode, rate in zip(fxnmodes, rates_timeless.tolist())}
+        return rates
+    def calc_rates(self, fxnrates={}, comprates={}, modeparams={}):
+        """
+        Calculates the rates of each mode in each phase (as arrays) given the rate model of the approach, with
+        (optionally) updated overall rates and mode parameters. Rates may be given as arrays of samples, in which case
+        the rates of every sample are calculated at once.
+
+        Parameters
+        ----------
+        fxnrates : dict, optional
+            Overall failure rates to use in place of app.fxnrates, with structure {fxnname: rate}. The default is {}.
+        comprates : dict, optional
+            Overall failure rates to use in place of app.comprates, with structure {fxnname:{compname: rate}}. The default is {}.
+        modeparams : dict, optional
+            Mode parameters ('dist' and/or 'oppvect') to use in place of those in the model, with structure
+            {(fxn, mode): {'dist':dist, 'oppvect':oppvect}}. The default is {}.
+
+        Returns
+        -------
+        fxnmodes : list
+            modes (fxn, mode) and joint modes, in the order of the rows of rates
+        rates : array
+            rates of each mode in each phase, with shape (..., len(fxnmodes), len(app.phases)), where ... is the
+            (broadcast) shape of the samples given in fxnrates/comprates/modeparams (if any)
+        rates_timeless : array
+            rates of each mode in each phase per unit time, with the same shape as rates
+        """
+        fxnmodes = list(self._fxnmodes)
+        fxnrates = {**self.fxnrates, **fxnrates}
+        comprates = {fxnname: {**rates, **comprates.get(fxnname, {})} for fxnname, rates in self.comprates.items()}
+        params = {fxnmode: {**params, **modeparams.get(fxnmode, {})} for fxnmode, params in self._fxnmodes.items()}
+        overallrates = [comprates[fxnmode[0]][self._modecomps[fxnmode]] if fxnmode in self._modecomps else fxnrates[fxnmode[0]] for fxnmode in fxnmodes]
+        overallrates = np.stack(np.broadcast_arrays(*overallrates), axis=-1)
+        dists = np.stack(np.broadcast_arrays(*[params[fxnmode]['dist'] for fxnmode in fxnmodes]), axis=-1)
+        opps = np.stack(np.broadcast_arrays(*[np.asarray(params[fxnmode]['oppvect'], dtype=float) for fxnmode in fxnmodes]), axis=-2)
+        opps = opps/np.cumsum(opps, axis=-1)[...,-1:] #forces to be a conditional probability
+        dts = np.array([float(times[1]-times[0]) for times in self.phases.values()])
+        rates_timeless = overallrates[...,None]*opps*dists[...,None]
+        rates = overallrates[...,None]*opps*dists[...,None]*dts
         if getattr(self, 'jointmodes',False):
-            for (j_ind, jointmode) in enumerate(self.jointmodes):
-                self.rates.update({jointmode:dict.fromkeys(self.phases)})
-                self.rates_timeless.update({jointmode:dict.fromkeys(self.phases)})
-                for (phase, times) in self.phases.items():
-                    rates=[self.rates[fmode][phase] for fmode in jointmode]
-                    if not jointfaults.get('pcond', False): # if no input, assume independence
-                        prob = np.prod(1-np.exp(-np.array(rates)))
-                        self.rates[jointmode][phase] = -np.log(1.0-prob)
-                    elif type(jointfaults['pcond'])==float:
-                        self.rates[jointmode][phase] = jointfaults['pcond']*max(rates)
-                    elif type(jointfaults['pcond'])==list:
-                        self.rates[jointmode][phase] = jointfaults['pcond'][j_ind]*max(rates)  
-                    self.rates_timeless[jointmode][phase] = self.rates[jointmode][phase]/(times[1]-times[0])          
+            modeinds = {fxnmode:ind for ind, fxnmode in enumerate(fxnmodes)}
+            jointrates = np.empty(rates.shape[:-2]+(len(self.jointmodes), len(dts)))
+            pcond = self.jointfaults.get('pcond', False)
+            for numjoint in {len(jointmode) for jointmode in self.jointmodes}:
+                j_inds = [j_ind for j_ind, jointmode in enumerate(self.jointmodes) if len(jointmode)==numjoint]
+                moderates = rates[..., [[modeinds[fmode] for fmode in self.jointmodes[j_ind]] for j_ind in j_inds], :]
+                if not pcond: # if no input, assume independence
+                    prob = np.prod(1-np.exp(-moderates), axis=-2)
+                    jointrates[..., j_inds, :] = -np.log(1.0-prob)
+                elif type(pcond)==float:
+                    jointrates[..., j_inds, :] = pcond*np.max(moderates, axis=-2)
+                elif type(pcond)==list:
+                    jointrates[..., j_inds, :] = np.array(pcond)[j_inds][:,None]*np.max(moderates, axis=-2)
+            fxnmodes = fxnmodes + list(self.jointmodes)
+            rates_timeless = np.concatenate([rates_timeless, jointrates/dts], axis=-2)
+            rates = np.concatenate([rates, jointrates], axis=-2)
+        return fxnmodes, rates, rates_timeless
+    def find_scenrateinds(self):
+        """
+        Finds the mode, phase, and weight of each scenario in app.scenlist, so that the scenario rates may be
+        calculated from the arrays given by calc_rates (see calc_scenrates).
+
+        Returns
+        -------
+        modeinds : array
+            index of the mode of each scenario (in the fxnmodes given by calc_rates)
+        phaseinds : array
+            index of the phase of each scenario
+        weights : array
+            weight of each scenario in its phase (1.0 for 'maxlike' scenarios, which take the rate over all phases)
+        maxlike : array
+            boolean array of whether each scenario is 'maxlike'
+        """
+        modeinds = {fxnmode:ind for ind, fxnmode in enumerate(self.list_modes(joint=getattr(self, 'jointmodes',False)))}
+        phaseinds = {phase:ind for ind, phase in enumerate(self.phases)}
+        scenmodes = {scenid: (fxnmode, phase) for (fxnmode, phase), ids in self.scenids.items() for scenid in ids}
+        scenprops = [(scen['properties']['name'], scen['properties']['time']) for scen in self.scenlist]
+        inds = np.array([[modeinds[scenmodes[name][0]], phaseinds[scenmodes[name][1]]] for name, time in scenprops], dtype=int).reshape(-1,2)
+        maxlike = np.array([self.sampparams[scenmodes[name]]['samp']=='maxlike' for name, time in scenprops], dtype=bool)
+        weights = np.array([1.0 if ml else self.weights[scenmodes[name][0]][scenmodes[name][1]][time] for (name, time), ml in zip(scenprops, maxlike)])
+        return inds[:,0], inds[:,1], weights, maxlike
+    def calc_scenrates(self, rates, scenrateinds=()):
+        """
+        Calculates the rate of each scenario in app.scenlist given the rates of each mode in each phase.
+
+        Parameters
+        ----------
+        rates : array
+            rates of each mode in each phase (from calc_rates), with shape (..., modes, phases)
+        scenrateinds : tuple, optional
+            scenario modes/phases/weights from find_scenrateinds (if already found). The default is (), which finds them.
+
+        Returns
+        -------
+        scenrates : array
+            rate of each scenario in app.scenlist, with shape (..., scenarios)
+        """
+        modeinds, phaseinds, weights, maxlike = scenrateinds if scenrateinds else self.find_scenrateinds()
+        scenrates = rates[..., modeinds, phaseinds]*weights
+        if any(maxlike): scenrates[..., maxlike] = rates[..., modeinds[maxlike], :].sum(axis=-1)
+        return scenrates
+    def update_rates(self, fxnrates={}, comprates={}, modeparams={}):
+        """
+        Updates the rate model of the approach (overall rates and mode parameters) and re-calculates the rates of each
+        mode and scenario (without changing the sampled times or scenarios). 
+
+        Parameters
+        ----------
+        fxnrates : dict, optional
+            New overall failure rates, with structure {fxnname: rate}. The default is {}.
+        comprates : dict, optional
+            New overall failure rates of components, with structure {fxnname:{compname: rate}}. The default is {}.
+        modeparams : dict, optional
+            New mode parameters ('dist' and/or 'oppvect'), with structure {(fxn, mode): {'dist':dist, 'oppvect':oppvect}}.
+            The default is {}.
+        """
+        self.fxnrates.update(fxnrates)
+        for fxnname, rates in comprates.items(): self.comprates[fxnname] = {**self.comprates[fxnname], **rates}
+        for fxnmode, params in modeparams.items(): self._fxnmodes[fxnmode] = {**self._fxnmodes[fxnmode], **params}
+        rates = self.set_rates()
+        for scen, rate in zip(self.scenlist, self.calc_scenrates(rates).tolist()): scen['properties']['rate'] = rate
     def create_sampletimes(self, params={}, default={'samp':'evenspacing','numpts':1}):
         """ Initializes weights and sampletimes """
         self.sampletimes=dict.fromkeys(self.phases.keys())
         self.weights={fxnmode:dict.fromkeys(rate) for fxnmode,rate in self.rates.items()}
         self.sampparams={}
+        self.defaultsamp = default
+        self.sample_modes(list(self.rates), params, default)
+    def sample_modes(self, fxnmodes, params={}, default={'samp':'evenspacing','numpts':1}):
+        """ Selects the times to inject the modes (or joint modes) fxnmodes at in each phase and adds them to weights and sampletimes"""
         for phase, times in self.phases.items():
             possible_phasetimes = list(np.arange(times[0], times[1], self.tstep))
-            for fxnmode in self.rates:
+            for fxnmode in fxnmodes:
+                self.weights.setdefault(fxnmode, dict.fromkeys(self.phases))
                 param = params.get((fxnmode,phase), default)
                 self.sampparams[fxnmode, phase] = param
                 if param['samp']=='likeliest':
@@ -817,9 +1181,8 @@ class SampleApproach():
                                 faults[fault] = [fm[1] for fm in fxnmode if fm[0]==fault]
                             scen = {'faults':faults, 'properties':{'type': str(len(fxnmode))+'-joint-faults', 'functions':{fm[0] for fm in fxnmode}, \
                                     'modes':{fm[1] for fm in fxnmode}, 'rate': rate, 'time': time, 'name': name}}
-                        self.scenlist=self.scenlist+[scen]
-                        if self.scenids.get((fxnmode, phase)): self.scenids[fxnmode, phase] = self.scenids[fxnmode, phase] + [name]
-                        else: self.scenids[fxnmode, phase] = [name]
+                        self.scenlist.append(scen)
+                        self.scenids.setdefault((fxnmode, phase), []).append(name)
         self.times.sort()
     def prune_scenarios(self,endclasses,samptype='piecewise', threshold=0.1, sampparam={'samp':'evenspacing','numpts':1}):
         """
@@ -883,6 +1246,135 @@ class SampleApproach():
         self.sampletimes = newsampletimes
         self.create_scenarios()
         self.sampparams={key:{'samp':'pruned '+samptype} for key in self.sampparams}
+    def add_modes(self, mdl, faults, sampparams={}, defaultsamp={}):
+        """
+        Adds modes to the approach (and, if the approach was defined with a number of joint faults, the joint modes 
+        with them), sampling them over time and adding their scenarios to the scenlist.
+
+        Parameters
+        ----------
+        mdl : Model
+            Model the approach samples.
+        faults : list
+            Modes (tuples (fxn, mode)) to add. Modes already in the approach are not added again.
+        sampparams : dict, optional
+            Defines how the added modes are sampled over time, with structure {(fxnmode,phase): sampparam} (see __init__). The default is {}.
+        defaultsamp : dict, optional
+            Defines how the added modes are sampled by default (see __init__). The default is {}, which uses the 
+            default sampling of the approach.
+        """
+        newmodes = [tuple(fxnmode) for fxnmode in faults if tuple(fxnmode) not in self._fxnmodes]
+        for fxnname, mode in newmodes:
+            fxn = mdl.fxns[fxnname]
+            self._fxnmodes[fxnname, mode] = fxn.faultmodes[mode]
+            if fxnname not in self.fxnrates:
+                self.fxnrates[fxnname] = fxn.failrate
+                self.comprates[fxnname] = {compname:comp.failrate for compname, comp in fxn.components.items()}
+            for compname, component in fxn.components.items():
+                if mode in component.faultmodes: self._modecomps[fxnname, mode] = compname
+        newjointmodes = []
+        if type(self.jointfaults['faults'])==int:
+            jointmodes = self.find_jointmodes(self.jointfaults['faults'], self.jointfaults.get('jointfuncs', False))
+            newjointmodes = [jm for jm in jointmodes if any([fm in newmodes for fm in jm])]
+            if newjointmodes and type(self.jointfaults.get('pcond', False))==list: 
+                raise Exception("Conditional probabilities (pcond) of the new joint modes must be given in add_jointmodes")
+            self.jointmodes = self.jointmodes + newjointmodes
+        self.set_rates()
+        self.sample_modes(newmodes+newjointmodes, sampparams, defaultsamp or self.defaultsamp)
+        self.create_scenarios()
+    def remove_modes(self, faults):
+        """ Removes modes (tuples (fxn, mode)) and the joint modes with them from the approach (along with their scenarios)"""
+        faults = [tuple(fxnmode) for fxnmode in faults]
+        self.remove_jointmodes([jm for jm in getattr(self, 'jointmodes', []) if any([fm in faults for fm in jm])])
+        for fxnmode in faults:
+            self._fxnmodes.pop(fxnmode, None)
+            self._modecomps.pop(fxnmode, None)
+        self.remove_samples(faults)
+        self.set_rates()
+        self.create_scenarios()
+    def add_jointmodes(self, jointmodes, pcond=[], sampparams={}, defaultsamp={}):
+        """
+        Adds joint modes to the approach, sampling them over time and adding their scenarios to the scenlist.
+
+        Parameters
+        ----------
+        jointmodes : list
+            Joint modes (tuples of modes (fxn, mode) in the approach) to add. Joint modes already in the approach are not added again.
+        pcond : list, optional
+            Conditional probabilities of the added joint modes (only used if the approach was defined with a list of 
+            conditional probabilities, see __init__). The default is [].
+        sampparams : dict, optional
+            Defines how the added joint modes are sampled over time, with structure {(jointmode,phase): sampparam} (see __init__). The default is {}.
+        defaultsamp : dict, optional
+            Defines how the added joint modes are sampled by default (see __init__). The default is {}, which uses the 
+            default sampling of the approach.
+        """
+        if not getattr(self, 'jointmodes', False): self.jointmodes = []
+        jointmodes = [tuple(tuple(fm) for fm in jm) for jm in jointmodes]
+        newinds = [ind for ind, jm in enumerate(jointmodes) if jm not in self.jointmodes and jm not in jointmodes[:ind]]
+        if type(self.jointfaults.get('pcond', False))==list:
+            if len(pcond)!=len(jointmodes): raise Exception("Conditional probabilities (pcond) must be given for each joint mode")
+            self.jointfaults = {**self.jointfaults, 'pcond': self.jointfaults['pcond'] + [pcond[ind] for ind in newinds]}
+        newjointmodes = [jointmodes[ind] for ind in newinds]
+        self.jointmodes = self.jointmodes + newjointmodes
+        self.set_rates()
+        self.sample_modes(newjointmodes, sampparams, defaultsamp or self.defaultsamp)
+        self.create_scenarios()
+    def remove_jointmodes(self, jointmodes):
+        """ Removes joint modes (tuples of modes (fxn, mode)) from the approach (along with their scenarios)"""
+        jointmodes = [tuple(tuple(fm) for fm in jm) for jm in jointmodes]
+        keep = [ind for ind, jm in enumerate(getattr(self, 'jointmodes', [])) if jm not in jointmodes]
+        if type(self.jointfaults.get('pcond', False))==list:
+            self.jointfaults = {**self.jointfaults, 'pcond': [self.jointfaults['pcond'][ind] for ind in keep]}
+        if getattr(self, 'jointmodes', False): self.jointmodes = [self.jointmodes[ind] for ind in keep]
+        self.remove_samples(jointmodes)
+        self.set_rates()
+        self.create_scenarios()
+    def remove_samples(self, fxnmodes, phase=None, times=None):
+        """ Removes the modes fxnmodes from weights, sampparams, and sampletimes (in a given phase/at given times, if provided)"""
+        for fxnmode in fxnmodes:
+            for ph in ([phase] if phase is not None else self.phases):
+                if times is None:
+                    self.sampparams.pop((fxnmode, ph), None)
+                    if fxnmode in self.weights: self.weights[fxnmode][ph] = None
+                elif self.weights.get(fxnmode, {}).get(ph): 
+                    self.weights[fxnmode][ph] = {t:w for t, w in self.weights[fxnmode][ph].items() if t not in times} or None
+            if phase is None and times is None: self.weights.pop(fxnmode, None)
+        for ph, samples in self.sampletimes.items():
+            if samples and (phase is None or ph==phase):
+                samples = {t:[fm for fm in fms if fm not in fxnmodes or (times is not None and t not in times)] for t, fms in samples.items()}
+                self.sampletimes[ph] = {t:fms for t, fms in samples.items() if fms}
+    def add_sampletimes(self, fxnmode, phase, times):
+        """
+        Adds times to inject a mode (or joint mode) at in a given phase, adding the scenarios to the scenlist. Since the 
+        sample points are no longer given by the sample strategy, the times sampled for the mode in the phase are
+        re-weighted evenly.
+
+        Parameters
+        ----------
+        fxnmode : tuple
+            Mode (fxn, mode) or joint mode in the approach
+        phase : str
+            Phase to sample the mode in
+        times : list
+            Times to add (in the phase). Times already sampled are not added again.
+        """
+        if any([not (self.phases[phase][0] <= time < self.phases[phase][1]) for time in times]):
+            raise Exception("Sample times must be in the phase "+str(phase)+": "+str(self.phases[phase]))
+        phasetimes = sorted(set(self.weights[fxnmode].get(phase) or {}).union(times))
+        self.set_sampletimes(fxnmode, phase, phasetimes)
+    def remove_sampletimes(self, fxnmode, phase, times):
+        """ Removes times that a mode (or joint mode) is injected at in a given phase (and their scenarios), re-weighting 
+        the remaining times evenly (see add_sampletimes)."""
+        phasetimes = [time for time in (self.weights[fxnmode].get(phase) or {}) if time not in times]
+        self.set_sampletimes(fxnmode, phase, sorted(phasetimes))
+    def set_sampletimes(self, fxnmode, phase, phasetimes):
+        """ Sets the times that a mode (or joint mode) is injected at in a given phase (with even weights) """
+        self.remove_samples([fxnmode], phase=phase, times=list(self.weights[fxnmode].get(phase) or {}))
+        self.weights[fxnmode][phase] = None
+        self.sampparams[fxnmode, phase] = {'samp':'custom'}
+        self.add_phasetimes(fxnmode, phase, phasetimes)
+        self.create_scenarios()
     def list_modes(self, joint=False):
         """ Returns a list of modes in the approach """
         if joint:
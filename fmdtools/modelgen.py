@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+File name: modelgen.py
+
+Description: Generation of synthetic models of a given size and topology (e.g. for stress-testing and benchmarking)
+
+Generated models are regular Model subclasses, so they may be run with faultprop and processed with resultproc
+like any of the example models. Because the model is rebuilt from its params (including the seed), copies of the
+model (e.g. in staged execution) have the same structure as the original.
+
+Example:
+    mdl = make_model(numfxns=100, numflows=120, topology='random', numfaults=3, seed=1)
+    endclasses, mdlhists = fp.run_approach(mdl, SampleApproach(mdl))
+"""
+import numpy as np
+from fmdtools.modeldef import FxnBlock, Model, phases, truncn
+
+default_params = {'numfxns':10, 'numflows':None, 'topology':'chain', 'numfaults':2, 'timely':0.5, 'numatts':1, 'end':55, 'seed':None, 'memo':0}
+topologies = ('chain', 'tree', 'random', 'cycle')
+faultkinds = {'loss':0.0, 'degr':0.5, 'surge':2.0}
+
+class GenFxn(FxnBlock):
+    """
+    Generic function used in generated models.
+
+    Passes the minimum of its input flows to its output flows, scaled by the effect of its faults (loss, degr, surge)
+    and, if timely, by an internal level state which ramps up over time. Inputs above 1.5 (e.g. from an upstream surge)
+    cause a conditional loss fault.
+    """
+    def __init__(self, flows, params):
+        p = params[0]
+        self.numin = p['numin']
+        self.ramp = p['ramp']
+        flownames = ['in'+str(i) for i in range(p['numin'])]+['out'+str(i) for i in range(len(flows)-p['numin'])]
+        if p['timely']: states = {'eff':1.0, 'level':0.0}
+        else:           states = {'eff':1.0}
+        super().__init__(flownames, flows, states, timely=p['timely'], memo=0 if p['timely'] else p['memo'])
+        self.inflows = [self.flows[f] for f in flownames[:self.numin]]
+        self.outflows = [self.flows[f] for f in flownames[self.numin:]]
+        self.failrate = p['failrate']
+        self.assoc_modes(p['modes'])
+    def input_val(self):
+        """Returns the minimum value over all attributes of all input flows (1.0 if there are no inputs)"""
+        return min([getattr(flow, att) for flow in self.inflows for att in flow._attributes], default=1.0)
+    def condfaults(self, time):
+        if self.faultmodes and self.input_val()>1.5: self.add_fault(list(self.faultmodes)[0])
+    def behavior(self, time):
+        self.eff = 1.0
+        for fault in self.faults.difference(['nom']):
+            self.eff = self.eff*faultkinds[fault.rstrip('0123456789')]
+        if self.timely:
+            if time>self.time: self.level = min(1.0, self.level + self.ramp*self.tstep)
+            out = truncn(self.eff*min(self.input_val(), self.level), 2.0)
+        else:
+            out = truncn(self.eff*self.input_val(), 2.0)
+        for flow in self.outflows:
+            for att in flow._attributes:
+                setattr(flow, att, out)
+
+class GenModel(Model):
+    """
+    Model with a generated structure. Has params (see default_params):
+        - numfxns : int
+            number of functions in the model
+        - numflows : int
+            number of flows in the model (if None, the minimum needed for the topology is used)
+        - topology : str
+            how functions are connected by flows:
+                - 'chain' : each function feeds the next one
+                - 'tree' : each function is fed by a random earlier function
+                - 'random' : each flow connects a random pair of functions (sparse if numflows is small)
+                - 'cycle' : a chain where the last function feeds the first
+            flows beyond those needed for the topology connect random pairs (in the forward direction for chains/trees)
+        - numfaults : int
+            number of fault modes in each function
+        - timely : float
+            fraction of functions that are timely
+        - numatts : int
+            number of attributes in each flow
+        - end : int
+            end time of the simulation
+        - seed : int
+            seed used to generate the model (if None, a seed is drawn and saved in params)
+        - memo : int
+            size of the memo cache of the functions which are not timely (0 for no cache)
+    """
+    def __init__(self, params={}):
+        super().__init__()
+        params = {**default_params, **params}
+        if params['seed'] is None: params['seed'] = int(np.random.randint(2**31))
+        if params['numflows'] is None: params['numflows'] = min_flows(params['numfxns'], params['topology'])
+        self.params = params
+        rng = np.random.default_rng(params['seed'])
+
+        end = params['end']
+        self.phases = phases([0, round(end/5), round(4*end/5), end], ['start', 'on', 'end'])
+        self.times = [0, round(end/2), end]
+        self.tstep = 1
+
+        edges = gen_edges(params['numfxns'], params['numflows'], params['topology'], rng)
+        for ind in range(len(edges)):
+            self.add_flow('flow'+str(ind), 'Generic', {'a'+str(i):1.0 for i in range(params['numatts'])})
+        timely = rng.random(params['numfxns']) < params['timely']
+        for fxn in range(params['numfxns']):
+            inflows = ['flow'+str(ind) for ind, (source, sink) in enumerate(edges) if sink==fxn]
+            outflows = ['flow'+str(ind) for ind, (source, sink) in enumerate(edges) if source==fxn]
+            fparams = {'numin':len(inflows), 'timely':bool(timely[fxn]), 'ramp':float(rng.uniform(0.05, 0.5)),
+                       'failrate':float(10**rng.uniform(-6,-4)), 'modes':gen_modes(params['numfaults'], len(self.phases), rng),
+                       'memo':params['memo']}
+            self.add_fxn('fxn'+str(fxn), GenFxn, inflows+outflows, fparams)
+        self.construct_graph()
+    def find_classification(self, resgraph, endfaults, endflows, scen, mdlhists):
+        """Classifies the scenario by the repair cost of its faults and the number of flows degraded at the end"""
+        modes, modeprops = self.return_faultmodes()
+        repcost = sum([c['rcost'] for f,m in modeprops.items() for a, c in m.items()])
+        totcost = repcost + 1000*len(endflows)
+        if scen['properties']['type']=='nominal':   rate=1.0
+        else:                                       rate=scen['properties']['rate']
+        life=1e5
+        return {'rate':rate, 'cost': totcost, 'expected cost': rate*life*totcost}
+
+def make_model(numfxns=10, numflows=None, topology='chain', numfaults=2, timely=0.5, numatts=1, end=55, seed=None, memo=0):
+    """
+    Generates a model with the given size and structure.
+
+    Parameters
+    ----------
+    numfxns : int, optional
+        Number of functions. The default is 10.
+    numflows : int, optional
+        Number of flows. The default is None (the minimum needed for the topology).
+    topology : str, optional
+        Topology of the model ('chain', 'tree', 'random', or 'cycle'). The default is 'chain'.
+    numfaults : int, optional
+        Number of fault modes in each function. The default is 2.
+    timely : float, optional
+        Fraction of functions which are timely. The default is 0.5.
+    numatts : int, optional
+        Number of attributes in each flow. The default is 1.
+    end : int, optional
+        End time of the simulation. The default is 55.
+    seed : int, optional
+        Seed to generate the model from (for reproducibility). The default is None.
+    memo : int, optional
+        Size of the memo cache of the functions which are not timely. The default is 0 (no cache).
+
+    Returns
+    -------
+    mdl : GenModel
+        The generated model
+    """
+    return GenModel(params={'numfxns':numfxns, 'numflows':numflows, 'topology':topology, 'numfaults':numfaults,
+                            'timely':timely, 'numatts':numatts, 'end':end, 'seed':seed, 'memo':memo})
+
+def min_flows(numfxns, topology):
+    """ Returns the minimum number of flows needed to connect numfxns functions in the given topology"""
+    if topology=='cycle':       return numfxns
+    elif topology=='random':    return numfxns
+    else:                       return max(numfxns-1, 0)
+
+def gen_edges(numfxns, numflows, topology, rng):
+    """
+    Generates the (source, sink) function indices of each flow in the model.
+
+    Parameters
+    ----------
+    numfxns : int
+        Number of functions
+    numflows : int
+        Number of flows
+    topology : str
+        Topology ('chain', 'tree', 'random', or 'cycle')
+    rng : numpy Generator
+        Random number generator to use
+
+    Returns
+    -------
+    edges : list
+        list of tuples (source, sink) for each flow
+    """
+    if topology=='chain':   edges = [(i, i+1) for i in range(numfxns-1)]
+    elif topology=='tree':  edges = [(int(rng.integers(0, i)), i) for i in range(1, numfxns)]
+    elif topology=='cycle': edges = [(i, (i+1)%numfxns) for i in range(numfxns)] if numfxns>1 else []
+    elif topology=='random':edges = []
+    else: raise Exception("Invalid topology: "+str(topology)+". Must be one of "+str(topologies))
+    if numflows < len(edges):
+        raise Exception("Too few flows for a "+topology+" of "+str(numfxns)+" functions (needs at least "+str(len(edges))+")")
+    if numflows > len(edges) and numfxns < 2:
+        raise Exception("At least two functions are needed to connect flows")
+    for i in range(numflows-len(edges)):
+        source, sink = rng.choice(numfxns, 2, replace=False)
+        if topology in ('chain', 'tree'): source, sink = min(source, sink), max(source, sink)
+        edges.append((int(source), int(sink)))
+    return edges
+
+def gen_modes(numfaults, numphases, rng):
+    """ Generates a dict of numfaults modes with structure {faultname:[dist,oppvect, rcost]} (for assoc_modes)"""
+    kinds = list(faultkinds)
+    names = [kinds[i%len(kinds)]+(str(i//len(kinds)) if i>=len(kinds) else '') for i in range(numfaults)]
+    dists = rng.dirichlet(np.ones(numfaults)) if numfaults else []
+    return {name:[float(dists[i]), list(rng.uniform(0.1, 1.0, numphases)), 100*int(rng.integers(1, 100))] for i, name in enumerate(names)}
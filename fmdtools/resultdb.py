@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+File name: resultdb.py
+
+Description: Database (SQLite) of the end results of fault scenarios over many runs (e.g. of different model versions)
+
+Each run adds the endclasses of its scenarios (with the fault mode, phase, time, and weight of each scenario in the
+sample approach) and, optionally, the degraded functions/flows of each scenario (from resultproc.summarize_hists or
+aggregators.Summaries) in a single transaction. Tables are indexed by function, mode, phase, and degraded
+function/flow so that queries over millions of scenarios stay fast. Queries return DataFrames with the same
+columns as resultproc.make_endclasstable, so they may be given to make_phasefmea, make_summfmea, etc.
+
+Example:
+    with ResultsDB('results.db') as db:
+        db.add_run(endclasses, app, summaries, model='Pump', version='2')
+        db.top_scenarios(100, fxn='MoveWater', phase='on')      # top 100 expected-cost scenarios over all versions
+        rp.make_phasefmea(db.endclasstable(run=1), app)
+"""
+import sqlite3
+import json
+import time
+import numpy as np
+
+class ResultsDB():
+    """
+    SQLite database of the results of fault scenarios
+
+    Attributes
+    ----------
+    filename : str
+        Name of the database file (or ':memory:')
+    conn : sqlite3.Connection
+        Connection to the database
+    """
+    def __init__(self, filename='results.db'):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (run INTEGER PRIMARY KEY, model TEXT, version TEXT, params TEXT, created REAL);
+            CREATE TABLE IF NOT EXISTS scenarios (run INTEGER, name TEXT, fxn TEXT, mode TEXT, phase TEXT, time REAL,
+                                                  rate REAL, cost REAL, expcost REAL, weight REAL, extra TEXT);
+            CREATE TABLE IF NOT EXISTS degraded (run INTEGER, name TEXT, kind TEXT, obj TEXT);
+            CREATE INDEX IF NOT EXISTS deg_obj ON degraded (obj, kind);
+            CREATE INDEX IF NOT EXISTS deg_run ON degraded (run, name);
+            CREATE VIEW IF NOT EXISTS results AS
+                SELECT s.rowid AS id, s.run AS run, s.name AS name, s.fxn AS fxn, s.mode AS mode, s.phase AS phase, s.time AS time,
+                       s.rate AS rate, s.cost AS cost, s.expcost AS expcost, s.weight AS weight, r.model AS model, r.version AS version
+                FROM scenarios s JOIN runs r ON s.run=r.run;
+            """)
+            for name, index in scen_indexes.items(): self.conn.execute("CREATE INDEX IF NOT EXISTS "+name+" ON "+index)
+    def add_run(self, endclasses, app=None, summaries={}, model='', version='', params={}):
+        """
+        Adds the results of a run (set of scenarios) to the database in a single transaction
+
+        Parameters
+        ----------
+        endclasses : dict
+            Endclasses of each scenario (e.g. from run_approach) with structure {scenname:{rate, cost, expected cost, ...}}
+        app : SampleApproach, optional
+            Sample approach the scenarios were generated from (for the mode, phase, time, and weight of each scenario).
+            The default is None (only the scenario names are added).
+        summaries : dict, optional
+            Degraded functions and flows of each scenario with structure {scenname:{'degraded functions':[fxns],
+            'degraded flows':[flows]}} (e.g. from resultproc.summarize_hists). The default is {}.
+        model : str, optional
+            Name of the model. The default is ''.
+        version : str, optional
+            Version of the model (e.g. design iteration). The default is ''.
+        params : dict, optional
+            Parameters of the model. The default is {}.
+
+        Returns
+        -------
+        run : int
+            id of the run in the database
+        """
+        props = scen_props(app) if app else {}
+        names = [name for name in props if name in endclasses]+[name for name in endclasses if name not in props]
+        with self.conn:
+            cur = self.conn.execute("INSERT INTO runs (model, version, params, created) VALUES (?,?,?,?)",
+                                    (model, str(version), json.dumps(params, default=str, sort_keys=True), time.time()))
+            run = cur.lastrowid
+            #for large runs, indexes are rebuilt after inserting (which is faster than updating them with each row)
+            rebuild = len(endclasses)>10000 and len(endclasses)>(self.conn.execute("SELECT MAX(rowid) FROM scenarios").fetchone()[0] or 0)/4
+            if rebuild:
+                for name in scen_indexes: self.conn.execute("DROP INDEX IF EXISTS "+name)
+            self.conn.executemany("INSERT INTO scenarios VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                                  (scen_row(run, name, endclasses[name], props.get(name, (None,)*4+(1.0,))) for name in names))
+            self.conn.executemany("INSERT INTO degraded VALUES (?,?,?,?)",
+                                  ((run, name, kind, obj) for name, summary in summaries.items()
+                                   for kind, key in [('function', 'degraded functions'), ('flow', 'degraded flows')] for obj in summary.get(key, [])))
+            if rebuild:
+                for name, index in scen_indexes.items(): self.conn.execute("CREATE INDEX "+name+" ON "+index)
+        return run
+    def query(self, where='', args=(), orderby='', limit=None):
+        """
+        Queries the scenarios in the database
+
+        Parameters
+        ----------
+        where : str, optional
+            SQL condition on the scenarios (columns: run, name, fxn, mode, phase, time, rate, cost, expcost, weight,
+            model, version, and id, the order the scenarios were added in), e.g. "fxn=? AND phase=?". The default is ''
+            (all scenarios).
+        args : tuple, optional
+            Values of the parameters (?) in the condition. The default is ().
+        orderby : str, optional
+            SQL ordering of the scenarios, e.g. "expcost DESC". The default is ''.
+        limit : int, optional
+            Maximum number of scenarios to return. The default is None.
+
+        Returns
+        -------
+        table : DataFrame
+            table indexed by scenario name with the columns of resultproc.make_endclasstable (fxn, mode, phase,
+            time, rate, cost, expected cost, weight), along with the run, model, and version of each scenario
+        """
+        import pandas as pd
+        sql = "SELECT name, fxn, mode, phase, time, rate, cost, expcost, weight, run, model, version FROM results s"
+        if where:       sql += " WHERE "+where
+        if orderby:     sql += " ORDER BY "+orderby
+        if limit:       sql += " LIMIT "+str(int(limit))
+        table = pd.DataFrame(self.conn.execute(sql, args).fetchall(), columns=['name', 'fxn', 'mode', 'phase', 'time', 'rate', 'cost', 'expected cost', 'weight', 'run', 'model', 'version'])
+        table['fxn'], table['mode'] = table['fxn'].map(decode_name), table['mode'].map(decode_name)
+        return table.set_index('name').rename_axis(None)
+    def top_scenarios(self, n=100, metric='expected cost', fxn=None, mode=None, phase=None, model=None, version=None, run=None):
+        """
+        Returns the n scenarios with the highest value of a metric (over all runs unless a run/model/version is given)
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of scenarios. The default is 100.
+        metric : str, optional
+            'expected cost', 'cost', or 'rate'. The default is 'expected cost'.
+        fxn, mode, phase, model, version, run : optional
+            Values to filter the scenarios by. The defaults are None (not filtered).
+
+        Returns
+        -------
+        table : DataFrame
+            table of the scenarios (see query)
+        """
+        where, args = make_conditions(fxn=fxn, mode=mode, phase=phase, model=model, version=version, run=run)
+        column = {'expected cost':'expcost', 'cost':'cost', 'rate':'rate'}[metric]
+        return self.query(where, args, orderby=column+" DESC", limit=n)
+    def endclasstable(self, run=None, **conditions):
+        """
+        Returns the table of endclasses of the scenarios in a run (or matching the given conditions, e.g. fxn='MoveWater'),
+        in the format of resultproc.make_endclasstable (to use with make_phasefmea, make_summfmea, find_costovertime, etc.)
+        """
+        where, args = make_conditions(run=run, **conditions)
+        return self.query(where, args, orderby="id")
+    def degraded_by(self, obj, kind=None, run=None):
+        """
+        Returns the scenarios which degrade a given function or flow
+
+        Parameters
+        ----------
+        obj : str
+            Name of the function or flow
+        kind : str, optional
+            'function' or 'flow'. The default is None (either).
+        run : int, optional
+            Run to get the scenarios from. The default is None (all runs).
+
+        Returns
+        -------
+        table : DataFrame
+            table of the scenarios (see query)
+        """
+        where = "EXISTS (SELECT 1 FROM degraded d WHERE d.run=s.run AND d.name=s.name AND d.obj=?"+(" AND d.kind=?" if kind else "")+")"
+        args = (obj, kind) if kind else (obj,)
+        if run is not None: where, args = where+" AND run=?", args+(run,)
+        return self.query(where, args, orderby="expcost DESC")
+    def fullfmea(self, run):
+        """ Returns the full fmea of a run (degraded functions, degraded flows, rate, cost, expected cost), as in resultproc.make_fullfmea"""
+        table = self.endclasstable(run)[['rate', 'cost', 'expected cost']]
+        degraded = {'function':{name:[] for name in table.index}, 'flow':{name:[] for name in table.index}}
+        for name, kind, obj in self.conn.execute("SELECT name, kind, obj FROM degraded WHERE run=? ORDER BY rowid", (run,)):
+            degraded[kind][name].append(obj)
+        table.insert(0, 'degraded flows', [degraded['flow'][name] for name in table.index])
+        table.insert(0, 'degraded functions', [degraded['function'][name] for name in table.index])
+        return table
+    def runs(self):
+        """ Returns a table of the runs in the database with their model, version, params, number of scenarios, and total expected cost"""
+        import pandas as pd
+        sql = ("SELECT r.run, r.model, r.version, r.params, r.created, COUNT(s.name), SUM(s.expcost) "
+               "FROM runs r LEFT JOIN scenarios s ON s.run=r.run GROUP BY r.run ORDER BY r.run")
+        return pd.DataFrame(self.conn.execute(sql).fetchall(), columns=['run', 'model', 'version', 'params', 'created', 'scenarios', 'expected cost']).set_index('run')
+    def delete_run(self, run):
+        """ Deletes the results of a run from the database"""
+        with self.conn:
+            for table in ['scenarios', 'degraded', 'runs']: self.conn.execute("DELETE FROM "+table+" WHERE run=?", (run,))
+    def close(self):
+        """ Closes the database"""
+        self.conn.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+
+scen_indexes = {'scen_run':"scenarios (run, name)", 'scen_fxn':"scenarios (fxn, phase, expcost)",
+                'scen_mode':"scenarios (mode, phase, expcost)", 'scen_expcost':"scenarios (expcost)"}
+def scen_props(app):
+    """ Returns the (fxn, mode, phase, time, weight) of each scenario in a sample approach, with structure {scenname:props}"""
+    props = {}
+    scentimes = {scen['properties']['name']:scen['properties']['time'] for scen in app.scenlist}
+    for (fxnmode, phase), ids in app.scenids.items():
+        if type(fxnmode[0])==str:   fxn, mode = fxnmode
+        else:                       fxn, mode = tuple(fm[0] for fm in fxnmode), tuple(fm[1] for fm in fxnmode)
+        for scenid in ids: props[scenid] = (fxn, mode, phase, scentimes[scenid], app.weights[fxnmode][phase][scentimes[scenid]])
+    return props
+def scen_row(run, name, endclass, props):
+    """ Returns the row of a scenario in the scenarios table"""
+    fxn, mode, phase, time, weight = props
+    extra = {key:val for key, val in endclass.items() if key not in ('rate', 'cost', 'expected cost')}
+    return (run, name, encode_name(fxn), encode_name(mode), phase, to_float(time), to_float(endclass['rate']), to_float(endclass['cost']),
+            to_float(endclass['expected cost']), to_float(weight), json.dumps(extra, default=str) if extra else None)
+def encode_name(name):
+    """ Encodes a function/mode name (or tuple of names for joint faults) as a str"""
+    return json.dumps(list(name)) if type(name)==tuple else name
+def decode_name(name):
+    """ Decodes a function/mode name encoded with encode_name"""
+    return tuple(json.loads(name)) if type(name)==str and name.startswith('[') else name
+def to_float(val):
+    """ Converts a (numpy) value to a float for the database (or None if not given)"""
+    if val is None: return None
+    try:                return float(val)
+    except TypeError:   return float(np.asarray(val))
+def make_conditions(**conditions):
+    """ Returns the SQL condition and arguments for the given column values (ignoring those which are None)"""
+    conds = [(key, encode_name(val) if key in ('fxn', 'mode') else (str(val) if key=='version' else val)) for key, val in conditions.items() if val is not None]
+    return " AND ".join(col+"=?" for col, val in conds), tuple(val for col, val in conds)
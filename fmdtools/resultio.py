@@ -0,0 +1,464 @@
+# -*- coding: utf-8 -*-
+"""
+File name: resultio.py
+
+Description: Saving and loading of model results (histories, endclasses, and approach information) to/from files.
+
+Results are saved in a compressed .npz (zip) archive with one array per variable for each chunk of scenarios, so a
+variable or scenario can be read without loading the rest of the file. Fault sets are encoded as integer codes to
+a table of the unique sets of faults in the results, and endclasses and approach information are saved as json, so
+every array in the file has a plain (numeric or string) dtype and files are loaded without unpickling anything.
+
+Faulty histories may be encoded (with encode_deltas) as the differences from the nominal history (see DeltaArray),
+which only stores the times and values where each variable is off-nominal. Histories may also be kept in a HistStore, a directory of memory-mapped (scenario x variable x time) arrays which
+histories are written into as they are run (see faultprop.run_approach), so batches larger than memory may be processed.
+
+Example:
+    save_results('results.npz', mdlhists, endclasses, app)
+    with Results('results.npz') as res:
+        res.endclasses
+        res.mdlhists['MoveWater short, t=10']                       # history of a single scenario
+        res.get_var(('flows', 'Wat_1', 'flowrate'))                 # (scenario x time) array of a single variable
+"""
+import numpy as np
+import zipfile
+import json
+import os
+from collections.abc import Mapping, Sequence
+
+def save_results(filename, mdlhists, endclasses={}, app=None, chunksize=100, compress=True):
+    """
+    Saves the results of a set of scenarios to a (compressed, chunked) .npz file
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file to save to (should end in .npz)
+    mdlhists : dict
+        A dictionary of model histories for each scenario including the nominal (e.g. from run_list or run_approach)
+    endclasses : dict, optional
+        A dictionary of the endclasses of each scenario. The default is {}.
+    app : SampleApproach, optional
+        The sample approach used to generate the scenarios (to save the scenario properties, times, and phases). The default is None.
+    chunksize : int, optional
+        Number of scenarios to store together in each array. The default is 100.
+    compress : bool, optional
+        Whether to compress the file. The default is True.
+    """
+    nomhist = mdlhists['nominal']
+    scens = [scen for scen in mdlhists if scen!='nominal']
+    paths = hist_paths(nomhist)
+    faultsets, faultcodes = [], {}
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(filename, 'w', compression=compression, allowZip64=True) as zf:
+        for path in paths:
+            write_array(zf, member_name('nominal', path), encode_vals(get_path(nomhist, path), faultsets, faultcodes))
+        for chunk, start in enumerate(range(0, len(scens), chunksize)):
+            chunkscens = scens[start:start+chunksize]
+            for path in paths:
+                vals = [encode_vals(get_path(mdlhists[scen], path), faultsets, faultcodes) for scen in chunkscens]
+                if len({len(val) for val in vals}.union([len(nomhist['time'])]))>1:
+                    raise Exception("Histories must be the same length to save (e.g. from staged runs with the nominal history)")
+                write_array(zf, member_name('chunk'+str(chunk), path), np.stack(vals))
+        meta = {'scens':scens, 'chunksize':chunksize, 'paths':paths, 'faultsets':[sorted(f) for f in faultsets],
+                'endclasses':endclasses, 'approach': approach_info(app) if app else {}}
+        write_array(zf, 'meta', np.array(json.dumps(meta, default=to_json)))
+
+class Results(Mapping):
+    """
+    Results loaded (lazily) from a file saved with save_results. Acts as a read-only dict of the model history of
+    each scenario (including the nominal), where arrays are only read from the file when accessed.
+
+    Attributes
+    ----------
+    scens : list
+        names of the fault scenarios in the file (not including the nominal)
+    endclasses : dict
+        endclasses of each scenario
+    approach : dict
+        properties of the sample approach used to generate the scenarios (scenario properties, times, and phases) if saved
+    mdlhists : Results
+        the results themselves (as a dict of model histories)
+    """
+    def __init__(self, filename):
+        self.file = np.load(filename, allow_pickle=False)
+        meta = json.loads(str(self.file['meta']))
+        self.scens = meta['scens']
+        self.chunksize = meta['chunksize']
+        self.paths = [tuple(path) for path in meta['paths']]
+        self.faultsets = [set(f) for f in meta['faultsets']]
+        self.endclasses = meta['endclasses']
+        self.approach = meta['approach']
+        self._scenind = {scen:i for i, scen in enumerate(self.scens)}
+        self._chunk = (None, {})
+        self.mdlhists = self
+    def __getitem__(self, scen):
+        """ Returns the model history of a scenario (or the nominal history)"""
+        if scen=='nominal': return self.get_hist('nominal')
+        elif scen in self._scenind: return self.get_hist(scen)
+        else: raise KeyError(scen)
+    def __iter__(self):
+        return iter(['nominal']+self.scens)
+    def __len__(self):
+        return len(self.scens)+1
+    def get_hist(self, scen):
+        """ Reads the model history of a scenario (or 'nominal') from the file"""
+        hist = {}
+        for path in self.paths:
+            set_path(hist, path, self.decode(path, self.read_var(path, scen)))
+        return hist
+    def read_var(self, path, scen):
+        """ Reads the encoded values of a variable in a scenario (using the chunk of the last read scenario if it is the same)"""
+        if scen=='nominal': return self.file[member_name('nominal', path)]
+        chunk, ind = divmod(self._scenind[scen], self.chunksize)
+        if self._chunk[0]!=chunk: self._chunk = (chunk, {})
+        if path not in self._chunk[1]: self._chunk[1][path] = self.file[member_name('chunk'+str(chunk), path)]
+        return self._chunk[1][path][ind]
+    def get_var(self, path, scens=[]):
+        """
+        Reads the values of a variable over a set of scenarios
+
+        Parameters
+        ----------
+        path : tuple
+            Path to the variable in the history, e.g. ('flows', flowname, attribute) or ('functions', fxnname, state)
+        scens : list, optional
+            Scenarios to read. The default is [] (all scenarios).
+
+        Returns
+        -------
+        vals : array or list
+            (scenario x time) array of the variable values (or list of lists of sets for faults)
+        """
+        path = tuple(path)
+        if not scens:
+            vals = np.concatenate([self.file[member_name('chunk'+str(chunk), path)] for chunk in range(-(-len(self.scens)//self.chunksize))])
+            return self.decode(path, vals) if path[-1]!='faults' else [self.decode(path, val) for val in vals]
+        return [self.decode(path, self.read_var(path, scen)) for scen in scens] if path[-1]=='faults' else np.array([self.read_var(path, scen) for scen in scens])
+    def decode(self, path, vals):
+        """ Decodes the values of a variable read from the file (i.e., fault codes into sets of faults)"""
+        if path[-1]=='faults': return [self.faultsets[code].copy() for code in vals]
+        return vals
+    def close(self):
+        """ Closes the file"""
+        self.file.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+
+def load_results(filename):
+    """ Loads results saved with save_results. Returns mdlhists (read lazily from the file), endclasses, and the approach information"""
+    res = Results(filename)
+    return res.mdlhists, res.endclasses, res.approach
+
+class HistStore(Mapping):
+    """
+    Store of model histories in memory-mapped arrays on disk. Variables of the same type are stored together in a 
+    (scenario x variable x time) .npy array in the store directory (with the nominal history as the first scenario),
+    and fault sets are stored as codes to a table of unique sets (see FaultHist). Acts as a read-only dict of the
+    model history of each scenario written, where the arrays are views of the memory-mapped arrays.
+    
+    A new store is created by giving the nominal history and the names of the scenarios to store, after which
+    histories are added with add(). An existing store is opened by giving only the directory.
+
+    Attributes
+    ----------
+    directory : str
+        directory the arrays are stored in
+    scens : list
+        names of the fault scenarios in the store (not including the nominal)
+    written : set
+        names of the scenarios which have been written to the store
+    paths : dict
+        location of each variable in the arrays, with structure {path:(group, index)}
+    arrays : list
+        memory-mapped arrays of each group of variables
+    faultsets : list
+        table of the sets of faults the fault codes refer to
+    """
+    def __init__(self, directory, nomhist={}, scens=[], mode='r'):
+        """
+        Creates or opens a HistStore
+
+        Parameters
+        ----------
+        directory : str
+            Directory to store the arrays in.
+        nomhist : dict, optional
+            Nominal history of the model (used to allocate the arrays if creating a new store). The default is {}.
+        scens : list, optional
+            Names of the scenarios to store (if creating a new store). The default is [].
+        mode : str, optional
+            Mode to open an existing store in ('r' for read-only or 'r+' to add histories). The default is 'r'.
+        """
+        self.directory = directory
+        if nomhist:
+            os.makedirs(directory, exist_ok=True)
+            self.scens = [scen for scen in scens if scen!='nominal']
+            self.written = set()
+            self.faultsets, self._faultcodes = [], {}
+            groups, self.paths = {}, {}
+            for path in hist_paths(nomhist):
+                vals = get_path(nomhist, path)
+                dtype = store_dtype(plain_array(vals).dtype).str if isinstance(vals, np.ndarray) else np.dtype(np.int32).str
+                group = groups.setdefault(dtype, [len(groups), 0])
+                self.paths[path] = (group[0], group[1])
+                group[1]+=1
+            self.arrays = [np.lib.format.open_memmap(self.array_file(k), mode='w+', dtype=dtype, shape=(len(self.scens)+1, numvars, len(nomhist['time'])))
+                           for dtype, (k, numvars) in groups.items()]
+            self._scenind = {scen:i+1 for i, scen in enumerate(self.scens)}
+            self.write(0, nomhist)
+            self.flush()
+        else:
+            with open(os.path.join(directory, 'meta.json')) as f: meta = json.load(f)
+            self.scens, self.written = meta['scens'], set(meta['written'])
+            self.paths = {tuple(path):tuple(loc) for path, loc in meta['paths']}
+            self.faultsets = [frozenset(faults) for faults in meta['faultsets']]
+            self._faultcodes = {faults:code for code, faults in enumerate(self.faultsets)}
+            self.arrays = [np.load(self.array_file(k), mmap_mode=mode) for k in range(meta['numarrays'])]
+            self._scenind = {scen:i+1 for i, scen in enumerate(self.scens)}
+    def array_file(self, k):
+        """ Returns the file name of the kth array """
+        return os.path.join(self.directory, 'group'+str(k)+'.npy')
+    def write(self, ind, hist):
+        """ Writes a model history to the arrays at (scenario) index ind """
+        for path, (group, i) in self.paths.items():
+            vals = encode_vals(get_path(hist, path), self.faultsets, self._faultcodes)
+            if not np.can_cast(vals.dtype, self.arrays[group].dtype, 'safe' if vals.dtype.kind in 'SU' else 'same_kind'):
+                raise Exception("Values of "+str(path)+" ("+str(vals.dtype)+") cannot be stored in the store array ("+str(self.arrays[group].dtype)+")")
+            self.arrays[group][ind, i] = vals
+    def add(self, scen, hist):
+        """
+        Writes the model history of a scenario to the store and returns the (memory-mapped) history
+
+        Parameters
+        ----------
+        scen : str
+            Name of the scenario (must be one of the scenarios the store was created for)
+        hist : dict
+            Model history of the scenario
+
+        Returns
+        -------
+        hist : dict
+            Model history of the scenario made of views of the arrays in the store
+        """
+        self.write(self._scenind[scen], hist)
+        self.written.add(scen)
+        return self[scen]
+    def get_hist(self, ind):
+        """ Returns the model history at (scenario) index ind as views of the arrays in the store """
+        hist = {}
+        for path, (group, i) in self.paths.items():
+            if path[-1]=='faults':  set_path(hist, path, FaultHist(self.arrays[group][ind, i], self.faultsets))
+            else:                   set_path(hist, path, self.arrays[group][ind, i])
+        return hist
+    def get_var(self, path):
+        """ Returns a (scenario x time) view of the values of a variable over all scenarios (including the nominal, at index 0) """
+        group, i = self.paths[tuple(path)]
+        return self.arrays[group][:, i]
+    def flush(self):
+        """ Writes the arrays and the information about the store (scenarios written, fault sets, etc) to disk """
+        for arr in self.arrays: arr.flush()
+        meta = {'scens':self.scens, 'written':sorted(self.written), 'paths':list(self.paths.items()), 
+                'faultsets':[sorted(f) for f in self.faultsets], 'numarrays':len(self.arrays)}
+        with open(os.path.join(self.directory, 'meta.json'), 'w') as f: json.dump(meta, f)
+    def __getitem__(self, scen):
+        if scen=='nominal':             return self.get_hist(0)
+        elif scen in self.written:      return self.get_hist(self._scenind[scen])
+        else:                           raise KeyError(scen)
+    def __iter__(self):
+        return iter(['nominal']+[scen for scen in self.scens if scen in self.written])
+    def __len__(self):
+        return len(self.written)+1
+
+def store_dtype(dtype):
+    """ Returns the dtype to store a variable of a given (nominal) dtype as in a HistStore. Numeric variables are stored
+    as float64 and strings with at least 64 characters, since faulty histories may take values the nominal history does not."""
+    if dtype.kind in 'iuf':     return np.result_type(dtype, np.float64)
+    elif dtype.kind in 'SU':    return np.dtype(dtype.kind+str(max(64, dtype.itemsize//np.dtype(dtype.kind+'1').itemsize)))
+    else:                       return dtype
+
+class FaultHist(Sequence):
+    """ History of the faults in a function stored as codes to a table of sets of faults (e.g. in a HistStore). Acts as a list of sets of faults."""
+    def __init__(self, codes, faultsets):
+        self.codes = codes
+        self.faultsets = faultsets
+    def __getitem__(self, ind):
+        if isinstance(ind, slice): return [set(self.faultsets[code]) for code in self.codes[ind]]
+        return set(self.faultsets[self.codes[ind]])
+    def __len__(self):
+        return len(self.codes)
+    def __eq__(self, other):
+        return list(self)==list(other)
+    def __repr__(self):
+        return repr(list(self))
+
+class DeltaArray():
+    """
+    History of a variable encoded as the indices and values where it differs from the nominal history. Acts as
+    a (read-only) numpy array: it is decoded when converted (e.g. np.asarray, arithmetic, plotting) or indexed.
+
+    Attributes
+    ----------
+    nominal : array
+        the nominal history of the variable (referenced, not copied)
+    inds : array
+        time indices where the history differs from the nominal
+    vals : array
+        values of the history at inds
+    """
+    def __init__(self, nominal, inds, vals):
+        self.nominal = nominal
+        self.inds = inds
+        self.vals = vals
+    def __array__(self, dtype=None, copy=None):
+        arr = np.array(self.nominal, dtype=dtype or self.dtype)
+        arr[self.inds] = self.vals
+        return arr
+    def __getitem__(self, ind):
+        return np.asarray(self)[ind]
+    def __len__(self):
+        return len(self.nominal)
+    @property
+    def shape(self):
+        return np.shape(self.nominal)
+    @property
+    def dtype(self):
+        return np.result_type(np.asarray(self.nominal).dtype, np.asarray(self.vals).dtype)
+    def __repr__(self):
+        return 'DeltaArray('+repr(np.asarray(self))+')'
+class DeltaFaults(Sequence):
+    """ History of the faults in a function encoded as the indices and sets of faults where it differs from the nominal history. Acts as a list of sets of faults."""
+    def __init__(self, nominal, inds, vals):
+        self.nominal = nominal
+        self.inds = inds
+        self.vals = vals
+    def decode(self):
+        """ Returns the history as a list of sets of faults"""
+        faults = [set(f) for f in self.nominal]
+        for ind, val in zip(self.inds, self.vals): faults[ind] = set(val)
+        return faults
+    def __getitem__(self, ind):
+        return self.decode()[ind]
+    def __iter__(self):
+        return iter(self.decode())
+    def __len__(self):
+        return len(self.nominal)
+    def __eq__(self, other):
+        return self.decode()==list(other)
+    def __repr__(self):
+        return repr(self.decode())
+
+def encode_deltas(mdlhists):
+    """ Encodes the faulty histories in a dict of model histories (with 'nominal') as differences from the nominal (see encode_delta)"""
+    return {scen: hist if scen=='nominal' else encode_delta(hist, mdlhists['nominal']) for scen, hist in mdlhists.items()}
+def encode_delta(hist, nomhist):
+    """
+    Encodes a model history as the differences from the nominal history
+
+    Parameters
+    ----------
+    hist : dict
+        model history of a fault scenario
+    nomhist : dict
+        model history of the nominal scenario
+
+    Returns
+    -------
+    deltahist : dict
+        model history where each variable is a DeltaArray (or DeltaFaults for faults) referencing the nominal history
+    """
+    deltahist = {}
+    for key, val in hist.items():
+        nomval = nomhist[key]
+        if isinstance(val, dict):                   deltahist[key] = encode_delta(val, nomval)
+        elif isinstance(val, (DeltaArray, DeltaFaults)) and val.nominal is nomval: deltahist[key] = val
+        elif isinstance(nomval, np.ndarray):
+            vals = np.asarray(val)
+            inds = np.flatnonzero(vals!=nomval) if val is not nomval else np.array([], dtype=int)
+            deltahist[key] = DeltaArray(nomval, inds, vals[inds])
+        else:
+            inds = [i for i, (f, nomf) in enumerate(zip(val, nomval)) if f!=nomf]
+            deltahist[key] = DeltaFaults(nomval, inds, [set(val[i]) for i in inds])
+    return deltahist
+def decode_delta(deltahist):
+    """ Decodes a model history encoded with encode_delta into a model history of arrays (and lists of sets of faults)"""
+    hist = {}
+    for key, val in deltahist.items():
+        if isinstance(val, dict):           hist[key] = decode_delta(val)
+        elif isinstance(val, DeltaFaults):  hist[key] = val.decode()
+        else:                               hist[key] = np.asarray(val)
+    return hist
+def is_nominal(vals, nominal):
+    """ Checks whether the history of a variable is the same as the nominal (using the encoding of DeltaArrays if possible)"""
+    if vals is nominal: return True
+    elif isinstance(vals, (DeltaArray, DeltaFaults)) and vals.nominal is nominal: return not len(vals.inds)
+    elif isinstance(nominal, np.ndarray): return np.array_equal(vals, nominal)
+    else: return list(vals)==list(nominal)
+def compare_vals(vals, nominal):
+    """ Returns an array of whether the history of a variable is the same as the nominal (1) or not (0) at each time (using the encoding of DeltaArrays if possible)"""
+    if vals is nominal: return np.ones(len(nominal), dtype=int)
+    elif isinstance(vals, DeltaArray) and vals.nominal is nominal:
+        same = np.ones(len(nominal), dtype=int)
+        same[vals.inds] = 1*(vals.vals==nominal[vals.inds])
+        return same
+    else: return 1* (np.asarray(vals) == nominal)
+
+def hist_paths(hist, path=()):
+    """ Returns the paths (tuples of keys) to each variable (array or list) in a (nested) model history"""
+    return [p for key, val in hist.items() for p in (hist_paths(val, path+(key,)) if isinstance(val, dict) else [path+(key,)])]
+def get_path(hist, path):
+    """ Returns the variable at the given path in a model history"""
+    for key in path: hist = hist[key]
+    return hist
+def set_path(hist, path, val):
+    """ Sets the variable at the given path in a model history (creating dicts as needed)"""
+    for key in path[:-1]: hist = hist.setdefault(key, {})
+    hist[path[-1]] = val
+def same_hist(hist, ref):
+    """ Checks whether a model history has the same values as a reference history (e.g. to check that histories which
+    were saved/loaded or run in different ways match)"""
+    for path in hist_paths(ref):
+        vals, refvals = get_path(hist, path), get_path(ref, path)
+        if path[-1]=='faults':
+            if list(vals)!=list(refvals): return False
+        elif not np.array_equal(np.asarray(vals), np.asarray(refvals)): return False
+    return True
+def member_name(prefix, path):
+    """ Returns the name of the array for a variable in the file"""
+    return '/'.join((prefix,)+tuple(path))
+def encode_vals(vals, faultsets, faultcodes):
+    """ Encodes a variable as an array of a plain dtype, converting sets of faults to codes (added to faultsets/faultcodes
+    as needed) and object arrays (e.g. of strings) to arrays of the type of their values"""
+    if not isinstance(vals, (list, Sequence)): return plain_array(vals)
+    codes = []
+    for faults in vals:
+        key = frozenset(faults)
+        if key not in faultcodes:
+            faultcodes[key] = len(faultsets)
+            faultsets.append(key)
+        codes.append(faultcodes[key])
+    return np.array(codes, dtype=np.int32)
+def plain_array(vals):
+    """ Returns the values of a variable as an array of a plain (not object) dtype, sized from the values (e.g. strings
+    as the longest string), so the array may be saved and loaded without pickling"""
+    vals = np.asarray(vals)
+    if vals.dtype.kind!='O': return vals
+    arr = np.array(vals.tolist())
+    if arr.dtype.kind=='O': raise Exception("Values of type "+str({type(val).__name__ for val in vals.flat})+" cannot be saved as a plain array")
+    return arr
+def write_array(zf, name, arr):
+    """ Writes an array (which must have a plain dtype) to a member of an open zip file in .npy format"""
+    with zf.open(name+'.npy', 'w', force_zip64=True) as f:
+        np.lib.format.write_array(f, np.asanyarray(arr), allow_pickle=False)
+def approach_info(app):
+    """ Returns the (json-serializable) properties of a sample approach: scenario properties, times, and phases"""
+    return {'scenprops':{scen['properties']['name']:scen['properties'] for scen in app.scenlist}, 'times':app.times, 'phases':app.phases}
+def to_json(obj):
+    """ Converts numpy types and sets (e.g. in endclasses and scenario properties) to json-serializable types"""
+    if isinstance(obj, np.generic):         return obj.item()
+    elif isinstance(obj, np.ndarray):       return obj.tolist()
+    elif isinstance(obj, (set, frozenset)): return sorted(obj, key=str)
+    raise TypeError("Cannot save object of type "+type(obj).__name__)
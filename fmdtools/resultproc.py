@@ -19,19 +19,39 @@ This module has functions for the following:
         - make_histtable(), make_deghisttable(), make_statstable(), etc
     - providing fmeas of faults (using pandas)
         - make_fullfmea(), make_simplefmea(), make_summfmea(), etc
+
+matplotlib and pandas are only imported when first used (see LazyModule), so the processing functions may be
+used (e.g. in worker processes or aggregators) without the import time of the plotting/table libraries.
 """
 
 import networkx as nx
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation
 import copy
-import pandas as pd
+import importlib
+from collections.abc import Mapping
+import fmdtools.resultio as rio
+
+class LazyModule():
+    """Stand-in for a module which imports the module when one of its attributes is first used"""
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+    def __getattr__(self, attr):
+        if self.__dict__['_module'] is None: self.__dict__['_module'] = importlib.import_module(self.__dict__['_name'])
+        return getattr(self.__dict__['_module'], attr)
+
+plt = LazyModule('matplotlib.pyplot')
+animation = LazyModule('matplotlib.animation')
+pd = LazyModule('pandas')
 
 ## PROCESSING RESULTS 
-def compare_hists(mdlhists, returndiff=True):
+def compare_hists(mdlhists, returndiff=True, lazy=False):
     """
     Processes a model histories for each scenario into results histories by comparing the states over time in each scenario with the states in the nominal scenario.
+    
+    States are compared over all scenarios at once (see stack_hists), so the arrays in the results are views of 
+    (scenario x state x time) arrays. If the histories have different lengths, each is compared separately with compare_hist.
+    If lazy, reshists and diffs are instead computed for each scenario when it is first accessed (see LazyHists).
 
     Parameters
     ----------
@@ -39,6 +59,9 @@ def compare_hists(mdlhists, returndiff=True):
         A dictionary of model histories for each scenario (e.g. from run_list or run_approach)
     returndiff : bool, optional
         Whether to return diffs, a dict of the differences between the values of the states in the nominal scenario and fault scenario. The default is True.
+    lazy : bool, optional
+        Whether to return reshists and diffs as LazyHists which compare each scenario on access (and summaries
+        from summarize_hists) rather than comparing all scenarios up front. The default is False.
 
     Returns
     -------
@@ -49,14 +72,103 @@ def compare_hists(mdlhists, returndiff=True):
     summaries : dict
         A dict with all degraded functions and degraded flows resulting from the fault scenarios.
     """
-    reshists={}
-    diffs={}
-    summaries={}
-    nomhist = mdlhists.pop('nominal')
-    for scenname, hist in mdlhists.items():
-        reshists[scenname], diffs[scenname], summaries[scenname] = compare_hist(hist, nomhist=nomhist, returndiff=returndiff)
-    mdlhists['nominal']=nomhist
+    if lazy:
+        diffs = LazyHists(mdlhists, 'diff') if returndiff else {scen:{} for scen in mdlhists if scen!='nominal'}
+        return LazyHists(mdlhists, 'reshist'), diffs, summarize_hists(mdlhists)
+    nomhist = mdlhists['nominal']
+    scens = [scen for scen in mdlhists if scen!='nominal']
+    if any([len(mdlhists[scen]['time'])!=len(nomhist['time']) for scen in scens]):
+        reshists, diffs, summaries = {}, {}, {}
+        for scenname in scens:
+            reshists[scenname], diffs[scenname], summaries[scenname] = compare_hist(mdlhists[scenname], nomhist=nomhist, returndiff=returndiff)
+        return reshists, diffs, summaries
+    reshists = {scen:{'time':nomhist['time'], 'flowvals':{}, 'flows':{}, 'functions':{}} for scen in scens}
+    diffs = {scen:{} for scen in scens}
+    summaries = {scen:{'degraded functions':[], 'degraded flows':[]} for scen in scens}
+    #flows
+    flowvars = [(flowname, att) for flowname, atts in nomhist['flows'].items() for att in atts]
+    flowstatus, flowdiff = stack_hists(nomhist['flows'], [mdlhists[scen]['flows'] for scen in scens], flowvars, returndiff)
+    flowsumm = np.ones((len(scens), len(nomhist['flows']), len(nomhist['time'])), dtype=int)
+    ind = 0
+    for k, (flowname, atts) in enumerate(nomhist['flows'].items()):
+        if atts: flowsumm[:,k,:] = np.prod(flowstatus[:,ind:ind+len(atts),:], axis=1)
+        for i, scen in enumerate(scens):
+            reshists[scen]['flowvals'][flowname] = {att:flowstatus[i, ind+j] for j, att in enumerate(atts)}
+            reshists[scen]['flows'][flowname] = flowsumm[i,k]
+            diffs[scen][flowname] = {att:flowdiff[i][ind+j] for j, att in enumerate(atts)} if returndiff else {}
+        ind+=len(atts)
+    flowdeg = np.any(flowsumm==0, axis=2)
+    numdegflows = len(nomhist['flows']) - np.sum(flowsumm, axis=1)
+    #functions
+    fxnvars = [(fxnname, state) for fxnname, states in nomhist['functions'].items() for state in states if state!='faults']
+    fxnstatus, fxndiff = stack_hists(nomhist['functions'], [mdlhists[scen]['functions'] for scen in scens], fxnvars, returndiff)
+    numfaults = np.array([[[len(f)-('nom' in f) for f in mdlhists[scen]['functions'][fxnname]['faults']] 
+                           for fxnname in nomhist['functions']] for scen in scens], dtype=int).reshape(flowsumm.shape[0], len(nomhist['functions']), -1)
+    fxnsumm = np.ones(numfaults.shape, dtype=int)
+    ind = 0
+    for k, (fxnname, states) in enumerate(nomhist['functions'].items()):
+        states = [state for state in states if state!='faults']
+        if states: fxnsumm[:,k,:] = np.prod(fxnstatus[:,ind:ind+len(states),:], axis=1)
+        fxnsumm[:,k,:] = fxnsumm[:,k,:]*(1 - 1*(numfaults[:,k,:]>0))
+        for i, scen in enumerate(scens):
+            reshists[scen]['functions'][fxnname] = {state:fxnstatus[i, ind+j] for j, state in enumerate(states)}
+            reshists[scen]['functions'][fxnname]['faults'] = mdlhists[scen]['functions'][fxnname]['faults']
+            reshists[scen]['functions'][fxnname]['numfaults'] = numfaults[i,k]
+            reshists[scen]['functions'][fxnname]['status'] = fxnsumm[i,k]
+            diffs[scen][fxnname] = {state:fxndiff[i][ind+j] for j, state in enumerate(states)} if returndiff else {}
+        ind+=len(states)
+    fxndeg = np.any(fxnsumm==0, axis=2) + np.any(numfaults>0, axis=2)
+    totfaults = np.sum(numfaults, axis=1)
+    numdegfxns = len(nomhist['functions']) - np.sum(fxnsumm, axis=1)
+    for i, scen in enumerate(scens):
+        reshists[scen]['stats'] = {'degraded flows': numdegflows[i], 'degraded functions': numdegfxns[i], 'total faults': totfaults[i]}
+        summaries[scen]['degraded functions'] = [fxnname for k, fxnname in enumerate(nomhist['functions']) if fxndeg[i,k]]
+        summaries[scen]['degraded flows'] = [flowname for k, flowname in enumerate(nomhist['flows']) if flowdeg[i,k]]
     return reshists, diffs, summaries
+def stack_hists(nomobjs, objhists, objvars, returndiff=True):
+    """
+    Compares the histories of the given variables in a set of scenarios with the nominal history. Variables with
+    the same type are stacked in (scenario x variable x time) arrays and compared in a single operation.
+
+    Parameters
+    ----------
+    nomobjs : dict
+        Nominal history of the objects (flows or functions) with structure {objname:{var:array}}
+    objhists : list
+        Histories of the objects in each scenario with the same structure as nomobjs
+    objvars : list
+        List of (objname, var) tuples of the variables to compare
+    returndiff : bool, optional
+        Whether to return the differences between the values in the nominal and each scenario. The default is True.
+
+    Returns
+    -------
+    status : array
+        (scenario x variable x time) array of whether the variable is the same as the nominal (1) or not (0)
+    diff : list
+        list (over scenarios) of lists (over variables) of arrays of differences between the nominal and faulty values
+    """
+    numtimes = len(next(iter(nomobjs[objvars[0][0]].values()))) if objvars else 0
+    status = np.ones((len(objhists), len(objvars), numtimes), dtype=int)
+    diff = [[None]*len(objvars) for hist in objhists]
+    groups = {}
+    for j, (obj, var) in enumerate(objvars): 
+        dtype = np.result_type(*{hist_dtype(hist[obj][var]) for hist in [nomobjs]+objhists}) #so faulty values are not cast to the nominal type
+        groups.setdefault(dtype, []).append(j)
+    for dtype, inds in groups.items():
+        nominal = np.array([nomobjs[objvars[j][0]][objvars[j][1]] for j in inds], dtype=dtype)
+        faulty = np.empty((len(objhists), len(inds), numtimes), dtype=dtype)
+        for i, hist in enumerate(objhists):
+            for k, j in enumerate(inds): faulty[i,k] = hist[objvars[j][0]][objvars[j][1]]
+        status[:, inds, :] = 1*(faulty==nominal)
+        if returndiff:
+            groupdiff = nominal - faulty
+            for i in range(len(objhists)):
+                for k, j in enumerate(inds): diff[i][j] = groupdiff[i,k]
+    return status, diff
+def hist_dtype(vals):
+    """Returns the dtype of the history of a variable (without converting it to an array if it has a dtype)"""
+    return vals.dtype if hasattr(vals, 'dtype') else np.asarray(vals).dtype
 def compare_hist(mdlhist, nomhist={}, returndiff=True):
     """
     Compares model history with the nominal model history over time to make a history of degradation.
@@ -100,7 +212,7 @@ def compare_flowhist(mdlhist, returndiff=True):
         for att in mdlhist['nominal']['flows'][flowname]:
             faulty  = mdlhist['faulty']['flows'][flowname][att]
             nominal = mdlhist['nominal']['flows'][flowname][att]
-            flowhist[flowname][att] = 1* (faulty == nominal)
+            flowhist[flowname][att] = rio.compare_vals(faulty, nominal) #(fast if referenced, e.g. in localized runs, or delta-encoded)
             if returndiff: diff[flowname][att] = nominal - faulty
         summhist[flowname] = np.prod(np.array(list(flowhist[flowname].values())), axis = 0)
         if 0 in summhist[flowname]: degflows+=[flowname]
@@ -121,7 +233,7 @@ def compare_fxnhist(mdlhist, returndiff=True):
         for state in fhist:
             faulty  = mdlhist['faulty']['functions'][fxnname][state]
             nominal = mdlhist['nominal']['functions'][fxnname][state] 
-            fxnhist[fxnname][state] = 1* (faulty == nominal)
+            fxnhist[fxnname][state] = rio.compare_vals(faulty, nominal)
             diff[fxnname][state] = nominal - faulty
         if fxnhist[fxnname]: status = np.prod(np.array(list(fxnhist[fxnname].values())), axis = 0) 
         else: status = np.ones(len(mdlhist['faulty']['functions'][fxnname]['faults']), dtype=int) #should empty be given 1 or nothing?
@@ -137,6 +249,67 @@ def compare_fxnhist(mdlhist, returndiff=True):
     numdegfxns   = len(deghist) - np.sum(np.array(list(deghist.values())), axis=0)
     return fxnhist, numfaults, degfxns, numdegfxns, diff
 
+class LazyHists(Mapping):
+    """
+    Read-only dict of the results histories (or diffs) of each scenario in a set of model histories, which are computed
+    (with compare_hist or diff_hist) when the scenario is first accessed and then cached. Used when only a few scenarios
+    will be inspected, since it avoids comparing (and storing the results of) every scenario.
+    
+    Attributes
+    ----------
+    mdlhists : dict
+        model histories of each scenario (including the nominal)
+    kind : str
+        'reshist' for results histories or 'diff' for differences from the nominal
+    cache : dict
+        results computed so far
+    """
+    def __init__(self, mdlhists, kind='reshist'):
+        self.mdlhists = mdlhists
+        self.kind = kind
+        self.cache = {}
+    def __getitem__(self, scen):
+        if scen=='nominal': raise KeyError(scen)
+        if scen not in self.cache:
+            if self.kind=='reshist':    self.cache[scen] = compare_hist(self.mdlhists[scen], nomhist=self.mdlhists['nominal'], returndiff=False)[0]
+            else:                       self.cache[scen] = diff_hist(self.mdlhists[scen], self.mdlhists['nominal'])
+        return self.cache[scen]
+    def __iter__(self):
+        return (scen for scen in self.mdlhists if scen!='nominal')
+    def __len__(self):
+        return len(self.mdlhists) - ('nominal' in self.mdlhists)
+def diff_hist(mdlhist, nomhist):
+    """ Returns the differences between the nominal and faulty values of the flows and function states in mdlhist (as in compare_hist)"""
+    diff = {fxnname: {state: nomhist['functions'][fxnname][state] - vals for state, vals in fxnhist.items() if state!='faults'}
+            for fxnname, fxnhist in mdlhist['functions'].items()}
+    diff.update({flowname: {att: nomhist['flows'][flowname][att] - vals for att, vals in flowhist.items()}
+                 for flowname, flowhist in mdlhist['flows'].items()})
+    return diff
+def summarize_hists(mdlhists):
+    """
+    Finds the degraded functions and flows in each scenario (as in compare_hists) without computing results histories or diffs.
+
+    Parameters
+    ----------
+    mdlhists : dict
+        A dictionary of model histories for each scenario (e.g. from run_list or run_approach)
+
+    Returns
+    -------
+    summaries : dict
+        A dict with all degraded functions and degraded flows resulting from the fault scenarios.
+    """
+    nomhist = mdlhists['nominal']
+    summaries = {}
+    for scen, hist in mdlhists.items():
+        if scen=='nominal': continue
+        degflows = [flowname for flowname, atts in nomhist['flows'].items() 
+                    if not all([rio.is_nominal(hist['flows'][flowname][att], vals) for att, vals in atts.items()])]
+        degfxns = [fxnname for fxnname, states in nomhist['functions'].items() 
+                   if any([len(f)-('nom' in f) for f in hist['functions'][fxnname]['faults']])
+                   or not all([rio.is_nominal(hist['functions'][fxnname][state], vals) for state, vals in states.items() if state!='faults'])]
+        summaries[scen] = {'degraded functions': degfxns, 'degraded flows': degflows}
+    return summaries
 def compare_graphflows(g, nomg, gtype='normal'):
     """
     Extracts non-nominal flows by comparing the a results graph with a nominal results graph.
@@ -253,6 +426,86 @@ def make_resultsgraphs(ghist, nomghist, gtype='normal'):
         elif  gtype=='bipartite' or gtype=='component': rghist[i] = make_bipresultsgraph(ghist[i],nomghist[i])
     return rghist
 
+def make_graphstatus(mdl, hist, gtype='normal'):
+    """
+    Finds the status of each node and edge of the model graph at every time in a history in a single pass over the
+    history (without building a graph at each time--see make_resultsgraphs_from).
+
+    Parameters
+    ----------
+    mdl : model or networkx graph
+        The model the faults were run in (or its graph).
+    hist : dict
+        The results history (from compare_hist) or a dict of the nominal and faulty histories {'nominal':nomhist, 'faulty':mdlhist}
+    gtype : str, optional
+        Type of graph (normal or bipartite). The default is 'normal'.
+
+    Returns
+    -------
+    graphstatus : dict
+        Statuses with structure {'time':times, 'nodes':[nodes], 'nodestatus':array, 'edges':[edges], 'edgestatus':array},
+        where nodestatus and edgestatus are (time x node/edge) arrays with values 0 (nominal), 1 (degraded), 
+        and 2 (faulty). Edges are degraded if any of their flows are degraded.
+    """
+    reshist = compare_hist(hist, returndiff=False)[0] if 'nominal' in hist else hist
+    g = mdl_graph(mdl, gtype)
+    nodes, edges, flows = list(g.nodes), list(g.edges), list(reshist['flows'])
+    flowdeg = np.array([np.asarray(reshist['flows'][flow])==0 for flow in flows]).reshape(len(flows), len(reshist['time']))
+    nodestatus = np.zeros((len(reshist['time']), len(nodes)), dtype=np.int8)
+    for i, node in enumerate(nodes):
+        if node in reshist['functions']:
+            fxnhist = reshist['functions'][node]
+            nodestatus[:,i] = np.where(np.asarray(fxnhist['numfaults'])>0, 2, 1-np.asarray(fxnhist['status']))
+        elif node in reshist['flows']: nodestatus[:,i] = flowdeg[flows.index(node)]
+    flowinds = {flow:i for i, flow in enumerate(flows)}
+    incidence = np.zeros((len(edges), len(flows)), dtype=int)
+    for i, edge in enumerate(edges):
+        edgeflows = g.edges[edge] if gtype=='normal' else edge
+        incidence[i, [flowinds[flow] for flow in edgeflows if flow in flowinds]] = 1
+    edgestatus = (flowdeg.T.astype(int) @ incidence.T > 0).astype(np.int8)
+    return {'time':reshist['time'], 'nodes':nodes, 'nodestatus':nodestatus, 'edges':edges, 'edgestatus':edgestatus}
+def make_resultsgraphs_from(mdl, hist, times='all', gtype='normal'):
+    """
+    Makes a dict history of results graphs (as in make_resultsgraph/make_bipresultsgraph, with 'status' attributes) at
+    the given times from the statuses found in make_graphstatus, so graphs are only built for the times requested.
+
+    Parameters
+    ----------
+    mdl : model or networkx graph
+        The model the faults were run in (or its graph).
+    hist : dict
+        The results history (from compare_hist) or a dict of the nominal and faulty histories {'nominal':nomhist, 'faulty':mdlhist}
+    times : list or 'all', optional
+        The times in the history to make graphs at. The default is 'all'.
+    gtype : str, optional
+        Type of graph (normal or bipartite). The default is 'normal'.
+
+    Returns
+    -------
+    rghist : dict
+        dict history of results graphs with structure {time:graph}
+    """
+    reshist = compare_hist(hist, returndiff=False)[0] if 'nominal' in hist else hist
+    graphstatus = make_graphstatus(mdl, reshist, gtype)
+    g = mdl_graph(mdl, gtype)
+    statuses = np.array(['Nominal', 'Degraded', 'Faulty'])
+    rghist = {}
+    for t_ind in find_tinds(reshist, times):
+        rg = nx.Graph()
+        rg.add_nodes_from((node, {k:v for k,v in g.nodes[node].items() if k!='obj'}) for node in g.nodes)
+        nx.set_node_attributes(rg, dict(zip(graphstatus['nodes'], statuses[graphstatus['nodestatus'][t_ind]])), 'status')
+        modes = {fxn:set(fxnhist['faults'][t_ind]) for fxn, fxnhist in reshist['functions'].items() if fxn in rg}
+        nx.set_node_attributes(rg, modes, 'modes')
+        if gtype=='normal':
+            rg.add_edges_from((edge[0], edge[1], {flow:{'status':statuses[int(reshist['flows'][flow][t_ind]==0)]} for flow in g.edges[edge]}) for edge in g.edges)
+        else: rg.add_edges_from(g.edges)
+        rghist[reshist['time'][t_ind]] = rg
+    return rghist
+def mdl_graph(mdl, gtype='normal'):
+    """Returns the graph of the given type for the model (or the graph itself if a graph is given)"""
+    if isinstance(mdl, nx.Graph):   return mdl
+    elif gtype=='normal':           return mdl.graph
+    else:                           return mdl.bipartite
 
 ##HEATMAP FUNCTIONS
 def make_heatmaps(reshist, diff):
@@ -300,6 +553,69 @@ def make_heatmaps(reshist, diff):
         heatmaps['maxdiff'][flowname] = max(flowdiff) /( len_time * len(diff[flowname].keys()))
         heatmaps['intdiff'][flowname] = sum(flowdiff) /( len_time * len(diff[flowname].keys()))
     return heatmaps
+def calc_heatmaps(reshists, diffs={}, metrics=['degtime','maxdeg', 'intdeg', 'maxfaults', 'intdiff', 'maxdiff']):
+    """
+    Calculates heatmap metrics (see make_heatmaps) for all scenarios at once by stacking the results histories
+    into (scenario x function/flow x time) arrays.
+
+    Parameters
+    ----------
+    reshists : dict
+        The results histories of each scenario (e.g. from compare_hists)
+    diffs : dict, optional
+        The differences between the nominal and faulty states of each scenario (needed for intdiff and maxdiff). The default is {}.
+    metrics : list, optional
+        The metrics to calculate. The default is ['degtime','maxdeg', 'intdeg', 'maxfaults', 'intdiff', 'maxdiff'].
+
+    Returns
+    -------
+    heatmaps : dict
+        A dict of pandas DataFrames (indexed by scenario with columns for each function/flow) for each metric. 
+        Entries without a value (e.g. maxdeg for functions) are NaN.
+    """
+    scens = list(reshists)
+    if not scens: return {metric:pd.DataFrame() for metric in metrics}
+    first = reshists[scens[0]]
+    fxns, flows = list(first['functions']), list(first['flows'])
+    len_time = len(first['time'])
+    heatmaps = {}
+    if 'degtime' in metrics:
+        fxnstatus = np.array([[reshists[scen]['functions'][fxn]['status'] for fxn in fxns] for scen in scens]).reshape(len(scens), len(fxns), len_time)
+        flowstatus = np.array([[reshists[scen]['flows'][flow] for flow in flows] for scen in scens]).reshape(len(scens), len(flows), len_time)
+        heatmaps['degtime'] = np.concatenate((1.0 - np.sum(fxnstatus, axis=2)/len_time, 1.0 - np.sum(flowstatus, axis=2)/len_time), axis=1)
+    if 'maxfaults' in metrics:
+        numfaults = np.array([[reshists[scen]['functions'][fxn]['numfaults'] for fxn in fxns] for scen in scens]).reshape(len(scens), len(fxns), len_time)
+        heatmaps['maxfaults'] = np.concatenate((np.max(numfaults, axis=2), np.full((len(scens), len(flows)), np.nan)), axis=1)
+    if {'maxdeg', 'intdeg'}.intersection(metrics):
+        degraded = sum_vars([[reshists[scen]['flowvals'][flow] for flow in flows] for scen in scens], len_time)
+        if 'maxdeg' in metrics: heatmaps['maxdeg'] = np.concatenate((np.full((len(scens), len(fxns)), np.nan), np.max(degraded, axis=2)), axis=1)
+        if 'intdeg' in metrics: heatmaps['intdeg'] = np.concatenate((np.full((len(scens), len(fxns)), np.nan), np.sum(degraded, axis=2)/len_time), axis=1)
+    if {'maxdiff', 'intdiff'}.intersection(metrics) and diffs:
+        diffsum = sum_vars([[diffs[scen][obj] for obj in fxns+flows] for scen in scens], len_time)
+        numvars = np.array([len(diffs[scens[0]][obj]) for obj in fxns+flows])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            norm = np.where(numvars>0, 1/(len_time*numvars), np.nan)
+        if 'maxdiff' in metrics: heatmaps['maxdiff'] = np.max(diffsum, axis=2)*norm
+        if 'intdiff' in metrics: heatmaps['intdiff'] = np.sum(diffsum, axis=2)*norm
+    return {metric:pd.DataFrame(heatmaps[metric], index=scens, columns=fxns+flows).dropna(axis=1, how='all') for metric in metrics if metric in heatmaps}
+def sum_vars(objvars, len_time):
+    """ Sums the arrays of the variables of each object (dicts of arrays) in a (scenario x object) nested list into a (scenario x object x time) array"""
+    summed = np.zeros((len(objvars), len(objvars[0]) if objvars else 0, len_time))
+    for i, scenvars in enumerate(objvars):
+        for k, objvar in enumerate(scenvars):
+            if objvar: summed[i,k] = np.sum(list(objvar.values()), axis=0)
+    return summed
+def align_rates(heatmap, endclasses):
+    """ Returns the rates of each scenario in endclasses as a pandas Series aligned with the scenarios (index) of a heatmap DataFrame"""
+    rates = pd.Series({scen:endclass['rate'] for scen, endclass in endclasses.items()}, dtype=float).reindex(heatmap.index)
+    if rates.isnull().any(): raise Exception("Rates missing for scenarios: "+str(list(rates.index[rates.isnull()])))
+    return rates
+def make_avgheatmaps(reshists, diffs={}):
+    """ Makes a dict of heatmap dictionaries of each metric (see calc_heatmaps) averaged over the scenarios in reshists"""
+    return {metric:heatmap.mean().to_dict() for metric, heatmap in calc_heatmaps(reshists, diffs).items()}
+def make_expheatmaps(reshists, endclasses, diffs={}):
+    """ Makes a dict of heatmap dictionaries of each metric (see calc_heatmaps) summed over the scenarios in reshists weighted by their rates in endclasses"""
+    return {metric:heatmap.multiply(align_rates(heatmap, endclasses), axis=0).sum().to_dict() for metric, heatmap in calc_heatmaps(reshists, diffs).items()}
 def make_degtimemap(reshist):
     """ Makes a heatmap dictionary of degraded time for functions given a result history"""
     len_time = len(reshist['time'])
@@ -311,20 +627,14 @@ def make_degtimemap(reshist):
     return degtimemap
 def make_degtimemaps(reshists):
     """ Makes a dict of heatmap dictionaries of degraded time for functions given results histories"""
-    degtimemaps=dict.fromkeys(reshists.keys())
-    for reshist in reshists:
-        degtimemaps[reshist]=make_degtimemap(reshists[reshist])
-    return degtimemaps
+    return calc_heatmaps(reshists, metrics=['degtime'])['degtime'].to_dict('index')
 def make_avgdegtimeheatmap(reshists):
     """ Makes a heatmap dictionary of the average degraded heat time over a list of scenarios in the dict of results histories."""
-    degtimetable = pd.DataFrame(make_degtimemaps(reshists)).transpose()
-    return degtimetable.mean().to_dict()
+    return calc_heatmaps(reshists, metrics=['degtime'])['degtime'].mean().to_dict()
 def make_expdegtimeheatmap(reshists, endclasses):
     """ Makes a heatmap dictionary of the expected degraded heat time over a list of scenarios in the dict of results histories based on the rates in endclasses."""
-    degtimetable = pd.DataFrame(make_degtimemaps(reshists))
-    rates = list(pd.DataFrame(endclasses).transpose()['rate'])
-    expdegtimetable = degtimetable.multiply(rates).transpose()
-    return expdegtimetable.sum().to_dict()
+    degtimetable = calc_heatmaps(reshists, metrics=['degtime'])['degtime']
+    return degtimetable.multiply(align_rates(degtimetable, endclasses), axis=0).sum().to_dict()
 def make_faultmap(reshist):
     """ Makes a heatmap dictionary of faults given a results history."""
     heatmap={}
@@ -333,20 +643,14 @@ def make_faultmap(reshist):
     return heatmap
 def make_faultmaps(reshists):
     """ Makes dict of heatmaps dictionaries of resulting faults given a results history."""
-    faulttimemaps=dict.fromkeys(reshists.keys())
-    for reshist in reshists:
-        faulttimemaps[reshist]=make_faultmap(reshists[reshist])
-    return faulttimemaps
+    return calc_heatmaps(reshists, metrics=['maxfaults'])['maxfaults'].to_dict('index')
 def make_faultsheatmap(reshists):
     """Makes a heatmap dictionary of the average resulting faults over all scenarios"""
-    faulttable = pd.DataFrame(make_faultmaps(reshists)).transpose()
-    return faulttable.mean().to_dict()
+    return calc_heatmaps(reshists, metrics=['maxfaults'])['maxfaults'].mean().to_dict()
 def make_expfaultsheatmap(reshists, endclasses):
     """Makes a heatmap dictionary of the expected resulting faults over all scenarios"""
-    faulttable = pd.DataFrame(make_faultmaps(reshists))
-    rates = list(pd.DataFrame(endclasses).transpose()['rate'])
-    expfaulttable = faulttable.multiply(rates).transpose()
-    return expfaulttable.mean().to_dict()
+    faulttable = calc_heatmaps(reshists, metrics=['maxfaults'])['maxfaults']
+    return faulttable.multiply(align_rates(faulttable, endclasses), axis=0).mean().to_dict()
 
 
 ## MAKE TABLES
@@ -356,35 +660,48 @@ def make_expfaultsheatmap(reshists, endclasses):
 def make_histtable(mdlhist):
     """ Returns formatted pandas dataframe of model history"""
     if "nominal" in mdlhist.keys(): mdlhist=mdlhist['faulty']
-    if any(isinstance(i,dict) for i in mdlhist['flows'].values()):
-        flowtable =  make_objtable(mdlhist, 'flows')
-    else:
-        flowtable = make_objtable(mdlhist, 'flowvals')
-    fxntable  =  make_objtable(mdlhist, 'functions')
-    timetable = pd.DataFrame()
-    timetable['time', 't'] = mdlhist['time']
-    timetable.reindex([('time', 't')], axis="columns")
-    histtable = pd.concat([timetable, fxntable, flowtable], axis =1)
-    index = pd.MultiIndex.from_tuples(histtable.columns)
-    histtable = histtable.reindex(index, axis='columns')
-    return histtable
+    columns = {('time', 't'): mdlhist['time'], **hist_columns(mdlhist)}
+    return pd.DataFrame(columns, columns=pd.MultiIndex.from_tuples(columns), copy=False)
+def hist_columns(mdlhist):
+    """ Returns a dict of the columns {(fxn/flow, att):values} of the functions and flows in a model history"""
+    if any(isinstance(i,dict) for i in mdlhist['flows'].values()):  flowtype = 'flows'
+    else:                                                           flowtype = 'flowvals'
+    return {**obj_columns(mdlhist, 'functions'), **obj_columns(mdlhist, flowtype)}
+def obj_columns(hist, objtype):
+    """ Returns a dict of the columns {(fxn/flow, att):values} of the attributes of the functions OR flows (objtype) in a history"""
+    return {(obj, att):val for obj, atts in hist[objtype].items() for att, val in atts.items()}
 def make_objtable(hist, objtype):
     """make table of function OR flow value attributes - objtype = 'function' or 'flow'"""
-    df = pd.DataFrame()
-    labels = []
-    for fxn, atts in hist[objtype].items():
-        for att, val in atts.items():
-            label=(fxn, att)
-            labels=labels+[label]
-            df[label]=val
-        if objtype =='functions':
-            if hist[objtype][fxn].get('faults'):
-                label=(fxn, 'faults')
-                labels+=[label]
-                df[label]=hist[objtype][fxn]['faults']
-    index = pd.MultiIndex.from_tuples(labels)
-    df = df.reindex(index, axis="columns")
-    return df
+    columns = obj_columns(hist, objtype)
+    return pd.DataFrame(columns, columns=pd.MultiIndex.from_tuples(columns), copy=False)
+def make_histtables(mdlhists, scens=[]):
+    """
+    Makes a long-format table of the model histories of a set of scenarios (e.g. for exporting a batch of results)
+
+    Parameters
+    ----------
+    mdlhists : dict
+        A dictionary of model histories for each scenario (e.g. from run_list or run_approach)
+    scens : list, optional
+        Scenarios to include in the table. The default is [] (all scenarios).
+
+    Returns
+    -------
+    table : dataframe
+        table with rows indexed by (scenario, time) and columns (fxn/flow, att) for each function and flow attribute 
+    """
+    if not scens: scens = list(mdlhists)
+    scencolumns = [hist_columns(mdlhists[scen]) for scen in scens]
+    labels = list(scencolumns[0]) if scens else []
+    columns = {}
+    for label in labels:
+        vals = [cols[label] for cols in scencolumns]
+        if isinstance(vals[0], np.ndarray): columns[label] = np.concatenate(vals)
+        else:                               columns[label] = [v for val in vals for v in val]
+    lens = [len(mdlhists[scen]['time']) for scen in scens]
+    index = pd.MultiIndex.from_arrays([np.repeat(scens, lens), np.concatenate([mdlhists[scen]['time'] for scen in scens]) if scens else []], 
+                                      names=['scenario', 'time'])
+    return pd.DataFrame(columns, index=index, columns=pd.MultiIndex.from_tuples(labels) if labels else None, copy=False)
 def make_statstable(reshist):
     """Makes a table of #of degraded flows, # of degraded functions, and # of total faults over time given a single result history"""
     table = pd.DataFrame(reshist['stats'])
@@ -392,30 +709,19 @@ def make_statstable(reshist):
     return table
 def make_degflowstable(reshist):
     """Makes a table of flows over time, where 0 is degraded and 1 is nominal"""
-    table = pd.DataFrame(reshist['flows'])
-    table.insert(0, 'time', reshist['time'])
-    return table
+    return pd.DataFrame({'time':reshist['time'], **reshist['flows']}, copy=False)
 def make_degflowvalstable(reshist):
     """Makes a table of individual flow state values over time, where 0 is degraded and 1 is nominal"""
-    table = make_objtable(reshist, 'flowvals')
-    table.insert(0, 'time', reshist['time'])
-    return table
+    columns = {('time', ''):reshist['time'], **obj_columns(reshist, 'flowvals')}
+    return pd.DataFrame(columns, columns=pd.MultiIndex.from_tuples(columns), copy=False)
 def make_degfxnstable(reshist):
     """Makes a table showing which functions are degraded over time (0 for degraded, 1 for nominal)"""
-    table = pd.DataFrame()
-    for fxnname in reshist['functions']:
-        table[fxnname]=reshist['functions'][fxnname]['status']
-    table.insert(0, 'time', reshist['time'])
-    return table
+    return pd.DataFrame({'time':reshist['time'], **{fxnname:fxn['status'] for fxnname, fxn in reshist['functions'].items()}}, copy=False)
 def make_deghisttable(reshist, withstats=False):
     """Makes a table of all funcitons and flows that are degraded over time. If withstats=True, the total # of each type degraded is provided in the last columns """
-    fxnstable = make_degfxnstable(reshist)
-    flowstable = pd.DataFrame(reshist['flows'])
-    if withstats:
-        statstable = pd.DataFrame(reshist['stats'])
-        return pd.concat([fxnstable, flowstable, statstable], axis =1)
-    else:
-        return pd.concat([fxnstable, flowstable], axis =1)
+    columns = {'time':reshist['time'], **{fxnname:fxn['status'] for fxnname, fxn in reshist['functions'].items()}, **reshist['flows']}
+    if withstats: columns.update(reshist['stats'])
+    return pd.DataFrame(columns, copy=False)
 def make_heatmapstable(heatmaps):
     """Makes a table of a heatmap dictionary"""
     table = pd.DataFrame(heatmaps)
@@ -424,9 +730,10 @@ def make_simplefmea(endclasses):
     """Makes a simple fmea (rate, cost, expected cost) of the endclasses of a list of fault scenarios run"""
     table = pd.DataFrame(endclasses)
     return table.transpose()
-def make_phasefmea(endclasses, app):
+def make_endclasstable(endclasses, app):
     """
-    Makes a simple fmea of the endclasses of a set of fault scenarios run grouped by phase.
+    Makes a columnar table of the endclasses of a set of fault scenarios run with the properties of each scenario in the
+    sample approach. Used (in place of endclasses) to make fmeas with grouped operations over the scenarios.
 
     Parameters
     ----------
@@ -435,27 +742,64 @@ def make_phasefmea(endclasses, app):
     app : sampleapproach
         sample approach used for the underlying probability model of the set of scenarios run
 
+    Returns
+    -------
+    table : dataframe
+        table indexed by scenario name with columns: fxn, mode, phase, time, rate, cost, expected cost, weight.
+        For joint-fault scenarios, fxn and mode are tuples of the functions and modes.
+    """
+    names, fxns, modes, phases, times, weights = [], [], [], [], [], []
+    scentimes = {scen['properties']['name']:scen['properties']['time'] for scen in app.scenlist}
+    for (fxnmode, phase), ids in app.scenids.items():
+        if type(fxnmode[0])==str:   fxn, mode = fxnmode
+        else:                       fxn, mode = tuple(fm[0] for fm in fxnmode), tuple(fm[1] for fm in fxnmode)
+        names.extend(ids)
+        fxns.extend([fxn]*len(ids))
+        modes.extend([mode]*len(ids))
+        phases.extend([phase]*len(ids))
+        times.extend([scentimes[scenid] for scenid in ids])
+        weights.extend([app.weights[fxnmode][phase][scentimes[scenid]] for scenid in ids])
+    table = pd.DataFrame({'fxn':fxns, 'mode':modes, 'phase':phases, 'time':times,
+                          'rate':     [endclasses[scenid]['rate'] for scenid in names],
+                          'cost':     [endclasses[scenid]['cost'] for scenid in names],
+                          'expected cost':[endclasses[scenid]['expected cost'] for scenid in names],
+                          'weight':   weights}, index=names)
+    return table
+def group_fxnmodes(table, by=[]):
+    """Returns the groupby of an endclass table by the fault mode (and other columns in by), along with the fault mode tuples of each group"""
+    grouped = table.groupby(['fxn', 'mode']+by, sort=False)
+    fxnmodes = [key[:2] if type(key[0])==str else tuple(zip(key[0], key[1])) for key in grouped.groups.keys()]
+    return grouped, fxnmodes
+def make_phasefmea(endclasses, app):
+    """
+    Makes a simple fmea of the endclasses of a set of fault scenarios run grouped by phase.
+
+    Parameters
+    ----------
+    endclasses : dict or dataframe
+        dict of endclasses of the simulation runs (or table of them from make_endclasstable)
+    app : sampleapproach
+        sample approach used for the underlying probability model of the set of scenarios run
+
     Returns
     -------
     table: dataframe
         table with cost, rate, and expected cost of each fault in each phase
     """
-    fmeadict = dict.fromkeys(app.scenids.keys())
-    for modephase, ids in app.scenids.items():
-        rate= sum([endclasses[scenid]['rate'] for scenid in ids])
-        cost= sum(np.array([endclasses[scenid]['cost'] for scenid in ids])*np.array(list(app.weights[modephase[0]][modephase[1]].values())))
-        expcost= sum([endclasses[scenid]['expected cost'] for scenid in ids])
-        fmeadict[modephase] = {'rate':rate, 'cost':cost, 'expected cost': expcost}
-    table=pd.DataFrame(fmeadict)
-    return table.transpose()
+    if not isinstance(endclasses, pd.DataFrame): endclasses = make_endclasstable(endclasses, app)
+    endclasses = endclasses.assign(cost = endclasses['cost']*endclasses['weight'])
+    grouped, fxnmodes = group_fxnmodes(endclasses, ['phase'])
+    table = grouped[['rate', 'cost', 'expected cost']].sum()
+    table.index = pd.MultiIndex.from_tuples([(fxnmode, key[2]) for fxnmode, key in zip(fxnmodes, table.index)])
+    return table
 def find_costovertime(endclasses, app):
     """
     Makes a table of the total cost, rate, and expected cost of all faults over time
 
     Parameters
     ----------
-    endclasses : dict
-        dict with rate,cost, and expected cost for each injected scenario
+    endclasses : dict or dataframe
+        dict with rate,cost, and expected cost for each injected scenario (or table of them from make_endclasstable)
     app : sampleapproach
         sample approach used to generate the list of scenarios
 
@@ -464,12 +808,11 @@ def find_costovertime(endclasses, app):
     costovertime : dataframe
         pandas dataframe with the total cost, rate, and expected cost for the set of scenarios
     """
-    costovertime={'cost':{time:0.0 for time in app.times}, 'rate':{time:0.0 for time in app.times}, 'expected cost':{time:0.0 for time in app.times}}
-    for scen in app.scenlist:
-        costovertime['cost'][scen['properties']['time']]+=endclasses[scen['properties']['name']]['cost']
-        costovertime['rate'][scen['properties']['time']]+=endclasses[scen['properties']['name']]['rate']
-        costovertime['expected cost'][scen['properties']['time']]+=endclasses[scen['properties']['name']]['expected cost'] 
-    return pd.DataFrame.from_dict(costovertime)
+    if not isinstance(endclasses, pd.DataFrame): endclasses = make_endclasstable(endclasses, app)
+    costovertime = endclasses.groupby('time')[['cost', 'rate', 'expected cost']].sum()
+    costovertime = costovertime.reindex(list(dict.fromkeys(app.times)), fill_value=0.0).astype(float)
+    costovertime.index.name = None
+    return costovertime
         
 def make_summfmea(endclasses, app):
     """
@@ -477,8 +820,8 @@ def make_summfmea(endclasses, app):
 
     Parameters
     ----------
-    endclasses : dict
-        dict of endclasses of the simulation runs
+    endclasses : dict or dataframe
+        dict of endclasses of the simulation runs (or table of them from make_endclasstable)
     app : sampleapproach
         sample approach used for the underlying probability model of the set of scenarios run
 
@@ -487,19 +830,142 @@ def make_summfmea(endclasses, app):
     table: dataframe
         table with cost, rate, and expected cost of each fault (over all phases)
     """
-    fmeadict = dict()
-    for modephase, ids in app.scenids.items():
-        rate= sum([endclasses[scenid]['rate'] for scenid in ids])
-        cost= sum(np.array([endclasses[scenid]['cost'] for scenid in ids])*np.array(list(app.weights[modephase[0]][modephase[1]].values())))
-        expcost= sum([endclasses[scenid]['expected cost'] for scenid in ids])
-        if getattr(app, 'jointmodes', []):  index = str(modephase[0])
-        else:                               index = modephase[0]
-        if not fmeadict.get(modephase[0]): fmeadict[index]= {'rate': 0.0, 'cost':0.0, 'expected cost':0.0}
-        fmeadict[index]['rate'] += rate
-        fmeadict[index]['cost'] += cost/len([1.0 for (fxnmode,phase) in app.scenids if fxnmode==modephase[0]])
-        fmeadict[index]['expected cost'] += expcost
-    table=pd.DataFrame(fmeadict)
-    return table.transpose()
+    phasefmea = make_phasefmea(endclasses, app)
+    fxnmodes = phasefmea.index.get_level_values(0)
+    if getattr(app, 'jointmodes', []):  fxnmodes = fxnmodes.map(str)
+    grouped = phasefmea.groupby(fxnmodes, sort=False)
+    table = grouped[['rate', 'expected cost']].sum()
+    table.insert(1, 'cost', grouped['cost'].mean())
+    if not getattr(app, 'jointmodes', []): table.index = pd.MultiIndex.from_tuples(table.index)
+    return table
+def reweight_endclasstable(endclasses, app, fxnrates={}, comprates={}, modeparams={}):
+    """
+    Re-weights the endclasses of a set of fault scenarios for an updated rate model of the sample approach without 
+    re-simulating them. Since the rate model does not change the simulation of a scenario (only its rate), the rate
+    of each scenario is re-calculated and its expected cost is scaled by the ratio of the new and old rates.
+
+    Parameters
+    ----------
+    endclasses : dict or dataframe
+        dict of endclasses of the simulation runs (or table of them from make_endclasstable)
+    app : sampleapproach
+        sample approach used to generate the scenarios (which is not modified)
+    fxnrates : dict, optional
+        New overall failure rates, with structure {fxnname: rate}. The default is {}.
+    comprates : dict, optional
+        New overall failure rates of components, with structure {fxnname:{compname: rate}}. The default is {}.
+    modeparams : dict, optional
+        New mode parameters ('dist' and/or 'oppvect'), with structure {(fxn, mode): {'dist':dist, 'oppvect':oppvect}}.
+        The default is {}.
+
+    Returns
+    -------
+    table : dataframe
+        endclass table (see make_endclasstable) with the new rate and expected cost of each scenario. May be used in
+        place of endclasses in make_phasefmea, make_summfmea, and find_costovertime.
+    """
+    if not isinstance(endclasses, pd.DataFrame): endclasses = make_endclasstable(endclasses, app)
+    fxnmodes, rates, rates_timeless = app.calc_rates(fxnrates, comprates, modeparams)
+    scenrates = pd.Series(app.calc_scenrates(rates), index=[scen['properties']['name'] for scen in app.scenlist])
+    newrates = scenrates.reindex(endclasses.index).values
+    oldrates = endclasses['rate'].values.astype(float)
+    ratios = np.divide(newrates, oldrates, out=np.full(len(oldrates), np.nan), where=oldrates!=0.0)
+    if np.isnan(ratios).any(): print("Warning: expected cost of scenarios with zero prior rate cannot be re-weighted")
+    return endclasses.assign(**{'rate':newrates, 'expected cost':endclasses['expected cost'].values*ratios})
+def reweight_endclasses(endclasses, app, fxnrates={}, comprates={}, modeparams={}):
+    """
+    Re-weights the endclasses of a set of fault scenarios for an updated rate model of the sample approach without
+    re-simulating them (see reweight_endclasstable).
+
+    Returns
+    -------
+    newendclasses : dict
+        endclasses with the new rate and expected cost of each scenario
+    """
+    table = reweight_endclasstable(endclasses, app, fxnrates, comprates, modeparams)
+    newvals = table[['rate', 'expected cost']].to_dict('index')
+    return {scen: {**endclass, **newvals.get(scen, {})} for scen, endclass in endclasses.items()}
+def reweight_fmeas(endclasses, app, fxnrates={}, comprates={}, modeparams={}):
+    """
+    Re-calculates the fmea tables of a set of fault scenarios for an updated rate model of the sample approach without
+    re-simulating them (see reweight_endclasstable).
+
+    Returns
+    -------
+    fmeas : dict
+        dict of tables with structure {'endclasses': endclass table, 'simple': simple fmea, 'phase': phase fmea,
+        'summary': summary fmea, 'costovertime': cost over time table}
+    """
+    table = reweight_endclasstable(endclasses, app, fxnrates, comprates, modeparams)
+    return {'endclasses':table, 'simple':table[['rate', 'cost', 'expected cost']], 'phase':make_phasefmea(table, app),
+            'summary':make_summfmea(table, app), 'costovertime':find_costovertime(table, app)}
+def calc_expcostdists(endclasses, app, fxnrates={}, comprates={}, modeparams={}, numsamples=1000, percentiles=[5,50,95], seed=None):
+    """
+    Calculates the distributions of the total and per-mode expected cost of a set of fault scenarios over uncertain
+    rate models of the sample approach without re-simulating them. Every sample of the rates is propagated through
+    the rate and weight model of the approach at once, with the cost of each scenario given by its expected cost 
+    over its rate in the endclasses. The cost of scenarios with zero (or unknown) prior rate cannot be recovered this
+    way, so the modes of these scenarios are excluded (with a warning) rather than counted as having no cost.
+
+    Parameters
+    ----------
+    endclasses : dict or dataframe
+        dict of endclasses of the simulation runs (or table of them from make_endclasstable)
+    app : sampleapproach
+        sample approach used to generate the scenarios (which is not modified)
+    fxnrates : dict, optional
+        Uncertain overall failure rates, with structure {fxnname: rate}. The default is {}.
+        Each rate may be a distribution to sample from (an object with an rvs method, e.g. a scipy.stats distribution),
+        an array of samples, or a float.
+    comprates : dict, optional
+        Uncertain overall failure rates of components, with structure {fxnname:{compname: rate}}. The default is {}.
+    modeparams : dict, optional
+        Uncertain mode parameters ('dist' and/or 'oppvect'), with structure {(fxn, mode): {'dist':dist, 'oppvect':oppvect}}.
+        Arrays of samples of oppvect have shape (numsamples, phases). The default is {}.
+    numsamples : int, optional
+        Number of samples to draw from each distribution. The default is 1000.
+    percentiles : list, optional
+        Percentiles of the expected costs to return. The default is [5,50,95].
+    seed : int, optional
+        Seed for the random number generator used to draw samples. The default is None.
+
+    Returns
+    -------
+    expcostdists : dict
+        dict with structure {'total': series, 'modes': dataframe, 'samples': array, 'excluded': list}, where total has
+        the mean and percentiles of the total expected cost, modes has the mean and percentiles of the expected cost of
+        each mode, samples has the total expected cost of each sample, and excluded has the modes left out of modes and
+        total (because they have scenarios with zero prior rate).
+    """
+    if not isinstance(endclasses, pd.DataFrame): endclasses = make_endclasstable(endclasses, app)
+    rng = np.random.default_rng(seed)
+    fxnrates, comprates, modeparams = [draw_samples(params, numsamples, rng) for params in (fxnrates, comprates, modeparams)]
+    fxnmodes, rates, rates_timeless = app.calc_rates(fxnrates, comprates, modeparams)
+    modeinds, phaseinds, weights, maxlike = app.find_scenrateinds()
+    scens = endclasses.reindex([scen['properties']['name'] for scen in app.scenlist])
+    oldrates = scens['rate'].values.astype(float)
+    unknown = ~(oldrates>0.0) # zero or missing (nan) prior rates
+    costs = np.divide(scens['expected cost'].values.astype(float), oldrates, out=np.zeros(len(oldrates)), where=~unknown)
+    costweights = np.zeros(rates.shape[-2:]) # cost of each mode in each phase per unit rate
+    np.add.at(costweights, (modeinds[~maxlike], phaseinds[~maxlike]), (weights*costs)[~maxlike])
+    np.add.at(costweights, modeinds[maxlike], costs[maxlike][:,None])
+    included = np.ones(len(fxnmodes), dtype=bool)
+    included[modeinds[unknown]] = False
+    excluded = [fxnmodes[ind] for ind in np.flatnonzero(~included)]
+    if excluded: print("Warning: modes with zero prior rate scenarios excluded from expected cost distributions: "+str(excluded))
+    modecosts = (rates*costweights).sum(axis=-1).reshape(-1, len(fxnmodes))[:, included]
+    totalcosts = modecosts.sum(axis=-1)
+    if getattr(app, 'jointmodes', []):  index = pd.Index([str(fxnmode) for fxnmode, inc in zip(fxnmodes, included) if inc])
+    else:                               index = pd.MultiIndex.from_tuples([fxnmode for fxnmode, inc in zip(fxnmodes, included) if inc])
+    modes = pd.DataFrame(np.percentile(modecosts, percentiles, axis=0).T, index=index, columns=percentiles)
+    modes.insert(0, 'mean', modecosts.mean(axis=0))
+    total = pd.Series([totalcosts.mean()]+list(np.percentile(totalcosts, percentiles)), index=['mean']+list(percentiles))
+    return {'total':total, 'modes':modes, 'samples':totalcosts, 'excluded':excluded}
+def draw_samples(params, numsamples, rng=None):
+    """Draws numsamples samples of each distribution (object with an rvs method) in a (nested) dict of parameters"""
+    if isinstance(params, dict):    return {key: draw_samples(param, numsamples, rng) for key, param in params.items()}
+    elif hasattr(params, 'rvs'):    return params.rvs(size=numsamples, random_state=rng)
+    else:                           return params
 def make_maptable(mapping):
     """Makes table of a generic map"""
     table = pd.DataFrame(mapping)
@@ -639,7 +1105,7 @@ def plot_costovertime(endclasses, app, costtype='expected cost', timelabel='time
     plt.xlabel(timelabel)
     plt.grid()
 
-def plot_mdlhist(mdlhist, fault='', time=0, fxnflows=[], returnfigs=False, legend=True, timelabel="time"):
+def plot_mdlhist(mdlhist, fault='', time=0, fxnflows=[], returnfigs=False, legend=True, timelabel="time", maxpoints=2000):
     """
     Plots the states of a model over time given a history.
 
@@ -657,6 +1123,8 @@ def plot_mdlhist(mdlhist, fault='', time=0, fxnflows=[], returnfigs=False, legen
         Whether to return the figure objects in a list. The default is False.
     legend: bool, optional
         Whether the plot should have a legend for faulty and nominal states. The default is true
+    maxpoints : int, optional
+        Maximum number of points to plot for each variable (see decimate). The default is 2000.
     """
     mdlhists={}
     if 'nominal' not in mdlhist: mdlhists['nominal']=mdlhist
@@ -668,37 +1136,31 @@ def plot_mdlhist(mdlhist, fault='', time=0, fxnflows=[], returnfigs=False, legen
             if fxnflows: #if in the list 
                 if fxnflow not in fxnflows: continue
             
-            if objtype =="flows":
-                nomhist=mdlhists['nominal']["flows"][fxnflow]
-                if 'faulty' in mdlhists: hist = mdlhists['faulty']["flows"][fxnflow]
-            elif objtype=="functions":
-                nomhist=copy.deepcopy(mdlhists['nominal']["functions"][fxnflow])
-                del nomhist['faults']
-                if 'faulty' in mdlhists: 
-                    hist = copy.deepcopy(mdlhists['faulty']["functions"][fxnflow])
-                    del hist['faults']
-            plots=len(nomhist)
+            nomhist=mdlhists['nominal'][objtype][fxnflow]
+            if 'faulty' in mdlhists: hist = mdlhists['faulty'][objtype][fxnflow]
+            histvars = [var for var in nomhist if var!='faults']
+            plots=len(histvars)
             if plots:
                 fig = plt.figure()
                 figs = figs +[fig]
-                if legend: fig.add_subplot(np.ceil((plots+1)/2),2,plots)
-                else: fig.add_subplot(np.ceil((plots)/2),2,plots)
+                if legend: fig.add_subplot(int(np.ceil((plots+1)/2)),2,plots)
+                else: fig.add_subplot(int(np.ceil((plots)/2)),2,plots)
                 
                 plt.tight_layout(pad=2.5, w_pad=2.5, h_pad=2.5, rect=[0, 0.03, 1, 0.95])
                 n=1
-                for var in nomhist:
-                    plt.subplot(np.ceil((plots+1)/2),2,n, label=fxnflow+var)
+                for var in histvars:
+                    plt.subplot(int(np.ceil((plots+1)/2)),2,n, label=fxnflow+var)
                     n+=1
                     if 'faulty' in mdlhists:
-                        a, = plt.plot(times, hist[var], color='r')
+                        a, = plt.plot(*decimate(times, hist[var], maxpoints), color='r')
                         c = plt.axvline(x=time, color='k')
-                    b, =plt.plot(times, nomhist[var], ls='--', color='b')
+                    b, =plt.plot(*decimate(times, nomhist[var], maxpoints), ls='--', color='b')
                     plt.title(var)
                     plt.xlabel(timelabel)
                 if 'faulty' in mdlhists:
                     fig.suptitle('Dynamic Response of '+fxnflow+' to fault'+' '+fault)
                     if legend:
-                        ax_l = plt.subplot(np.ceil((plots+1)/2),2,n, label=fxnflow+'legend')
+                        ax_l = plt.subplot(int(np.ceil((plots+1)/2)),2,n, label=fxnflow+'legend')
                         plt.legend([a,b],['faulty', 'nominal'], loc='center')
                         plt.box(on=None)
                         ax_l.get_xaxis().set_visible(False)
@@ -706,7 +1168,7 @@ def plot_mdlhist(mdlhist, fault='', time=0, fxnflows=[], returnfigs=False, legen
                 plt.show()
     if returnfigs: return figs
 
-def plot_mdlhistvals(mdlhist, fault='', time=0, fxnflowvals={}, cols=2, returnfig=False, legend=True, timelabel="time"):
+def plot_mdlhistvals(mdlhist, fault='', time=0, fxnflowvals={}, cols=2, returnfig=False, legend=True, timelabel="time", maxpoints=2000):
     """
     Plots the states of a model over time given a history.
 
@@ -726,7 +1188,8 @@ def plot_mdlhistvals(mdlhist, fault='', time=0, fxnflowvals={}, cols=2, returnfi
         Whether to return the figure. The default is False.
     legend: bool, optional
         Whether the plot should have a legend for faulty and nominal states. The default is true
-        
+    maxpoints : int, optional
+        Maximum number of points to plot for each variable (see decimate). The default is 2000.
     """
     mdlhists={}
     if 'nominal' not in mdlhist: mdlhists['nominal']=mdlhist
@@ -743,32 +1206,26 @@ def plot_mdlhistvals(mdlhist, fault='', time=0, fxnflowvals={}, cols=2, returnfi
             if fxnflowvals: #if in the list 
                 if fxnflow not in fxnflowvals: continue
             
-            if objtype =="flows":
-                nomhist=mdlhists['nominal']["flows"][fxnflow]
-                if 'faulty' in mdlhists: hist = mdlhists['faulty']["flows"][fxnflow]
-            elif objtype=="functions":
-                nomhist=copy.deepcopy(mdlhists['nominal']["functions"][fxnflow])
-                del nomhist['faults']
-                if 'faulty' in mdlhists: 
-                    hist = copy.deepcopy(mdlhists['faulty']["functions"][fxnflow])
-                    del hist['faults']
+            nomhist=mdlhists['nominal'][objtype][fxnflow]
+            if 'faulty' in mdlhists: hist = mdlhists['faulty'][objtype][fxnflow]
 
             for var in nomhist:
+                if var=='faults': continue
                 if fxnflowvals: #if in the list of values
                     if var not in fxnflowvals[fxnflow]: continue
-                if legend: plt.subplot(np.ceil((num_plots+1)/cols),cols,n, label=fxnflow+var)
-                else: plt.subplot(np.ceil((num_plots)/cols),cols,n, label=fxnflow+var)
+                if legend: plt.subplot(int(np.ceil((num_plots+1)/cols)),cols,n, label=fxnflow+var)
+                else: plt.subplot(int(np.ceil((num_plots)/cols)),cols,n, label=fxnflow+var)
                 n+=1
                 if 'faulty' in mdlhists:
-                    a, = plt.plot(times, hist[var], color='r')
+                    a, = plt.plot(*decimate(times, hist[var], maxpoints), color='r')
                     c = plt.axvline(x=time, color='k')
-                b, =plt.plot(times, nomhist[var], ls='--', color='b')
+                b, =plt.plot(*decimate(times, nomhist[var], maxpoints), ls='--', color='b')
                 plt.title(fxnflow+": "+var)
                 plt.xlabel(timelabel)
     if 'faulty' in mdlhists:
         fig.suptitle('Dynamic Response of '+fxnflow+' to fault'+' '+fault)
         if legend:
-            ax_l = plt.subplot(np.ceil((num_plots+1)/cols),cols,n, label=fxnflow+'legend')
+            ax_l = plt.subplot(int(np.ceil((num_plots+1)/cols)),cols,n, label=fxnflow+'legend')
             plt.legend([a,b],['faulty', 'nominal'], loc='center')
             plt.box(on=None)
             ax_l.get_xaxis().set_visible(False)
@@ -779,6 +1236,119 @@ def plot_mdlhistvals(mdlhist, fault='', time=0, fxnflowvals={}, cols=2, returnfi
     else: plt.show()
 
     
+def decimate(times, vals, maxpoints=2000):
+    """
+    Reduces a long series to (at most) maxpoints points for plotting. The series is split into maxpoints/2 intervals
+    and the minimum and maximum value in each interval are kept, so peaks (e.g. from short faults) are still shown.
+
+    Parameters
+    ----------
+    times : array
+        Times of the series
+    vals : array
+        Values of the series. Non-numeric series are not reduced.
+    maxpoints : int, optional
+        Maximum number of points. The default is 2000. If None/0, the series is not reduced.
+
+    Returns
+    -------
+    times : array
+        Times of the points kept
+    vals : array
+        Values of the points kept
+    """
+    times, vals = np.asarray(times), np.asarray(vals)
+    if not maxpoints or len(vals)<=maxpoints or vals.dtype.kind not in 'biuf': return times, vals
+    buckets, starts = bucket_vals(vals, maxpoints//2)
+    inds = np.concatenate([[0, len(vals)-1], starts+buckets.argmin(axis=1), starts+buckets.argmax(axis=1)])
+    inds = np.unique(np.minimum(inds, len(vals)-1))
+    return times[inds], vals[inds]
+def bucket_vals(vals, numbuckets):
+    """Splits a series into a (numbuckets x size) array (padded with the last value) and returns it with the start index of each bucket"""
+    size = int(np.ceil(len(vals)/numbuckets))
+    numbuckets = int(np.ceil(len(vals)/size))
+    buckets = np.pad(vals, (0, numbuckets*size-len(vals)), mode='edge').reshape(numbuckets, size)
+    return buckets, np.arange(numbuckets)*size
+
+def calc_envelope(mdlhists, path, percentiles=[5,50,95]):
+    """
+    Calculates percentiles of a variable over time across a set of scenarios (excluding the nominal scenario)
+
+    Parameters
+    ----------
+    mdlhists : dict
+        Histories of the scenarios with structure {scenname:mdlhist}
+    path : tuple
+        Path to the variable in the history, e.g. ('flows', 'Wat_1', 'flowrate')
+    percentiles : list, optional
+        Percentiles to calculate. The default is [5,50,95].
+
+    Returns
+    -------
+    envelope : dict
+        Percentiles of the variable over time with structure {percentile: array}
+    """
+    stacked = np.array([rio.get_path(hist, path) for scen, hist in mdlhists.items() if scen!='nominal'], dtype=float)
+    return dict(zip(percentiles, np.percentile(stacked, percentiles, axis=0)))
+
+def plot_envelope(mdlhists, fxnflowvals={}, percentiles=[5,95], cols=2, returnfig=False, legend=True, timelabel="time", title="", maxpoints=2000):
+    """
+    Plots the range (band between the given percentiles) and median of the states of a model over time across
+    a set of scenarios, along with the nominal states. Used to view the response of many scenarios at once.
+
+    Parameters
+    ----------
+    mdlhists : dict
+        Histories of the scenarios with structure {scenname:mdlhist} (including 'nominal')
+    fxnflowvals : dict, optional
+        dict of values to plot with structure {fxnflow:[vals]}. The default is {}, which returns all.
+    percentiles : list, optional
+        Lower and upper percentiles of the band. The default is [5,95].
+    cols : int, optional
+        columns to use in the figure. The default is 2.
+    returnfig : bool, optional
+        Whether to return the figure. The default is False.
+    legend : bool, optional
+        Whether the plot should have a legend. The default is True.
+    timelabel : str, optional
+        Label for the time axis. The default is "time".
+    title : str, optional
+        Title for the figure. The default is "".
+    maxpoints : int, optional
+        Maximum number of points to plot for each variable (bands are reduced to the minimum/maximum in 
+        maxpoints intervals, see decimate). The default is 2000.
+    """
+    nomhist = mdlhists['nominal']
+    times = np.asarray(nomhist['time'])
+    paths = [path for path in rio.hist_paths(nomhist) if len(path)==3 and path[2]!='faults'
+             and (not fxnflowvals or path[2] in fxnflowvals.get(path[1], []))
+             and np.asarray(rio.get_path(nomhist, path)).dtype.kind in 'biuf']
+    num_plots = len(paths)+int(legend)
+    fig = plt.figure(figsize=(cols*3, 2*num_plots/cols))
+    for n, path in enumerate(paths):
+        plt.subplot(int(np.ceil(num_plots/cols)),cols,n+1, label='_'.join(path[1:]))
+        envelope = calc_envelope(mdlhists, path, [percentiles[0], 50, percentiles[-1]])
+        low, med, high = envelope[percentiles[0]], envelope[50], envelope[percentiles[-1]]
+        if maxpoints and len(times)>maxpoints:
+            lowbuckets, starts = bucket_vals(low, maxpoints)
+            highbuckets, _ = bucket_vals(high, maxpoints)
+            a = plt.fill_between(times[starts], lowbuckets.min(axis=1), highbuckets.max(axis=1), step='post', color='r', alpha=0.3)
+        else: a = plt.fill_between(times, low, high, color='r', alpha=0.3)
+        b, = plt.plot(*decimate(times, med, maxpoints), color='r')
+        c, = plt.plot(*decimate(times, rio.get_path(nomhist, path), maxpoints), ls='--', color='b')
+        plt.title(path[1]+": "+path[2])
+        plt.xlabel(timelabel)
+    if legend:
+        ax_l = plt.subplot(int(np.ceil(num_plots/cols)),cols,num_plots, label='legend')
+        plt.legend([a,b,c],[str(percentiles[0])+'-'+str(percentiles[-1])+' percentile', 'median', 'nominal'], loc='center')
+        plt.box(on=None)
+        ax_l.get_xaxis().set_visible(False)
+        ax_l.get_yaxis().set_visible(False)
+    if title: fig.suptitle(title)
+    plt.tight_layout(pad=1)
+    if returnfig: return fig
+    else: plt.show()
+
 def plot_ghist(ghist,faultscen=[]):
     """
     Displays plots of the graph over time given a dict history of graph objects
@@ -819,7 +1389,7 @@ def show_graph(g, faultscen=[], time=[], showfaultlabels=True, heatmap={}):
         flows=list(g.get_edge_data(edge[0],edge[1]).keys())
         edgeflows[edge[0],edge[1]]=''.join(flow for flow in flows)
     if heatmap:
-        pos=nx.shell_layout(g)
+        pos=find_layout(g, 'normal')
         colors=[]
         for node in g.nodes():
             colors = colors +[heatmap.get(node,0.0)]
@@ -830,7 +1400,7 @@ def show_graph(g, faultscen=[], time=[], showfaultlabels=True, heatmap={}):
         labels={node:node for node in g.nodes} 
         nx.draw_networkx_labels(g, pos, labels=labels, font_weight='bold')
     elif not list(g.nodes(data='status'))[0][1]:    
-        pos=nx.shell_layout(g)
+        pos=find_layout(g, 'normal')
         nx.draw_networkx(g,pos,node_size=2000,node_shape='s', node_color='g', \
                      width=3, font_weight='bold')
         nx.draw_networkx_edge_labels(g,pos,edge_labels=edgeflows)
@@ -842,7 +1412,7 @@ def show_graph(g, faultscen=[], time=[], showfaultlabels=True, heatmap={}):
         faultflows = {edge:''.join([' ',''.join(flow+' ' for flow in g.edges[edge] if g.edges[edge][flow]['status']=='Degraded')]) for edge in faultedges}
         faults=dict(g.nodes(data='modes', default={'nom'}))
         faultlabels = {node:fault for node,fault in faults.items() if fault!={'nom'}}
-        plot_normgraph(g, edgeflows, faultnodes, degradednodes, faultflows, faultlabels, faultedges, faultflows, faultscen, time, showfaultlabels, edgeflows, scale=1, pos=[])
+        plot_normgraph(g, edgeflows, faultnodes, degradednodes, faultflows, faultlabels, faultedges, faultflows, faultscen, time, showfaultlabels, edgeflows, scale=1, pos=find_layout(g, 'normal'))
 #same for bipartite graph     
 def show_bipartite(g, scale=1, faultscen=[], time=[], showfaultlabels=True, heatmap={}, pos=[]):
     """
@@ -867,7 +1437,7 @@ def show_bipartite(g, scale=1, faultscen=[], time=[], showfaultlabels=True, heat
     """
     labels={node:node for node in g.nodes}
     plt.figure()
-    if not pos: pos=nx.spring_layout(g)
+    if not pos: pos=find_layout(g, 'bipartite')
     if heatmap:
         nodesize=scale*700
         fontsize=scale*6
@@ -876,7 +1446,7 @@ def show_bipartite(g, scale=1, faultscen=[], time=[], showfaultlabels=True, heat
         for node in labels.keys():
             colors = colors + [heatmap.get(node, 0.0)]
         nx.draw(g, pos, node_color=colors, cmap=plt.cm.coolwarm, alpha=0.6, node_size=nodesize)
-        nx.draw_networkx_labels(g, pos, labels=labels,font_size=fontsize, node_size=nodesize, font_weight='bold')
+        nx.draw_networkx_labels(g, pos, labels=labels,font_size=fontsize, font_weight='bold')
         if faultscen:
             plt.title('Propagation of faults to '+faultscen+' at t='+str(time))
         plt.show()
@@ -893,7 +1463,7 @@ def show_bipartite(g, scale=1, faultscen=[], time=[], showfaultlabels=True, heat
         degradednodes=[node for node,status in statuses.items() if status=='Degraded']
         faults=dict(g.nodes(data='modes', default={'nom'}))
         faultlabels = {node:fault for node,fault in faults.items() if fault!={'nom'}}
-        plot_bipgraph(g, labels, faultnodes, degradednodes, faultlabels,faultscen, time, showfaultlabels=True, scale=scale)
+        plot_bipgraph(g, labels, faultnodes, degradednodes, faultlabels,faultscen, time, showfaultlabels=True, scale=scale, pos=pos)
 
 def plot_resultsgraph_from(mdl, reshist, time, faultscen=[], gtype='bipartite', showfaultlabels=True, scale=1, pos=[], retfig=False):
     """
@@ -930,7 +1500,7 @@ def plot_resultsgraph_from(mdl, reshist, time, faultscen=[], gtype='bipartite',
     elif gtype=='normal':
         g = mdl.graph.copy()
         labels, faultfxns, degfxns, degflows, faultlabels, faultedges, faultedgeflows, edgeflows = get_plotlabels(g, reshist, t_ind)
-        fig_axis= plot_normgraph(g, labels, faultfxns, degfxns, degflows, faultlabels, faultedges, faultedgeflows, faultscen, time, showfaultlabels, edgeflows, scale, retfig=retfig)
+        fig_axis= plot_normgraph(g, labels, faultfxns, degfxns, degflows, faultlabels, faultedges, faultedgeflows, faultscen, time, showfaultlabels, edgeflows, scale, pos=pos, retfig=retfig)
     if retfig: return fig_axis
 
 def plot_resultsgraphs_from(mdl, reshist, times, faultscen=[], gtype='bipartite', showfaultlabels=True, scale=1, pos=[]):
@@ -956,18 +1526,15 @@ def plot_resultsgraphs_from(mdl, reshist, times, faultscen=[], gtype='bipartite'
     pos : dict, optional
         dict of node positions (if re-using positions). The default is [].
     """
-    if times=='all':
-        t_inds= [i for i in range(0,len(reshist['time']))]
-    else:
-        t_inds= [ np.where(reshist['time']==time)[0][0] for time in times]
+    t_inds = find_tinds(reshist, times)
     if gtype=='bipartite':
         g = mdl.bipartite.copy()
-        pos=nx.spring_layout(g)
+        if not pos: pos=find_layout(g, gtype)
         for t_ind in t_inds:
             update_bipplot(t_ind, reshist, g, pos, faultscen=faultscen, showfaultlabels=showfaultlabels, scale=scale)
     elif gtype=='normal':
         g = mdl.graph.copy()
-        pos=nx.shell_layout(g)
+        if not pos: pos=find_layout(g, gtype)
         for t_ind in t_inds:
             update_graphplot(t_ind, reshist, g, pos, faultscen=faultscen, showfaultlabels=showfaultlabels, scale=scale)
 
@@ -998,23 +1565,182 @@ def animate_resultsgraphs_from(mdl, reshist, times, faultscen=[], gtype='biparti
     pos : dict, optional
         dict of node positions (if re-using positions). The default is [].
     """
-    if times=='all':
-        t_inds= [i for i in range(0,len(reshist['time']))]
-    else:
-        t_inds= [ np.where(reshist['time']==time)[0][0] for time in times]
-    if gtype=='bipartite':
-        g = mdl.bipartite.copy()
-        if not pos: pos=nx.spring_layout(g)
-        fig, ax = plt.subplots(figsize=(6,4))
-        ani = matplotlib.animation.FuncAnimation(fig, update_bipplot, frames=t_inds, fargs=(reshist, g, pos, faultscen, showfaultlabels, scale, False))
-        if show: plt.show()
-    elif gtype=='normal':
-        g = mdl.graph.copy()
-        if not pos: pos=nx.shell_layout(g)
-        fig, ax = plt.subplots(figsize=(6,4))
-        ani = matplotlib.animation.FuncAnimation(fig, update_graphplot, frames=t_inds, fargs=(reshist, g, pos, faultscen, showfaultlabels, scale, False))
-        if show: plt.show()
+    t_inds = find_tinds(reshist, times)
+    graphplot = GraphPlot(mdl, reshist, gtype=gtype, faultscen=faultscen, showfaultlabels=showfaultlabels, scale=scale, pos=pos)
+    ani = animation.FuncAnimation(graphplot.fig, graphplot.update, frames=t_inds, blit=False)
+    if show: plt.show()
     return ani
+def save_resultsgraphs_from(mdl, reshist, times, filename='frame{:04d}.png', faultscen=[], gtype='bipartite', showfaultlabels=True, scale=1, pos=[], workers=1, dpi=100):
+    """
+    Renders the model graph at the given times in the results history to image files (e.g. to make a video of a 
+    long history), optionally in parallel worker processes.
+
+    Parameters
+    ----------
+    mdl : model
+        The model the faults were run in.
+    reshist : dict
+        A dictionary of results (from compare_hists())
+    times : list or 'all'
+        The times in the history to plot the graph at. If 'all', plots them all
+    filename : str, optional
+        Format string for the name of each file, formatted with the frame number. The default is 'frame{:04d}.png'.
+    faultscen : str, optional
+        Name of the fault scenario. The default is [].
+    gtype : str, optional
+        The type of graph to plot (normal or bipartite). The default is 'bipartite'.
+    showfaultlabels : bool, optional
+        Whether or not to list faults on the plot. The default is True.
+    scale : float, optional
+        Scale factor for the node/label sizes. The default is 1.
+    pos : dict, optional
+        dict of node positions (if re-using positions). The default is [].
+    workers : int, optional
+        Number of worker processes to render frames in. The default is 1 (renders in this process).
+    dpi : float, optional
+        Resolution of the saved images. The default is 100.
+
+    Returns
+    -------
+    filenames : list
+        Names of the files saved (in the order of times)
+    """
+    t_inds = find_tinds(reshist, times)
+    g = mdl.bipartite if gtype=='bipartite' else mdl.graph
+    if not pos: pos=find_layout(g, gtype)
+    frames = [(i, t_ind, filename.format(i)) for i, t_ind in enumerate(t_inds)]
+    g_plot = nx.Graph() # graph without model objects to send to workers
+    g_plot.add_nodes_from(g.nodes)
+    g_plot.add_edges_from((edge[0], edge[1], {flow:{} for flow in g.edges[edge]} if gtype=='normal' else {}) for edge in g.edges)
+    args = (g_plot, reshist, gtype, faultscen, showfaultlabels, scale, pos, dpi)
+    if workers>1 and len(frames)>1:
+        import multiprocessing
+        chunks = [frames[i::workers] for i in range(workers) if frames[i::workers]]
+        with multiprocessing.Pool(len(chunks)) as pool:
+            pool.starmap(save_graphframes, [(chunk,)+args for chunk in chunks])
+    else: save_graphframes(frames, *args)
+    return [frame[2] for frame in frames]
+def save_graphframes(frames, g, reshist, gtype, faultscen, showfaultlabels, scale, pos, dpi):
+    """Saves graph plots at the given frames [(frame, t_ind, filename)]. Used (in worker processes) in save_resultsgraphs_from"""
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(6,4))
+    graphplot = GraphPlot(g, reshist, gtype=gtype, faultscen=faultscen, showfaultlabels=showfaultlabels, scale=scale, pos=pos, ax=fig.subplots())
+    for _, t_ind, filename in frames:
+        graphplot.update(t_ind)
+        fig.savefig(filename, dpi=dpi)
+def find_tinds(reshist, times):
+    """Returns the indices of the given times (or 'all') in the history reshist"""
+    if times=='all':    return [i for i in range(0,len(reshist['time']))]
+    else:               return [np.where(reshist['time']==time)[0][0] for time in times]
+
+layouts = {} # layouts of graphs (by topology and layout type)
+def find_layout(g, gtype='bipartite'):
+    """
+    Returns the node positions to plot the graph g at (shell layout for normal graphs and spring layout for bipartite 
+    graphs). Layouts are cached by graph topology, so they are only computed once (and consistent between plots) 
+    for each model graph. Use clear_layouts() to re-compute.
+    """
+    key = (gtype, tuple(g.nodes), tuple(g.edges))
+    if key not in layouts:
+        if gtype=='normal': layouts[key] = nx.shell_layout(g)
+        else:               layouts[key] = nx.spring_layout(g)
+    return layouts[key]
+def clear_layouts():
+    """Clears the cache of graph layouts used by find_layout"""
+    layouts.clear()
+
+class GraphPlot():
+    """
+    Plot of the model graph over the times in a results history. The graph (nodes, edges, and labels) is drawn once
+    and the plot is updated at each time by changing the colors and labels of the existing artists, so frames of
+    animations (see animate_resultsgraphs_from and save_resultsgraphs_from) are quick to render.
+    
+    Colors are the same as in plot_bipgraph and plot_normgraph (green: nominal, yellow: degraded, red: faulty)
+    
+    Attributes
+    ----------
+    fig : matplotlib figure
+        figure of the plot
+    ax : matplotlib axis
+        axis of the plot
+    nodecolors : np.array
+        colors of each node at each time in the history, with shape (times, nodes)
+    edgecolors : np.array
+        colors of each edge at each time in the history (normal graph), with shape (times, edges)
+    """
+    def __init__(self, mdl, reshist, gtype='bipartite', faultscen=[], showfaultlabels=True, scale=1, pos=[], ax=None):
+        """
+        Parameters
+        ----------
+        mdl : model or networkx graph
+            The model the faults were run in (or its graph).
+        reshist : dict
+            A dictionary of results (from compare_hists())
+        gtype : str, optional
+            The type of graph to plot (normal or bipartite). The default is 'bipartite'.
+        faultscen : str, optional
+            Name of the fault scenario (for the title). The default is [].
+        showfaultlabels : bool, optional
+            Whether or not to list faults on the plot. The default is True.
+        scale : float, optional
+            Scale factor for the node/label sizes (for bipartite graphs). The default is 1.
+        pos : dict, optional
+            dict of node positions (if re-using positions). The default is [] (uses find_layout).
+        ax : matplotlib axis, optional
+            Axis to plot on. The default is None (creates a new figure).
+        """
+        g = mdl_graph(mdl, gtype)
+        self.g, self.reshist, self.gtype = g, reshist, gtype
+        self.faultscen, self.showfaultlabels = faultscen, showfaultlabels
+        if not pos: pos=find_layout(g, gtype)
+        if ax is None: _, ax = plt.subplots(figsize=(6,4))
+        self.fig, self.ax = ax.figure, ax
+        self.nodes, self.edges = list(g.nodes), list(g.edges)
+        if gtype=='normal': nodesize, fontsize, shape, width = 2000, 12, 's', 3
+        else:               nodesize, fontsize, shape, width = scale*700, scale*6, 'o', 1
+        self.nodeartist = nx.draw_networkx_nodes(g, pos, nodelist=self.nodes, node_color='g', node_shape=shape, node_size=nodesize, ax=ax)
+        self.edgeartist = nx.draw_networkx_edges(g, pos, edgelist=self.edges, width=width, ax=ax)
+        if gtype=='normal':
+            nx.draw_networkx_labels(g, pos, labels={node:node for node in self.nodes}, font_weight='bold', ax=ax)
+            nx.draw_networkx_edge_labels(g, pos, edge_labels={edge:''.join(g.edges[edge]) for edge in self.edges}, ax=ax)
+            self.edgelabels = nx.draw_networkx_edge_labels(g, pos, edge_labels={edge:'' for edge in self.edges}, font_color='r', ax=ax)
+        else:
+            nx.draw_networkx_labels(g, pos, labels={node:node for node in self.nodes}, font_size=fontsize, font_weight='bold', ax=ax)
+            self.edgelabels = {}
+            ax.set_axis_off()
+        fxns = [node for node in self.nodes if node in reshist['functions']]
+        self.faultlabels = nx.draw_networkx_labels(g, pos, labels={fxn:'' for fxn in fxns}, font_size=fontsize, font_color='k', ax=ax) if showfaultlabels else {}
+        self.nodecolors, self.edgecolors = self.find_colors()
+    def find_colors(self):
+        """Returns arrays of the colors of each node/edge at each time in the results history (see make_graphstatus)"""
+        graphstatus = make_graphstatus(self.g, self.reshist, self.gtype)
+        nodecolors = np.array(['g', 'y', 'r'], dtype=object)[graphstatus['nodestatus']]
+        if self.gtype=='normal':    edgecolors = np.array(['k', 'r'], dtype=object)[graphstatus['edgestatus']]
+        else:                       edgecolors = np.full(graphstatus['edgestatus'].shape, 'k', dtype=object)
+        return nodecolors, edgecolors
+    def update(self, t_ind):
+        """
+        Updates the plot to show the results at the time index t_ind
+
+        Returns
+        -------
+        artists : list
+            The matplotlib artists updated
+        """
+        reshist = self.reshist
+        self.nodeartist.set_facecolor(self.nodecolors[t_ind])
+        if self.gtype=='normal':
+            self.edgeartist.set_color(self.edgecolors[t_ind])
+            for edge, label in self.edgelabels.items():
+                degflows = [flow for flow in self.g.edges[edge] if reshist['flows'][flow][t_ind]==0]
+                label.set_text(''.join([' ',''.join(flow+' ' for flow in degflows)]) if degflows else '')
+        for fxn, label in self.faultlabels.items():
+            if reshist['functions'][fxn]['numfaults'][t_ind]:
+                faults = set(reshist['functions'][fxn]['faults'][t_ind]).difference(['nom'])
+                label.set_text(''.join(['\n\n ',''.join(f+' ' for f in faults)]))
+            else: label.set_text('')
+        if self.faultscen: self.ax.set_title('Propagation of faults to '+self.faultscen+' at t='+str(reshist['time'][t_ind]))
+        return [self.nodeartist, self.edgeartist, self.ax.title]+list(self.edgelabels.values())+list(self.faultlabels.values())
 def update_bipplot(t_ind, reshist, g, pos, faultscen=[], showfaultlabels=True, scale=1, show=True):
     """Updates a bipartite graph plot at a given timestep t_ind given the result history reshist"""
     time = reshist['time'][t_ind]
@@ -1029,14 +1755,14 @@ def update_graphplot(t_ind, reshist, g, pos, faultscen=[], showfaultlabels=True,
 
 def plot_normgraph(g, labels, faultfxns, degfxns, degflows, faultlabels, faultedges, faultedgeflows, faultscen, time, showfaultlabels, edgeflows, scale=1, pos=[], show=True, retfig=False):
     """ Plots a standard graph. Used in other functions"""
-    if not pos: pos=nx.shell_layout(g)
+    if not pos: pos=find_layout(g, 'normal')
     nx.draw_networkx(g,pos,node_size=2000,node_shape='s', node_color='g', \
                      width=3, font_weight='bold')
     nx.draw_networkx_edge_labels(g,pos,edge_labels=edgeflows)
     nx.draw_networkx_nodes(g, pos, nodelist=degfxns, node_color = 'y',\
-                          node_shape='s',width=3, font_weight='bold', node_size = 2000)
+                          node_shape='s', node_size = 2000)
     nx.draw_networkx_nodes(g, pos, nodelist=faultfxns,node_color = 'r',\
-                          node_shape='s',width=3, font_weight='bold', node_size = 2000)
+                          node_shape='s', node_size = 2000)
     nx.draw_networkx_edges(g,pos,edgelist=faultedges, edge_color='r', width=2)
         
     if showfaultlabels:
@@ -1053,11 +1779,11 @@ def plot_bipgraph(g, labels, faultfxns, degnodes, faultlabels, faultscen=[], tim
     """ Plots a bipartite graph. Used in other functions"""
     nodesize=scale*700
     fontsize=scale*6
-    if not pos: pos=nx.spring_layout(g)
+    if not pos: pos=find_layout(g, 'bipartite')
     
     nx.draw(g, pos, labels=labels,font_size=fontsize, node_size=nodesize, node_color = 'g', font_weight='bold')
-    nx.draw_networkx_nodes(g, pos, nodelist=degnodes,node_color = 'y', node_size=nodesize, font_weight='bold')
-    nx.draw_networkx_nodes(g, pos, nodelist=faultfxns,node_color = 'r', node_size=nodesize, font_weight='bold')
+    nx.draw_networkx_nodes(g, pos, nodelist=degnodes,node_color = 'y', node_size=nodesize)
+    nx.draw_networkx_nodes(g, pos, nodelist=faultfxns,node_color = 'r', node_size=nodesize)
     if showfaultlabels:
         faultlabels_form = {node:''.join(['\n\n ',''.join(f+' ' for f in fault if f!='nom')]) for node,fault in faultlabels.items() if fault!={'nom'}}
         nx.draw_networkx_labels(g, pos, labels=faultlabels_form, font_size=fontsize, font_color='k')
@@ -76,7 +76,7 @@ class Battery(Component):
 
 class DistEE(FxnBlock):
     def __init__(self,flows):
-        super().__init__(['EEin','EEmot','EEctl','FS'],flows, {'EEtr':1.0, 'EEte':1.0}, timely=False)
+        super().__init__(['EEin','EEmot','EEctl','FS'],flows, {'EEtr':1.0, 'EEte':1.0}, timely=False, memo=1000)
         self.failrate=1e-5
         self.assoc_modes({'short':[0.3,[0.2, 0.2,0.2,0.2,0.2],3000], 'degr':[0.5,[0.2, 0.2,0.2,0.2,0.2],1000],\
                           'break':[0.2,[0.2, 0.2,0.2,0.2,0.2],2000]})
@@ -97,7 +97,7 @@ class DistEE(FxnBlock):
 
 class EngageLand(FxnBlock):
     def __init__(self,flows):
-        super().__init__(['forcein', 'forceout'],flows, {'Ft':1.0}, timely=False)
+        super().__init__(['forcein', 'forceout'],flows, {'Ft':1.0}, timely=False, memo=1000)
         self.failrate=1e-5
         self.assoc_modes({'break':[0.2,[0.5,0.0,0.0,0.0,0.5], 1000], 'deform':[0.8,[0.5,0.0,0.0,0.0,0.5], 1000]})
     def condfaults(self, time):
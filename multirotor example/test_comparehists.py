@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Regression test of the vectorized comparison of histories (resultproc.compare_hists), which should give the same
+results histories and summaries as comparing each scenario separately with compare_hist. The multirotor model has
+states which are ints in the nominal history and floats in some faulty histories (e.g. Dir1 z), which must not be
+cast to the nominal type when compared.
+"""
+import sys
+sys.path.append('../')
+
+import numpy as np
+import fmdtools.faultprop as fp
+import fmdtools.resultproc as rp
+from quad_mdl import *
+
+def same_reshist(reshist, ref):
+    """ Checks that two results histories have the same statuses and stats"""
+    same = all([np.array_equal(reshist['flows'][flow], ref['flows'][flow]) for flow in ref['flows']])
+    same = same and all([np.array_equal(reshist['flowvals'][flow][att], ref['flowvals'][flow][att]) for flow in ref['flowvals'] for att in ref['flowvals'][flow]])
+    same = same and all([np.array_equal(reshist['functions'][fxn][state], ref['functions'][fxn][state]) for fxn in ref['functions'] for state in ref['functions'][fxn] if state!='faults'])
+    return same and all([np.array_equal(reshist['stats'][stat], ref['stats'][stat]) for stat in ref['stats']])
+
+def test_compare_hists():
+    mdl = Quadrotor()
+    app = SampleApproach(mdl)
+    endclasses, mdlhists = fp.run_approach(mdl, app)
+    reshists, diffs, summaries = rp.compare_hists(mdlhists, returndiff=False)
+    for scen, hist in mdlhists.items():
+        if scen=='nominal': continue
+        ref_reshist, ref_diff, ref_summary = rp.compare_hist(hist, nomhist=mdlhists['nominal'], returndiff=False)
+        assert summaries[scen]==ref_summary, scen
+        assert same_reshist(reshists[scen], ref_reshist), scen
+    assert 'Dir1' in summaries['ManageHealth falsemaintenance, t=4']['degraded flows']
+    assert rp.summarize_hists(mdlhists)==summaries
+
+if __name__ == '__main__':
+    test_compare_hists()
+    print('compare_hists matches compare_hist')
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Regression tests of the faster ways of running a sample approach (localized execution, deduplication of scenarios,
+and the memo caches of DistEE and EngageLand) on the multirotor model, which should give the same endclasses and
+histories as running each scenario from the start in the full model without caches. Functions in this model interact within a time-step and have states which take float values in
+faulty scenarios, so differences in update order or history types show up here.
+"""
+import sys
+sys.path.append('../')
+
+import fmdtools.faultprop as fp
+import fmdtools.resultio as rio
+import fmdtools.modeldef as md
+from quad_mdl import *
+
+def diff_scens(results, ref):
+    """ Returns the scenarios with different endclasses or histories in two runs of an approach"""
+    endclasses, mdlhists = results
+    ref_endclasses, ref_mdlhists = ref
+    return [scen for scen in ref_mdlhists if scen not in mdlhists or not rio.same_hist(mdlhists[scen], ref_mdlhists[scen])
+            or (scen!='nominal' and endclasses[scen]!=ref_endclasses[scen])]
+def run_nomemo(app, **kwargs):
+    """ Runs the approach with the memo caches of the functions turned off"""
+    get_memo = md.get_memo
+    md.get_memo = lambda *args: None
+    try:        return fp.run_approach(Quadrotor(), app, **kwargs)
+    finally:    md.get_memo = get_memo
+
+app = SampleApproach(Quadrotor())
+ref = run_nomemo(app)
+
+def test_memo():
+    md.clear_memos()
+    assert not diff_scens(fp.run_approach(Quadrotor(), app), ref)
+    assert not diff_scens(fp.run_approach(Quadrotor(), app), ref) # (with the memos of the previous run)
+
+def test_localize():
+    assert not diff_scens(fp.run_approach(Quadrotor(), app, localize=True), ref)
+
+def test_dedup():
+    assert not diff_scens(fp.run_approach(Quadrotor(), app, dedup=True), ref)
+    assert not diff_scens(run_nomemo(app, localize=True, dedup=True), ref)
+
+if __name__ == '__main__':
+    test_memo()
+    test_localize()
+    test_dedup()
+    print('fast paths match')
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of budgeted execution of an approach (faultprop.run_approach_budgeted), which should bound the total expected
+cost of the approach at any budget, and give the same results as run_approach when the budget covers every scenario.
+"""
+import sys
+sys.path.append('../')
+
+import numpy as np
+import fmdtools.faultprop as fp
+from ex_pump import * #required to import entire module
+
+mdl = Pump()
+app = SampleApproach(mdl)
+endclasses, mdlhists = fp.run_approach(mdl, app)
+total = sum([endclass['expected cost'] for endclass in endclasses.values()])
+costbound = 1.01*max([endclass['expected cost']/endclass['rate'] for endclass in endclasses.values()])
+
+def test_bounds():
+    for maxscens in [0, 3, 10, len(app.scenlist)]:
+        budget_endclasses, budget_hists, bounds = fp.run_approach_budgeted(mdl, app, maxscens=maxscens, costbounds=costbound)
+        assert len(budget_endclasses)==maxscens
+        assert all([budget_endclasses[scen]==endclasses[scen] for scen in budget_endclasses])
+        assert bounds['total'][0] <= total <= bounds['total'][1]
+    assert bounds['unexplored']==(0.0, 0.0) and np.isclose(bounds['explored'], total)
+
+def test_unbounded():
+    budget_endclasses, budget_hists, bounds = fp.run_approach_budgeted(mdl, app, maxscens=3)
+    assert bounds['total'][0] <= total and np.isinf(bounds['total'][1])
+
+def test_prevresults():
+    prev = {scen: endclasses[scen] for scen in list(endclasses)[:5]}
+    budget_endclasses, budget_hists, bounds = fp.run_approach_budgeted(mdl, app, maxscens=2, costbounds=costbound, prevresults=(prev, mdlhists))
+    assert bounds['run']==7 and bounds['total'][0] <= total <= bounds['total'][1]
+
+if __name__ == '__main__':
+    test_bounds()
+    test_unbounded()
+    test_prevresults()
+    print('budgeted runs bound the total expected cost')
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the command-line batch runner (python -m fmdtools), which should give the same results as run_approach,
+reuse cached chunks when re-run with the same options, and re-run chunks when the approach is changed.
+"""
+import sys
+sys.path.append('../')
+
+import os
+import tempfile
+import numpy as np
+import fmdtools.faultprop as fp
+from fmdtools.__main__ import main
+from ex_pump import * #required to import entire module
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+def run_cli(cache, approach='{}'):
+    """ Runs the pump through the command line interface with the given cache directory and approach"""
+    return main(['ex_pump:Pump', '--path', path, '--cache', cache, '--approach', approach, '--chunksize', '5', '--quiet'])
+def cache_files(cache):
+    """ Returns the modification times of the cached chunks"""
+    return {filename: os.path.getmtime(os.path.join(cache, filename)) for filename in os.listdir(cache)}
+
+def test_cache():
+    mdl = Pump()
+    ref_endclasses, ref_mdlhists = fp.run_approach(mdl, SampleApproach(mdl))
+    with tempfile.TemporaryDirectory() as cache:
+        endclasses, mdlhists = run_cli(cache)
+        assert endclasses==ref_endclasses
+        files = cache_files(cache)
+        assert len(files)==-(-len(endclasses)//5)
+        cached_endclasses, cached_mdlhists = run_cli(cache) # (from the cache)
+        assert cache_files(cache)==files
+        assert cached_endclasses==endclasses
+
+def test_approach_change():
+    mdl = Pump()
+    with tempfile.TemporaryDirectory() as cache:
+        endclasses, mdlhists = run_cli(cache, '{"jointfaults":{"faults":2, "pcond":0.1}}')
+        files = cache_files(cache)
+        new_endclasses, new_mdlhists = run_cli(cache, '{"jointfaults":{"faults":2, "pcond":0.5}}')
+        assert len(cache_files(cache))==2*len(files)
+        ref_endclasses, ref_mdlhists = fp.run_approach(mdl, SampleApproach(mdl, jointfaults={'faults':2, 'pcond':0.5}))
+        assert new_endclasses==ref_endclasses
+        assert any([not np.isclose(new_endclasses[scen]['rate'], endclasses[scen]['rate']) for scen in endclasses])
+
+if __name__ == '__main__':
+    test_cache()
+    test_approach_change()
+    print('command line runs match')
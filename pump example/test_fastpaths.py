@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Regression tests of the faster ways of running a sample approach (staged execution with a session, localized
+execution, deduplication of scenarios, online aggregators), which should give the same endclasses and histories (or
+aggregate results) as running each scenario from the start in the full model.
+"""
+import sys
+sys.path.append('../')
+
+import numpy as np
+import pandas as pd
+import fmdtools.faultprop as fp
+import fmdtools.resultproc as rp
+import fmdtools.resultio as rio
+import fmdtools.aggregators as ag
+from fmdtools.modelgen import make_model
+from ex_pump import * #required to import entire module
+
+def same_results(results, ref):
+    """ Checks that the endclasses and histories of two runs of an approach are the same"""
+    endclasses, mdlhists = results
+    ref_endclasses, ref_mdlhists = ref
+    return endclasses==ref_endclasses and mdlhists.keys()==ref_mdlhists.keys() and all([rio.same_hist(mdlhists[scen], hist) for scen, hist in ref_mdlhists.items()])
+def close(dict1, dict2):
+    """ Checks that two dicts of values are the same (up to floating point error)"""
+    return dict1.keys()==dict2.keys() and all([np.isclose(dict1[key], dict2[key]) for key in dict2])
+
+def test_staged():
+    mdl = Pump()
+    app = SampleApproach(mdl, defaultsamp={'samp':'fullint'})
+    ref = fp.run_approach(mdl, app)
+    assert same_results(fp.run_approach(mdl, app, staged=True), ref)
+    session = fp.Session()
+    assert same_results(fp.run_approach(mdl, app, staged=True, session=session), ref)
+    assert same_results(fp.run_approach(mdl, app, staged=True, session=session), ref) # (from the session cache)
+    assert session.hits
+
+def test_staged_states():
+    # staged copies should carry over the (timely) states and timers built up in the nominal run
+    for seed in [0, 2]:
+        mdl = make_model(seed=seed)
+        app = SampleApproach(mdl, defaultsamp={'samp':'evenspacing','numpts':3})
+        assert same_results(fp.run_approach(mdl, app, staged=True), fp.run_approach(mdl, app))
+
+def test_localize():
+    mdl = Pump()
+    app = SampleApproach(mdl, defaultsamp={'samp':'fullint'})
+    ref = fp.run_approach(mdl, app)
+    assert same_results(fp.run_approach(mdl, app, localize=True), ref)
+    assert same_results(fp.run_approach(mdl, app, localize=True, staged=True), ref)
+
+def test_dedup():
+    mdl = Pump()
+    app = SampleApproach(mdl, defaultsamp={'samp':'fullint'})
+    ref = fp.run_approach(mdl, app)
+    assert same_results(fp.run_approach(mdl, app, dedup=True), ref)
+    assert same_results(fp.run_approach(mdl, app, dedup=True, staged=True), ref)
+
+def test_aggregators():
+    mdl = Pump()
+    app = SampleApproach(mdl, defaultsamp={'samp':'fullint'})
+    endclasses, mdlhists = fp.run_approach(mdl, app)
+    reshists, diffs, summaries = rp.compare_hists(mdlhists)
+    aggregators = [ag.TotalCost(), ag.DegTime(), ag.Faults(), ag.CostOverTime(app.times), ag.Summaries()]
+    agg_endclasses, agg_mdlhists = fp.run_approach(mdl, app, aggregators=aggregators, keephists=False)
+    assert agg_endclasses==endclasses and list(agg_mdlhists)==['nominal']
+    assert close(aggregators[0].result(), rp.make_simplefmea(endclasses).sum().to_dict())
+    assert close(aggregators[1].result()['average'], rp.make_avgdegtimeheatmap(reshists))
+    assert close(aggregators[1].result()['expected'], rp.make_expdegtimeheatmap(reshists, endclasses))
+    assert close(aggregators[2].result()['average'], rp.make_faultsheatmap(reshists))
+    assert close(aggregators[2].result()['expected'], rp.make_expfaultsheatmap(reshists, endclasses))
+    pd.testing.assert_frame_equal(aggregators[3].result(), rp.find_costovertime(endclasses, app))
+    assert aggregators[4].result()==summaries
+
+if __name__ == '__main__':
+    test_staged()
+    test_staged_states()
+    test_localize()
+    test_dedup()
+    test_aggregators()
+    print('fast paths match')
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Import-time benchmark of the simulation core. Importing modeldef/faultprop (e.g. in worker processes or from the
+command line) should not import the plotting or table libraries, which are only imported by resultproc when used.
+"""
+import sys, os
+import subprocess
+sys.path.append('../')
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+heavy = ['matplotlib', 'pandas', 'scipy']
+
+def time_import(statement, reps=5):
+    """Returns the best time (over reps fresh interpreters) to run an import statement, along with the heavy modules it imported"""
+    code = ("import sys, time; t=time.perf_counter(); "+statement+"; t=time.perf_counter()-t; "
+            "print(t); print(','.join(m for m in "+repr(heavy)+" if m in sys.modules))")
+    times=[]
+    for rep in range(reps):
+        out = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True).stdout.split('\n')
+        times.append(float(out[0]))
+    return min(times), [m for m in out[1].split(',') if m]
+
+core = ['import fmdtools.modeldef', 'import fmdtools.faultprop', 'import fmdtools.modeldef, fmdtools.faultprop',
+        'import fmdtools.faultprop, fmdtools.resultproc, fmdtools.aggregators']
+maxtime = 1.0 # generous ceiling (s) on the time to import the simulation core (it takes ~0.2 s without the heavy libraries)
+
+def test_import_time():
+    for statement in core:
+        t, mods = time_import(statement)
+        assert not mods, statement+" imports "+', '.join(mods)
+        assert t < maxtime, statement+" takes {:.3f} s to import".format(t)
+
+if __name__ == '__main__':
+    for statement in core+['import fmdtools.resultproc as rp; rp.plt.figure']:
+        t, mods = time_import(statement)
+        print('{:<90} {:.3f} s  imported: {}'.format(statement, t, mods))
+    test_import_time()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the synthetic model generator (modelgen), which should give models of the requested size and topology that
+are the same for the same seed.
+"""
+import sys
+sys.path.append('../')
+
+import fmdtools.faultprop as fp
+from fmdtools.modeldef import SampleApproach
+from fmdtools.modelgen import make_model, topologies
+
+def structure(mdl):
+    """ Returns the flows, modes, and rates of each function in a model"""
+    return {fxnname: (list(fxn.flows), fxn.faultmodes, fxn.failrate, fxn.timely) for fxnname, fxn in mdl.fxns.items()}
+
+def test_seed():
+    mdl, same_mdl, other_mdl = make_model(20, 25, 'random', seed=1), make_model(20, 25, 'random', seed=1), make_model(20, 25, 'random', seed=2)
+    assert structure(mdl)==structure(same_mdl)
+    assert structure(mdl)!=structure(other_mdl)
+    endclasses, mdlhists = fp.run_approach(mdl, SampleApproach(mdl))
+    same_endclasses, same_mdlhists = fp.run_approach(same_mdl, SampleApproach(same_mdl))
+    assert endclasses==same_endclasses
+    unseeded = make_model(5)
+    assert structure(make_model(5, seed=unseeded.params['seed']))==structure(unseeded)
+
+def test_sizes():
+    for topology in topologies:
+        for numfxns, numflows, numfaults in [(8, None, 2), (12, 20, 3), (30, 45, 5)]:
+            mdl = make_model(numfxns, numflows, topology, numfaults, seed=0)
+            assert len(mdl.fxns)==numfxns
+            assert len(mdl.flows)==(numflows if numflows else {'chain':numfxns-1, 'tree':numfxns-1, 'random':numfxns, 'cycle':numfxns}[topology])
+            assert all([len(fxn.faultmodes)==numfaults for fxn in mdl.fxns.values()])
+
+def test_topologies():
+    chain, tree, cycle = make_model(10, topology='chain', seed=0), make_model(10, topology='tree', seed=0), make_model(10, topology='cycle', seed=0)
+    assert all([list(chain.fxns['fxn'+str(i)].flows)==(['in0'] if i>0 else [])+(['out0'] if i<9 else []) for i in range(10)])
+    assert all([chain.fxns['fxn'+str(i)].outflows[0] is chain.fxns['fxn'+str(i+1)].inflows[0] for i in range(9)])
+    assert all([len(tree.fxns['fxn'+str(i)].inflows)==1 for i in range(1, 10)]) and not tree.fxns['fxn0'].inflows
+    assert all([len(fxn.inflows)==1 and len(fxn.outflows)==1 for fxn in cycle.fxns.values()])
+    assert cycle.fxns['fxn9'].outflows[0] is cycle.fxns['fxn0'].inflows[0]
+    try:
+        make_model(10, topology='star')
+        assert False, "invalid topology accepted"
+    except Exception as err: assert 'Invalid topology' in str(err)
+
+if __name__ == '__main__':
+    test_seed()
+    test_sizes()
+    test_topologies()
+    print('generated models match')
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the plotting of results graphs with cached layouts and re-used artists (GraphPlot, save_resultsgraphs_from),
+which should show the same colors at each time as re-drawing the graph for each frame (update_bipplot/update_graphplot),
+and of downsampled and envelope plots of histories (decimate, calc_envelope, plot_envelope), which should keep the
+peaks of each interval and the percentiles over the scenarios.
+"""
+import sys, os
+import tempfile
+sys.path.append('../')
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgba
+from matplotlib.collections import PathCollection, LineCollection
+import numpy as np
+import fmdtools.faultprop as fp
+import fmdtools.resultproc as rp
+from ex_pump import * #required to import entire module
+
+mdl = Pump()
+app = SampleApproach(mdl)
+endclasses, mdlhists = fp.run_approach(mdl, app)
+reshists, diffs, summaries = rp.compare_hists(mdlhists)
+scens = [scen for scen in reshists if summaries[scen]['degraded flows']][:3]
+
+def drawn_colors(ax, pos, nodes, edges):
+    """ Returns the colors each node/edge is shown with in a plot (the color of the last collection drawn over it)"""
+    nodecolors, edgecolors = {}, {}
+    for collection in ax.collections:
+        if isinstance(collection, PathCollection):
+            colors = collection.get_facecolor()
+            for i, offset in enumerate(collection.get_offsets()):
+                for node in nodes:
+                    if np.allclose(offset, pos[node]): nodecolors[node] = tuple(colors[i%len(colors)])
+        elif isinstance(collection, LineCollection):
+            colors = collection.get_color()
+            for i, segment in enumerate(collection.get_segments()):
+                for edge in edges:
+                    if np.allclose(segment[[0,-1]], [pos[edge[0]], pos[edge[1]]]) or np.allclose(segment[[0,-1]], [pos[edge[1]], pos[edge[0]]]):
+                        edgecolors[edge] = tuple(colors[i%len(colors)])
+    return nodecolors, edgecolors
+
+def test_layouts():
+    rp.clear_layouts()
+    pos = rp.find_layout(mdl.bipartite, 'bipartite')
+    assert rp.find_layout(mdl.bipartite, 'bipartite') is pos and set(pos)==set(mdl.bipartite.nodes)
+    assert rp.find_layout(Pump().bipartite, 'bipartite') is pos # (same topology)
+    assert rp.find_layout(mdl.graph, 'normal') is not pos
+    rp.clear_layouts()
+    assert rp.find_layout(mdl.bipartite, 'bipartite') is not pos
+
+def test_graphplot():
+    for gtype, update in [('bipartite', rp.update_bipplot), ('normal', rp.update_graphplot)]:
+        g = mdl.bipartite if gtype=='bipartite' else mdl.graph
+        pos = rp.find_layout(g, gtype)
+        for scen in scens:
+            graphplot = rp.GraphPlot(mdl, reshists[scen], gtype=gtype, faultscen=scen)
+            for t_ind in range(0, len(reshists[scen]['time']), 5):
+                graphplot.update(t_ind)
+                nodecolors, edgecolors = drawn_colors(graphplot.ax, pos, graphplot.nodes, graphplot.edges)
+                plt.figure()
+                update(t_ind, reshists[scen], g.copy(), pos, faultscen=scen, show=False)
+                ref_nodecolors, ref_edgecolors = drawn_colors(plt.gca(), pos, graphplot.nodes, graphplot.edges)
+                plt.close()
+                assert nodecolors==ref_nodecolors
+                if gtype=='normal': assert edgecolors==ref_edgecolors
+            plt.close(graphplot.fig)
+    # colors are found for every time at once
+    graphplot = rp.GraphPlot(mdl, reshists[scens[0]], gtype='bipartite')
+    assert graphplot.nodecolors.shape==(len(reshists[scens[0]]['time']), len(graphplot.nodes))
+    graphplot.update(len(reshists[scens[0]]['time'])-1)
+    assert [tuple(color) for color in graphplot.nodeartist.get_facecolor()]==[to_rgba(color) for color in graphplot.nodecolors[-1]]
+    plt.close(graphplot.fig)
+
+def test_save_resultsgraphs():
+    scen = scens[0]
+    times = list(reshists[scen]['time'][::10])
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = rp.save_resultsgraphs_from(mdl, reshists[scen], times, filename=os.path.join(directory, 'a{:04d}.png'), faultscen=scen)
+        assert filenames==[os.path.join(directory, 'a{:04d}.png'.format(i)) for i in range(len(times))]
+        par_filenames = rp.save_resultsgraphs_from(mdl, reshists[scen], times, filename=os.path.join(directory, 'b{:04d}.png'), faultscen=scen, workers=2)
+        for filename, par_filename in zip(filenames, par_filenames):
+            assert np.array_equal(plt.imread(filename), plt.imread(par_filename))
+        assert not np.array_equal(plt.imread(filenames[0]), plt.imread(filenames[-1])) # (faults shown as they propagate)
+
+def test_decimate():
+    rng = np.random.default_rng(0)
+    times, vals = np.arange(10001), rng.normal(size=10001)
+    vals[1234] = 100.0 # (short peak)
+    dec_times, dec_vals = rp.decimate(times, vals, maxpoints=200)
+    assert len(dec_vals)<=202 and dec_times[0]==times[0] and dec_times[-1]==times[-1]
+    assert np.array_equal(dec_vals, vals[dec_times]) and 100.0 in dec_vals
+    buckets, starts = rp.bucket_vals(vals, 100)
+    for bucket, start in zip(buckets, starts):
+        kept = dec_vals[(dec_times>=start)&(dec_times<start+buckets.shape[1])]
+        assert bucket.min() in kept and bucket.max() in kept
+    assert all([np.array_equal(a, b) for a, b in zip(rp.decimate(times[:100], vals[:100], maxpoints=200), (times[:100], vals[:100]))])
+    assert np.array_equal(rp.decimate(times, np.full(10001, 'nom'), maxpoints=200)[1], np.full(10001, 'nom'))
+
+def test_bucket_vals():
+    buckets, starts = rp.bucket_vals(np.arange(10), 4)
+    assert buckets.shape==(4, 3) and list(starts)==[0, 3, 6, 9]
+    assert list(buckets[-1])==[9, 9, 9] # (padded with the last value)
+
+def test_envelope():
+    for path in [('flows', 'Wat_1', 'flowrate'), ('functions', 'MoveWater', 'eff')]:
+        stacked = np.array([mdlhists[scen][path[0]][path[1]][path[2]] for scen in mdlhists if scen!='nominal'], dtype=float)
+        envelope = rp.calc_envelope(mdlhists, path, [5, 50, 95])
+        assert all([np.allclose(envelope[perc], np.percentile(stacked, perc, axis=0)) for perc in [5, 50, 95]])
+    fig = rp.plot_envelope(mdlhists, {'Wat_1':['flowrate']}, returnfig=True)
+    median = rp.calc_envelope(mdlhists, ('flows', 'Wat_1', 'flowrate'))[50]
+    assert np.allclose(fig.axes[0].lines[0].get_ydata(), median)
+    plt.close(fig)
+    # long histories: the band spans the full range of the percentiles and the lines are decimated
+    rng = np.random.default_rng(0)
+    times = np.arange(5000)
+    longhists = {scen:{'time':times, 'flows':{'Flow':{'x':rng.normal(size=5000)}}, 'functions':{}} for scen in ['nominal', 'a', 'b', 'c']}
+    fig = rp.plot_envelope(longhists, percentiles=[5,95], returnfig=True, maxpoints=100)
+    envelope = rp.calc_envelope(longhists, ('flows', 'Flow', 'x'), [5, 95])
+    band = fig.axes[0].collections[0].get_paths()[0].vertices
+    assert np.isclose(band[:,1].min(), envelope[5].min()) and np.isclose(band[:,1].max(), envelope[95].max())
+    assert all([len(line.get_xdata())<=102 for line in fig.axes[0].lines])
+    plt.close(fig)
+
+if __name__ == '__main__':
+    test_layouts()
+    test_graphplot()
+    test_save_resultsgraphs()
+    test_decimate()
+    test_bucket_vals()
+    test_envelope()
+    print('plots match')
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the results database (resultdb.ResultsDB), which should give the same tables as the resultproc functions
+over the endclasses/histories of each run.
+"""
+import sys
+sys.path.append('../')
+
+import numpy as np
+import pandas as pd
+import fmdtools.faultprop as fp
+import fmdtools.resultproc as rp
+from fmdtools.resultdb import ResultsDB
+from ex_pump import * #required to import entire module
+
+mdl = Pump()
+app = SampleApproach(mdl)
+endclasses, mdlhists = fp.run_approach(mdl, app)
+summaries = rp.summarize_hists(mdlhists)
+
+def add_runs(db):
+    """ Adds two runs (versions) of the pump, the second with doubled costs"""
+    run1 = db.add_run(endclasses, app, summaries, model='Pump', version=1)
+    endclasses2 = {scen:{**endclass, 'cost':2*endclass['cost'], 'expected cost':2*endclass['expected cost']} for scen, endclass in endclasses.items()}
+    run2 = db.add_run(endclasses2, app, summaries, model='Pump', version=2)
+    return run1, run2
+
+def test_add_run():
+    with ResultsDB(':memory:') as db:
+        run1, run2 = add_runs(db)
+        runs = db.runs()
+        assert list(runs.index)==[run1, run2] and list(runs['scenarios'])==[len(endclasses)]*2
+        assert np.isclose(runs.loc[run1, 'expected cost'], sum([endclass['expected cost'] for endclass in endclasses.values()]))
+        table = db.endclasstable(run1)
+        ref = rp.make_endclasstable(endclasses, app)
+        pd.testing.assert_frame_equal(table[ref.columns], ref, check_dtype=False)
+
+def test_query():
+    with ResultsDB(':memory:') as db:
+        run1, run2 = add_runs(db)
+        table = db.query('run=?', (run1,))
+        assert len(table)==len(endclasses) and set(table['version'])=={'1'}
+        fxnmode = app.list_modes()[0]
+        table = db.query('fxn=? AND version=?', (fxnmode[0], '2'))
+        assert set(table.index)=={scen for scen, props in zip(endclasses, rp.make_endclasstable(endclasses, app)['fxn']) if props==fxnmode[0]}
+        assert set(table['run'])=={run2}
+
+def test_top_scenarios():
+    with ResultsDB(':memory:') as db:
+        run1, run2 = add_runs(db)
+        ref = sorted(endclasses, key=lambda scen: -endclasses[scen]['expected cost'])[:5]
+        top = db.top_scenarios(5, run=run1)
+        assert list(top.index)==ref
+        assert np.allclose(top['expected cost'], [endclasses[scen]['expected cost'] for scen in ref])
+        top = db.top_scenarios(5)
+        expcosts = sorted([endclass['expected cost']*k for endclass in endclasses.values() for k in [1,2]], reverse=True)[:5]
+        assert np.allclose(top['expected cost'], expcosts)
+        top = db.top_scenarios(5, version=2)
+        assert set(top['run'])=={run2} and list(top.index)==ref
+
+def test_fullfmea():
+    with ResultsDB(':memory:') as db:
+        run1, run2 = add_runs(db)
+        table = db.fullfmea(run1)
+        ref = rp.make_fullfmea(endclasses, summaries)
+        assert list(table.index)==list(ref.index)
+        for column in ['degraded functions', 'degraded flows']:
+            assert list(table[column])==list(ref[column])
+        for column in ['rate', 'cost', 'expected cost']:
+            assert np.allclose(table[column].values, ref[column].values.astype(float))
+
+def test_delete_run():
+    with ResultsDB(':memory:') as db:
+        run1, run2 = add_runs(db)
+        db.delete_run(run1)
+        assert list(db.runs().index)==[run2]
+        assert db.query('run=?', (run1,)).empty and len(db.endclasstable(run2))==len(endclasses)
+        assert db.fullfmea(run1).empty
+        assert db.conn.execute("SELECT COUNT(*) FROM degraded WHERE run=?", (run1,)).fetchone()[0]==0
+
+if __name__ == '__main__':
+    test_add_run()
+    test_query()
+    test_top_scenarios()
+    test_fullfmea()
+    test_delete_run()
+    print('results database matches')
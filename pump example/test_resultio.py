@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Regression tests of saving and storing results (resultio), which should give back the same histories as the
+histories run in memory.
+"""
+import sys, os
+import tempfile
+sys.path.append('../')
+
+import numpy as np
+import fmdtools.faultprop as fp
+import fmdtools.resultio as rio
+from ex_pump import * #required to import entire module
+
+def test_int_to_float():
+    nomhist = {'time':np.arange(5), 'flows':{'Flow':{'x':np.zeros(5, dtype=int)}}, 'functions':{'Fxn':{'faults':[{'nom'}]*5, 'mode':np.full(5, 'nom')}}}
+    faulthist = {'time':np.arange(5), 'flows':{'Flow':{'x':np.array([0, 0, 0.5, 1.5, 2.25])}}, 'functions':{'Fxn':{'faults':[{'nom'}]*2+[{'short'}]*3, 'mode':np.array(['nom']*2+['short']*3)}}}
+    with tempfile.TemporaryDirectory() as directory:
+        store = rio.HistStore(os.path.join(directory, 'store'), nomhist, ['faulty'])
+        store.add('faulty', faulthist)
+        store.flush()
+        assert rio.same_hist(store['faulty'], faulthist)
+        assert rio.same_hist(rio.HistStore(os.path.join(directory, 'store'))['faulty'], faulthist)
+        rio.save_results(os.path.join(directory, 'results.npz'), {'nominal':nomhist, 'faulty':faulthist})
+        with rio.Results(os.path.join(directory, 'results.npz')) as res:
+            assert rio.same_hist(res['faulty'], faulthist)
+    deltahists = rio.encode_deltas({'nominal':nomhist, 'faulty':faulthist})
+    assert rio.same_hist(deltahists['faulty'], faulthist)
+    assert rio.same_hist(rio.decode_delta(deltahists['faulty']), faulthist)
+
+def test_pump_roundtrip():
+    mdl = Pump()
+    app = SampleApproach(mdl)
+    endclasses, mdlhists = fp.run_approach(mdl, app)
+    with tempfile.TemporaryDirectory() as directory:
+        rio.save_results(os.path.join(directory, 'results.npz'), mdlhists, endclasses, app, chunksize=4)
+        with rio.Results(os.path.join(directory, 'results.npz')) as res:
+            assert res.endclasses==endclasses
+            assert all([rio.same_hist(res[scen], hist) for scen, hist in mdlhists.items()])
+        store_endclasses, store_hists = fp.run_approach(mdl, app, store=os.path.join(directory, 'store'))
+        assert store_endclasses==endclasses
+        assert all([rio.same_hist(store_hists[scen], hist) for scen, hist in mdlhists.items()])
+        store = rio.HistStore(os.path.join(directory, 'store'))
+        assert all([rio.same_hist(store[scen], hist) for scen, hist in mdlhists.items()])
+    sparse_endclasses, sparse_hists = fp.run_approach(mdl, app, sparse=True)
+    assert sparse_endclasses==endclasses
+    assert all([rio.same_hist(sparse_hists[scen], hist) for scen, hist in mdlhists.items()])
+
+def test_no_pickle():
+    nomhist = {'time':np.arange(3), 'flows':{'Flow':{'x':np.zeros(3), 'state':np.array(['off']*3, dtype=object)}}, 'functions':{'Fxn':{'faults':[{'nom'}]*3}}}
+    faulthist = {'time':np.arange(3), 'flows':{'Flow':{'x':np.ones(3), 'state':np.array(['off', 'overheated', 'off'], dtype=object)}}, 'functions':{'Fxn':{'faults':[{'nom'}, {'short'}, {'short'}]}}}
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'results.npz')
+        rio.save_results(filename, {'nominal':nomhist, 'faulty':faulthist}, {'faulty':{'rate':1e-5, 'cost':1.0, 'expected cost':1.0}})
+        with np.load(filename, allow_pickle=False) as file:
+            assert all([file[name].dtype.kind!='O' for name in file.files])
+        with rio.Results(filename) as res:
+            assert rio.same_hist(res['faulty'], faulthist) and rio.same_hist(res['nominal'], nomhist)
+        nomhist['flows']['Flow']['state'][0] = {'off'}
+        try:
+            rio.save_results(filename, {'nominal':nomhist})
+            assert False, "object values were pickled"
+        except Exception as err: assert 'plain array' in str(err)
+
+if __name__ == '__main__':
+    test_int_to_float()
+    test_pump_roundtrip()
+    test_no_pickle()
+    print('results round-trip')
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Regression tests of the vectorized/batch results processing (compare_hists, lazily or not, calc_heatmaps, FMEA
+tables, history tables, and results graph statuses), which should give the same results as processing each scenario
+separately (or building a graph at each time), and re-weighting of results for new rates (and distributions of them)
+and the merging of prior results when an approach is extended, which should give the same results as re-running the
+approach.
+"""
+import sys
+sys.path.append('../')
+
+import numpy as np
+import pandas as pd
+import fmdtools.faultprop as fp
+import fmdtools.resultproc as rp
+import fmdtools.aggregators as ag
+from ex_pump import * #required to import entire module
+
+def same_vals(vals, ref):
+    """ Checks that two (nested) dicts of values/arrays are the same (up to floating point error)"""
+    if isinstance(ref, dict):                   return vals.keys()==ref.keys() and all([same_vals(vals[key], ref[key]) for key in ref])
+    elif np.asarray(ref).dtype.kind in 'biuf':  return np.allclose(np.asarray(vals, dtype=float), np.asarray(ref, dtype=float))
+    else:                                       return list(vals)==list(ref)
+def same_endclasses(endclasses, ref):
+    """ Checks that two dicts of endclasses have the same scenarios and values (up to floating point error)"""
+    return endclasses.keys()==ref.keys() and all([np.isclose(endclasses[scen][key], ref[scen][key], rtol=1e-12) for scen in ref for key in ref[scen]])
+
+def hist_graph(mdl, hist, t_ind, gtype):
+    """ Builds the state graph of the model at a time index in a history"""
+    flowstates = {flow:{att:vals[t_ind] for att, vals in atts.items()} for flow, atts in hist['flows'].items()}
+    fxnstates = {fxn:{state:vals[t_ind] for state, vals in states.items() if state!='faults'} for fxn, states in hist['functions'].items()}
+    fxnmodes = {fxn:set(states['faults'][t_ind]) for fxn, states in hist['functions'].items()}
+    return mdl.build_stategraph(flowstates, fxnstates, fxnmodes, gtype)
+
+def test_compare_hists():
+    mdl = Pump()
+    app = SampleApproach(mdl, defaultsamp={'samp':'fullint'})
+    endclasses, mdlhists = fp.run_approach(mdl, app)
+    reshists, diffs, summaries = rp.compare_hists(mdlhists)
+    lazy_reshists, lazy_diffs, lazy_summaries = rp.compare_hists(mdlhists, lazy=True)
+    assert lazy_summaries==summaries==rp.summarize_hists(mdlhists)
+    for scen, hist in mdlhists.items():
+        if scen=='nominal': continue
+        ref_reshist, ref_diff, ref_summary = rp.compare_hist(hist, nomhist=mdlhists['nominal'])
+        assert summaries[scen]==ref_summary
+        assert same_vals(reshists[scen], ref_reshist) and same_vals(lazy_reshists[scen], ref_reshist)
+        assert same_vals(diffs[scen], ref_diff) and same_vals(lazy_diffs[scen], ref_diff)
+
+def test_heatmaps():
+    mdl = Pump()
+    app = SampleApproach(mdl, defaultsamp={'samp':'fullint'})
+    endclasses, mdlhists = fp.run_approach(mdl, app)
+    reshists, diffs, summaries = rp.compare_hists(mdlhists)
+    heatmaps = rp.calc_heatmaps(reshists, diffs)
+    for scen in reshists:
+        ref = rp.make_heatmaps(reshists[scen], diffs[scen])
+        for metric, heatmap in ref.items():
+            assert same_vals(heatmaps[metric].loc[scen].dropna().to_dict(), heatmap)
+    for metric, heatmap in rp.make_expheatmaps(reshists, endclasses, diffs).items():
+        ref = {obj: sum([rp.make_heatmaps(reshists[scen], diffs[scen])[metric][obj]*endclasses[scen]['rate'] for scen in reshists]) for obj in heatmap}
+        assert same_vals(heatmap, ref)
+
+def test_fmeas():
+    mdl = Pump()
+    for app in [SampleApproach(mdl), SampleApproach(mdl, defaultsamp={'samp':'fullint'})]:
+        endclasses, mdlhists = fp.run_approach(mdl, app)
+        phasefmea = rp.make_phasefmea(endclasses, app).to_dict('index')
+        summfmea = rp.make_summfmea(endclasses, app)
+        for (fxnmode, phase), ids in app.scenids.items():
+            weights = np.array(list(app.weights[fxnmode][phase].values()))
+            ref = {'rate': sum([endclasses[scen]['rate'] for scen in ids]), 'expected cost': sum([endclasses[scen]['expected cost'] for scen in ids]),
+                   'cost': sum(np.array([endclasses[scen]['cost'] for scen in ids])*weights)}
+            assert same_vals(phasefmea[(fxnmode, phase)], ref)
+        for fxnmode in app.list_modes():
+            phases = [modephase for modephase in app.scenids if modephase[0]==fxnmode]
+            ref = {'rate': sum([phasefmea[modephase]['rate'] for modephase in phases]), 'cost': np.mean([phasefmea[modephase]['cost'] for modephase in phases]),
+                   'expected cost': sum([phasefmea[modephase]['expected cost'] for modephase in phases])}
+            assert same_vals(summfmea.loc[fxnmode].to_dict(), ref)
+        costovertime = rp.find_costovertime(endclasses, app)
+        for time in app.times:
+            scens = [scen['properties']['name'] for scen in app.scenlist if scen['properties']['time']==time]
+            ref = {key: sum([endclasses[scen][key] for scen in scens]) for key in ['cost', 'rate', 'expected cost']}
+            assert same_vals(costovertime.loc[time].to_dict(), ref)
+
+def test_histtables():
+    mdl = Pump()
+    app = SampleApproach(mdl)
+    endclasses, mdlhists = fp.run_approach(mdl, app)
+    tables = rp.make_histtables(mdlhists)
+    for scen, hist in mdlhists.items():
+        ref = rp.make_histtable(hist).drop(columns=[('time','t')]).reset_index(drop=True)
+        pd.testing.assert_frame_equal(tables.loc[scen].reset_index(drop=True), ref)
+
+def test_reweight():
+    mdl = Pump()
+    app = SampleApproach(mdl)
+    endclasses, mdlhists = fp.run_approach(mdl, app)
+    fxnmode = app.list_modes()[2]
+    newrates = {'fxnrates':{'MoveWater':3e-5, 'ImportEE':2e-5}, 'modeparams':{fxnmode:{'dist':0.7, 'oppvect':[1,3,1]}}}
+    newmdl = Pump()
+    newmdl.fxns['MoveWater'].failrate=3e-5
+    newmdl.fxns['ImportEE'].failrate=2e-5
+    newmdl.fxns[fxnmode[0]].faultmodes[fxnmode[1]].update({'dist':0.7, 'oppvect':[1,3,1]})
+    newapp = SampleApproach(newmdl)
+    new_endclasses, new_mdlhists = fp.run_approach(newmdl, newapp)
+    assert same_endclasses(rp.reweight_endclasses(endclasses, app, **newrates), new_endclasses)
+    fmeas = rp.reweight_fmeas(endclasses, app, **newrates)
+    assert np.allclose(fmeas['phase'].values, rp.make_phasefmea(new_endclasses, newapp).values)
+    assert np.allclose(fmeas['summary'].values, rp.make_summfmea(new_endclasses, newapp).values)
+    assert np.allclose(fmeas['costovertime'].values, rp.find_costovertime(new_endclasses, newapp).values)
+
+def test_expcostdists():
+    mdl = Pump()
+    app = SampleApproach(mdl)
+    endclasses, mdlhists = fp.run_approach(mdl, app)
+    fxnmode = app.list_modes()[2]
+    newrates = {'fxnrates':{'MoveWater':3e-5, 'ImportEE':2e-5}, 'modeparams':{fxnmode:{'dist':0.7, 'oppvect':[1,3,1]}}}
+    new_endclasses = rp.reweight_endclasses(endclasses, app, **newrates)
+    # point values of the expected cost distributions are the re-weighted expected costs
+    expcostdists = rp.calc_expcostdists(endclasses, app, **newrates, numsamples=10)
+    assert np.isclose(expcostdists['total']['mean'], sum([endclass['expected cost'] for endclass in new_endclasses.values()]))
+    summfmea = rp.make_summfmea(new_endclasses, app)
+    assert np.allclose(expcostdists['modes']['mean'].loc[summfmea.index].values, summfmea['expected cost'].values)
+    # each sample of the rates gives the re-weighted expected cost at that sample
+    samples = np.array([1e-5, 3e-5, 1e-4])
+    expcostdists = rp.calc_expcostdists(endclasses, app, fxnrates={'MoveWater':samples}, numsamples=3)
+    for sample, total in zip(samples, expcostdists['samples']):
+        reweighted = rp.reweight_endclasses(endclasses, app, fxnrates={'MoveWater':sample})
+        assert np.isclose(total, sum([endclass['expected cost'] for endclass in reweighted.values()]))
+    # modes with zero prior rate scenarios are excluded (not counted as having no cost)
+    scen = app.scenids[(fxnmode, list(app.phases)[0])][0]
+    zero_endclasses = {**endclasses, scen:{**endclasses[scen], 'rate':0.0, 'expected cost':0.0}}
+    expcostdists = rp.calc_expcostdists(zero_endclasses, app, numsamples=10)
+    assert expcostdists['excluded']==[fxnmode] and fxnmode not in expcostdists['modes'].index
+    included = [scen for (mode, phase), ids in app.scenids.items() if mode!=fxnmode for scen in ids]
+    assert np.isclose(expcostdists['total']['mean'], sum([endclasses[scen]['expected cost'] for scen in included]))
+
+def test_merge():
+    mdl = Pump()
+    modes = SampleApproach(mdl).list_modes()
+    app = SampleApproach(mdl, faults=modes[:4])
+    results = fp.run_approach(mdl, app)
+    app.add_modes(mdl, modes[4:])
+    counter = ag.TotalCost()
+    endclasses, mdlhists = fp.run_approach(mdl, app, prevresults=results, aggregators=[counter])
+    ref_endclasses, ref_mdlhists = fp.run_approach(mdl, SampleApproach(mdl, faults=modes))
+    assert same_endclasses(endclasses, ref_endclasses) and mdlhists.keys()==ref_mdlhists.keys()
+    assert counter.numscens==len(ref_endclasses)-len(results[0])
+    # added sample times
+    app = SampleApproach(mdl)
+    results = fp.run_approach(mdl, app)
+    phase = list(mdl.phases)[1]
+    app.add_sampletimes(modes[4], phase, list(range(*mdl.phases[phase])))
+    endclasses, mdlhists = fp.run_approach(mdl, app, prevresults=results)
+    refapp = SampleApproach(mdl, sampparams={(modes[4], phase):{'samp':'fullint'}})
+    ref_endclasses, ref_mdlhists = fp.run_approach(mdl, refapp)
+    assert same_endclasses(endclasses, ref_endclasses)
+    assert np.allclose(rp.make_summfmea(endclasses, app).values, rp.make_summfmea(ref_endclasses, refapp).values)
+
+def test_graphstatus():
+    mdl = Pump()
+    app = SampleApproach(mdl)
+    endclasses, mdlhists = fp.run_approach(mdl, app)
+    statuses = ['Nominal', 'Degraded', 'Faulty']
+    for scen in list(mdlhists)[1::4]:
+        hist = {'nominal':mdlhists['nominal'], 'faulty':mdlhists[scen]}
+        reshist = rp.compare_hist(hist, returndiff=False)[0]
+        for gtype in ['normal', 'bipartite']:
+            graphstatus = rp.make_graphstatus(mdl, reshist, gtype)
+            rghist = rp.make_resultsgraphs_from(mdl, hist, gtype=gtype)
+            for t_ind, time in enumerate(reshist['time']):
+                g, nomg = hist_graph(mdl, hist['faulty'], t_ind, gtype), hist_graph(mdl, hist['nominal'], t_ind, gtype)
+                if gtype=='normal': ref = rp.make_resultsgraph(g, nomg)
+                else:               ref = rp.make_bipresultsgraph(g, nomg)
+                ref_nodestatus = {node:ref.nodes[node]['status'] for node in ref.nodes}
+                assert {node:rghist[time].nodes[node]['status'] for node in ref.nodes}==ref_nodestatus
+                assert {node:statuses[status] for node, status in zip(graphstatus['nodes'], graphstatus['nodestatus'][t_ind])}==ref_nodestatus
+                if gtype=='normal':
+                    ref_flowstatus = {(edge, flow):ref.edges[edge][flow]['status'] for edge in ref.edges for flow in ref.edges[edge]}
+                    assert {(edge, flow):rghist[time].edges[edge][flow]['status'] for edge, flow in ref_flowstatus}==ref_flowstatus
+                    ref_edgestatus = [any([ref_flowstatus[edge, flow]=='Degraded' for flow in ref.edges[edge]]) for edge in graphstatus['edges']]
+                    assert list(graphstatus['edgestatus'][t_ind].astype(bool))==ref_edgestatus
+
+if __name__ == '__main__':
+    test_compare_hists()
+    test_heatmaps()
+    test_fmeas()
+    test_histtables()
+    test_graphstatus()
+    test_reweight()
+    test_expcostdists()
+    test_merge()
+    print('results processing matches')